@@ -0,0 +1,371 @@
+# This module builds the decision surface of the fuzzy logic game engine by adaptive refinement
+# The surface is flat over large regions and only bends sharply near the term peaks (25, 50, 75),
+# so a uniform grid spends most of its engine calls where nothing happens. Here the ammo x health
+# square is a quadtree over a fine grid of 2^levels + 1 points per axis (1025 by default):
+#   the cells of baseLevel (8 x 8 cells by default) are evaluated first
+#   a cell is split in four where the surface is not linear enough (criterion='interpolation': its
+#   center or an edge midpoint is more than tolerance away from the bilinear interpolation of its
+#   corners) or not flat enough (criterion='difference': its corners, center and edge midpoints
+#   differ by more than tolerance), down to cells of one fine grid step
+#   with the mean of maximum the surface can also step along a single line of the grid exactly
+#   through an input term peak (e.g. sum / mom at health 50, where only one health term is active),
+#   which no point of the coarse cells lies on: every point of these lines is evaluated first
+#   (peakLines) and the cells they cross are also split where the line is not linear enough
+#   all the new points of a level are evaluated together (FuzzyController.evaluateBounded)
+# Between the evaluated points the surface is the bilinear interpolation of the corners of its
+# leaf cell. Neighbouring leaves of different sizes can differ slightly along their common edge.
+#
+# Exports:
+#   AdaptiveSurface.grid(stride) => x, y, Z on the fine grid (or every stride-th point of it),
+#                                   for plotSurface / plot_surface / pcolor
+#   AdaptiveSurface.lookup() => QuadtreeLookup, the leaves as a linear quadtree (one int32 per cell
+#                               and four float32 corners per leaf), saved with save / loadQuadtreeLookup
+#
+# Errors against every point of the 1025 x 1025 grid (python FuzzyLogicGameAdaptiveSurface.py --compare,
+# normal mode), and against a uniform grid with the same number of engine calls:
+#   tolerance aggregation/defuzzification   calls       lookup   max error   mean     uniform max/mean
+#   0.1       max/centroid                  24281 (2%)  108 KB   0.114       0.025    0.408 / 0.0073
+#   0.1       sum/centroid                  29297 (3%)  140 KB   0.122       0.027    0.652 / 0.0078
+#   0.1       max/mom                       70829 (7%)  568 KB   0.066       0.015    26.1 / 0.095
+#   0.1       sum/mom                       71571 (7%)  469 KB   0.138       0.021    18.6 / 0.046
+#   0.05      max/centroid                  39377 (4%)  199 KB   0.081       0.016    0.305 / 0.0053
+#   0.5       max/centroid                   4225 (0.4%) 18 KB   0.498       0.115    0.885 / 0.021
+# The full grid takes 12 to 16 s and 4104 KB of float32. The uniform grid has the smaller mean error
+# but misses the steps of the surface (the mom steps by up to 26), the adaptive surface keeps the
+# largest error near the tolerance. Without the peak lines sum/mom misses the steps along health 50
+# and ammo 50 with 65003 calls (max error 3.65). criterion='difference' also splits the cells that
+# are only sloped and evaluates 40 to 50% of the grid for the centroid surfaces at tolerance 0.5.
+#
+# Usage: python FuzzyLogicGameAdaptiveSurface.py [--tolerance 0.1] [--levels 10] [--mode 3] [--compare]
+
+import argparse
+import time
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController, METHODS, MEMORY_BUDGET
+from FuzzyLogicGameInference import NORMAL_MODE
+
+
+class AdaptiveSurface:
+    # The evaluated points and the cells of an adaptive surface
+    #   x, y => the axes of the fine grid
+    #   values => the crisp action of the evaluated points of the fine grid, nan elsewhere,
+    #             values[i][j] is for ammo x[i] and health y[j]
+    #   cells => one (i, j, refined) tuple of arrays per level from baseLevel, the lower corner of
+    #            every cell in fine grid steps and whether it was split; the four cells split from
+    #            the k-th refined cell of a level are cells 4k ... 4k + 3 of the next level
+    #   levels, baseLevel => the fine grid has 2^levels steps, the first cells 2^(levels - baseLevel)
+    #   fingerprint => of the controller
+
+    def __init__(self, x, y, values, cells, levels, baseLevel, fingerprint=None):
+        self.x = x
+        self.y = y
+        self.values = values
+        self.cells = cells
+        self.levels = levels
+        self.baseLevel = baseLevel
+        self.fingerprint = fingerprint
+
+    # Number of points evaluated by the engine
+    @property
+    def evaluations(self):
+        return int(np.count_nonzero(~np.isnan(self.values)))
+
+    # Leaf cells as (i, j, size) arrays, in fine grid steps
+    def leaves(self):
+        parts = [(i[~refined], j[~refined], np.full(np.count_nonzero(~refined), 2 ** (self.levels - level)))
+                 for level, (i, j, refined) in enumerate(self.cells, self.baseLevel)]
+        return tuple(np.concatenate(part) for part in zip(*parts))
+
+    # Corners (v00, v01, v10, v11) of cells, the first index along ammo
+    def _corners(self, i, j, size):
+        return (self.values[i, j], self.values[i, j + size], self.values[i + size, j],
+                self.values[i + size, j + size])
+
+    # The surface on the fine grid, every stride-th point along each axis
+    #   Returns (x, y, Z) with Z[i][j] the action for ammo x[i] and health y[j], as buildSurface
+    #   Z is interpolated in the leaves like the lookup, also at the points that were evaluated
+    def grid(self, stride=1):
+        Z = np.empty_like(self.values)
+        i, j, size = self.leaves()
+        for s in np.unique(size).tolist():
+            leaf = size == s
+            v00, v01, v10, v11 = (value[:, None, None] for value in self._corners(i[leaf], j[leaf], s))
+            t = (np.arange(s + 1) / s)[None, :, None]
+            w = (np.arange(s + 1) / s)[None, None, :]
+            rows = i[leaf][:, None, None] + np.arange(s + 1)[None, :, None]
+            columns = j[leaf][:, None, None] + np.arange(s + 1)[None, None, :]
+            Z[rows, columns] = (1 - t) * ((1 - w) * v00 + w * v01) + t * ((1 - w) * v10 + w * v11)
+        return self.x[::stride], self.y[::stride], Z[::stride, ::stride]
+
+    # The leaves as a compact lookup structure
+    def lookup(self):
+        offsets = np.cumsum([0] + [len(i) for i, _, _ in self.cells])
+        child = np.empty(offsets[-1], dtype=np.int32)
+        leafValues = []
+        leafCount = 0
+        for level, (i, j, refined) in enumerate(self.cells):
+            nodes = child[offsets[level]:offsets[level + 1]]
+            nodes[refined] = offsets[level + 1] + 4 * np.arange(np.count_nonzero(refined))
+            leaves = np.count_nonzero(~refined)
+            nodes[~refined] = -(leafCount + 1 + np.arange(leaves))
+            leafCount += leaves
+            size = 2 ** (self.levels - self.baseLevel - level)
+            leafValues.append(np.stack(self._corners(i[~refined], j[~refined], size), axis=1))
+        return QuadtreeLookup(child, np.concatenate(leafValues).astype(np.float32), (self.x[0], self.x[-1]),
+                              (self.y[0], self.y[-1]), self.levels, self.baseLevel, self.fingerprint)
+
+
+class QuadtreeLookup:
+    # The leaves of an adaptive surface as a linear quadtree
+    #   child => one int32 per cell of every level (the cells of AdaptiveSurface.cells, level after
+    #            level): the index of the first of its four cells for a refined cell, -(leaf + 1) for
+    #            a leaf; the cells of baseLevel come first, row by row
+    #   leafValues => float32 (v00, v01, v10, v11) corners of every leaf, the first index along ammo
+    #   ammoRange, healthRange => (low, high) of the surface
+    # Queries go down the tree for all the inputs at once, one level per step.
+
+    def __init__(self, child, leafValues, ammoRange, healthRange, levels, baseLevel, fingerprint=None):
+        self.child = child
+        self.leafValues = leafValues
+        self.ammoRange = tuple(float(value) for value in ammoRange)
+        self.healthRange = tuple(float(value) for value in healthRange)
+        self.levels = int(levels)
+        self.baseLevel = int(baseLevel)
+        self.fingerprint = fingerprint
+
+    @property
+    def nbytes(self):
+        return self.child.nbytes + self.leafValues.nbytes
+
+    # Position of every value in fine grid steps
+    def _position(self, value, valueRange):
+        lo, hi = valueRange
+        return np.clip((value - lo) / (hi - lo) * 2 ** self.levels, 0, 2 ** self.levels)
+
+    # Crisp action for scalar or array inputs, by bilinear interpolation in their leaf cell
+    #   Returns a float for scalar inputs and an array with the shape of the inputs otherwise
+    def evaluate(self, ammo, health):
+        ammo, health = np.broadcast_arrays(np.asarray(ammo, dtype=float), np.asarray(health, dtype=float))
+        u, v = self._position(ammo, self.ammoRange), self._position(health, self.healthRange)
+
+        roots = 2 ** self.baseLevel
+        size = np.full(u.shape, 2 ** (self.levels - self.baseLevel), dtype=np.intp)
+        i = np.minimum(u // size, roots - 1).astype(np.intp)
+        j = np.minimum(v // size, roots - 1).astype(np.intp)
+        node = i * roots + j
+        i *= size
+        j *= size
+        for _ in range(self.levels - self.baseLevel):
+            first = self.child[node]
+            inner = first >= 0
+            if not inner.any():
+                break
+            half = np.where(inner, size // 2, size)
+            qi, qj = inner & (u >= i + half), inner & (v >= j + half)
+            node = np.where(inner, first + 2 * qi + qj, node)
+            i += qi * half
+            j += qj * half
+            size = half
+
+        v00, v01, v10, v11 = np.moveaxis(self.leafValues[-self.child[node] - 1].astype(float), -1, 0)
+        t, w = (u - i) / size, (v - j) / size
+        crisp = (1 - t) * ((1 - w) * v00 + w * v01) + t * ((1 - w) * v10 + w * v11)
+        if crisp.shape == ():
+            return float(crisp)
+        return crisp
+
+    def save(self, path):
+        np.savez(path, child=self.child, leafValues=self.leafValues,
+                 settings=np.array([*self.ammoRange, *self.healthRange, self.levels, self.baseLevel]),
+                 fingerprint=np.array(self.fingerprint or ''))
+
+
+# Opens a lookup saved by QuadtreeLookup.save
+#   controller => when given, a ValueError is raised if the lookup was built from another rule base
+def loadQuadtreeLookup(path, controller=None):
+    with np.load(path, allow_pickle=False) as arrays:
+        settings = arrays['settings']
+        fingerprint = str(arrays['fingerprint']) or None
+        lookup = QuadtreeLookup(arrays['child'], arrays['leafValues'], settings[0:2], settings[2:4],
+                                settings[4], settings[5], fingerprint)
+    if controller is not None and fingerprint != controller.fingerprint():
+        raise ValueError("%s was built from another rule base" % path)
+    return lookup
+
+
+# A function that builds the decision surface by adaptive refinement
+#   mode, aggregation, defuzzification, method => see FuzzyController.evaluate
+#   tolerance => largest interpolation error or difference of a cell that is not split
+#   criterion => 'interpolation' or 'difference', see the top of the module
+#   levels => the fine grid has 2^levels + 1 points along each axis
+#   baseLevel => the first cells are 2^baseLevel x 2^baseLevel
+#   memoryBudget => bytes of working memory of the engine calls
+#   peakLines => also evaluate every point of the fine grid lines through the input term peaks
+#                and split the cells along them where they are not linear enough, None => for mom
+# Returns an AdaptiveSurface
+def buildAdaptiveSurface(mode=NORMAL_MODE, aggregation='max', defuzzification='centroid', method='sampled',
+                         controller=None, tolerance=0.1, levels=10, baseLevel=3, criterion='interpolation',
+                         memoryBudget=MEMORY_BUDGET, peakLines=None):
+    if controller is None:
+        controller = defaultController()
+    if not 0 <= baseLevel <= levels:
+        raise ValueError("baseLevel must be between 0 and levels")
+    if tolerance < 0:
+        raise ValueError("tolerance must not be negative")
+    if criterion not in ('interpolation', 'difference'):
+        raise ValueError("criterion must be 'interpolation' or 'difference', not %r" % (criterion,))
+
+    n = 2 ** levels + 1
+    x = np.linspace(controller.x_ammo[0], controller.x_ammo[-1], n)
+    y = np.linspace(controller.x_health[0], controller.x_health[-1], n)
+    values = np.full((n, n), np.nan)
+
+    # Evaluates the points (i, j) of the fine grid that are not known yet, in one engine call
+    def evaluate(i, j):
+        flat = np.unique(i * n + j)
+        flat = flat[np.isnan(values.flat[flat])]
+        if len(flat):
+            i, j = np.divmod(flat, n)
+            values.flat[flat] = controller.evaluateBounded(x[i], y[j], mode, aggregation, defuzzification, method,
+                                                           'sparse', memoryBudget)
+
+    # The points of a cell that are compared: its corners, then its center and edge midpoints
+    def cellOffsets(size):
+        half = size // 2
+        corners = [(0, 0), (0, size), (size, 0), (size, size)]
+        return corners + ([(half, half), (0, half), (half, 0), (size, half), (half, size)] if size > 1 else [])
+
+    # Evaluates the points of cells that are compared
+    def evaluateCells(i, j, size):
+        offsets = cellOffsets(size)
+        evaluate(np.concatenate([i + di for di, _ in offsets]), np.concatenate([j + dj for _, dj in offsets]))
+
+    # The fine grid lines (indices) through the term peaks that are points of the grid
+    def gridLines(terms, axis):
+        positions = (np.array([b for _, b, _ in terms]) - axis[0]) / (axis[-1] - axis[0]) * (n - 1)
+        onGrid = np.isclose(positions, np.rint(positions)) & (positions >= 0) & (positions <= n - 1)
+        return np.unique(np.rint(positions[onGrid]).astype(int))
+
+    # Largest distance of the points of the peak lines in every cell from the bilinear interpolation
+    # of its corners (criterion='interpolation') or from its corners and other points ('difference')
+    def lineError(i, j, size, points):
+        error = np.zeros(len(i))
+        steps = np.arange(size + 1)
+        # The health lines are the ammo lines of the transposed grid, with the corners transposed too
+        for grid, lines, along, across, (c00, c01, c10, c11) in ((values, ammoLines, i, j, points[:4]),
+                                                                (values.T, healthLines, j, i, points[[0, 2, 1, 3]])):
+            for line in lines.tolist():
+                inside = np.flatnonzero((along <= line) & (line <= along + size))
+                if not len(inside):
+                    continue
+                onLine = grid[line, across[inside][:, None] + steps]
+                if criterion == 'difference':
+                    cell = points[:, inside]
+                    distance = np.maximum(onLine.max(axis=1) - cell.min(axis=0), cell.max(axis=0) - onLine.min(axis=1))
+                else:
+                    t, w = ((line - along[inside]) / size)[:, None], steps / size
+                    bilinear = ((1 - t) * ((1 - w) * c00[inside, None] + w * c01[inside, None])
+                                + t * ((1 - w) * c10[inside, None] + w * c11[inside, None]))
+                    distance = np.abs(onLine - bilinear).max(axis=1)
+                error[inside] = np.maximum(error[inside], distance)
+        return error
+
+    if peakLines is None:
+        peakLines = defuzzification == 'mom'
+    ammoLines = gridLines(controller.ammoTerms, x) if peakLines else np.zeros(0, dtype=int)
+    healthLines = gridLines(controller.healthTerms, y) if peakLines else np.zeros(0, dtype=int)
+    everywhere = np.arange(n)
+    evaluate(np.concatenate([np.repeat(ammoLines, n), np.tile(everywhere, len(healthLines))]),
+             np.concatenate([np.tile(everywhere, len(ammoLines)), np.repeat(healthLines, n)]))
+
+    size = 2 ** (levels - baseLevel)
+    i, j = np.divmod(np.arange(4 ** baseLevel), 2 ** baseLevel)
+    i, j = i * size, j * size
+    evaluateCells(i, j, size)
+
+    cells = []
+    while True:
+        if size > 1:
+            half = size // 2
+            points = np.stack([values[i + di, j + dj] for di, dj in cellOffsets(size)])
+            if criterion == 'difference':
+                refined = points.max(axis=0) - points.min(axis=0) > tolerance
+            else:
+                c00, c01, c10, c11 = points[:4]
+                bilinear = np.stack([(c00 + c01 + c10 + c11) / 4, (c00 + c01) / 2, (c00 + c10) / 2,
+                                     (c10 + c11) / 2, (c01 + c11) / 2])
+                refined = np.abs(points[4:] - bilinear).max(axis=0) > tolerance
+            if len(ammoLines) or len(healthLines):
+                refined |= lineError(i, j, size, points) > tolerance
+        else:
+            refined = np.zeros(len(i), dtype=bool)
+        cells.append((i, j, refined))
+        if not refined.any():
+            break
+
+        # The four cells of every refined cell, in the order (0, 0), (0, 1), (1, 0), (1, 1)
+        i = (i[refined][:, None] + np.array([0, 0, half, half])).ravel()
+        j = (j[refined][:, None] + np.array([0, half, 0, half])).ravel()
+        size = half
+        evaluateCells(i, j, size)
+
+    return AdaptiveSurface(x, y, values, cells, levels, baseLevel, controller.fingerprint())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the decision surface by adaptive refinement")
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--levels', type=int, default=10, help="the fine grid has 2^levels + 1 points per axis")
+    parser.add_argument('--base-level', type=int, default=3)
+    parser.add_argument('--criterion', choices=['interpolation', 'difference'], default='interpolation')
+    parser.add_argument('--mode', type=int, default=NORMAL_MODE)
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    parser.add_argument('--defuzzification', choices=['centroid', 'mom'], default='centroid')
+    parser.add_argument('--method', choices=METHODS, default='sampled')
+    parser.add_argument('--compare', action='store_true',
+                        help="evaluate the whole fine grid too and print the errors (slow)")
+    parser.add_argument('--output', help="save the lookup structure to this .npz file")
+    parser.add_argument('--plot', action='store_true', help="show the surface with plotSurface")
+    args = parser.parse_args(argv)
+
+    controller = defaultController()
+    start = time.perf_counter()
+    surface = buildAdaptiveSurface(args.mode, args.aggregation, args.defuzzification, args.method, controller,
+                                   args.tolerance, args.levels, args.base_level, args.criterion)
+    seconds = time.perf_counter() - start
+    lookup = surface.lookup()
+    n = len(surface.x)
+    print("%d x %d grid: %d engine calls (%.1f%%) in %.2f s, %d leaves, lookup %.0f KB (grid %.0f KB)"
+          % (n, n, surface.evaluations, 100 * surface.evaluations / n ** 2, seconds, len(lookup.leafValues),
+             lookup.nbytes / 1024, n * n * 4 / 1024))
+
+    if args.compare:
+        start = time.perf_counter()
+        ammoGrid, healthGrid = np.meshgrid(surface.x, surface.y, indexing='ij')
+        exact = controller.evaluateBounded(ammoGrid, healthGrid, args.mode, args.aggregation, args.defuzzification,
+                                           args.method, 'sparse')
+        seconds = time.perf_counter() - start
+        for name, approximation in (('grid', surface.grid()[2]), ('lookup', lookup.evaluate(ammoGrid, healthGrid))):
+            error = np.abs(approximation - exact)
+            print("%s: max error %.3g, mean %.3g" % (name, error.max(), error.mean()))
+
+        # A uniform grid with about the same number of engine calls, interpolated bilinearly
+        side = int(np.sqrt(surface.evaluations))
+        steps = np.rint(np.linspace(0, n - 1, side)).astype(int)
+        uniform = np.array([np.interp(np.arange(n), steps, row) for row in exact[np.ix_(steps, steps)]])
+        uniform = np.array([np.interp(np.arange(n), steps, column) for column in uniform.T]).T
+        print("uniform %d x %d grid: max error %.3g, mean %.3g (whole grid evaluated in %.2f s)"
+              % (side, side, np.abs(uniform - exact).max(), np.abs(uniform - exact).mean(), seconds))
+
+    if args.output:
+        lookup.save(args.output)
+    if args.plot:
+        from FuzzyLogicGamePlots import plotSurface, show
+        plotSurface(*surface.grid(stride=max((n - 1) // 64, 1)))
+        show()
+
+
+if __name__ == '__main__':
+    main()
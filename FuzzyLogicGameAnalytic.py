@@ -0,0 +1,184 @@
+# This module contains an exact (analytic) defuzzification for the fuzzy logic game engine
+# The output sets are triangles cut at the rule strengths, so the aggregated output
+# is a piecewise linear function. Instead of sampling it on x_action we find all of
+# its corners and integrate between them, so the cost depends on the number of rules
+# and not on the number of samples.
+#
+# Triangles with a == b or b == c (shoulders) are only allowed at the ends of the
+# universe, like the hide and attack sets, otherwise the output would have a jump.
+
+import numpy as np
+
+
+# A function that writes the sides of triangles as lines y = m * x + q
+def triangleSides(a, b, c):
+    # This function takes in arrays with the corners of every triangle
+    # and returns the slope m and offset q of the rising and the falling sides.
+    # The side of a shoulder (a == b or b == c) is vertical, it gets a slope of 0
+    # and an offset of inf so it never limits the triangle inside the universe
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        risingSlope = np.where(b > a, 1 / (b - a), 0)
+        risingOffset = np.where(b > a, -a * risingSlope, np.inf)
+        fallingSlope = np.where(c > b, -1 / (c - b), 0)
+        fallingOffset = np.where(c > b, -c * fallingSlope, np.inf)
+
+    return risingSlope, risingOffset, fallingSlope, fallingOffset
+
+
+# A function that computes the value of cut triangles at some points
+def clippedTriangleValues(x, a, b, c, h):
+    # This function takes in:
+    # x => array of points, shape (batch, points, 1)
+    # a, b, c => arrays with the corners of every triangle, shape (triangles,) or (batch, 1, triangles)
+    # h => the height every triangle is cut at, shape (batch, 1, triangles)
+    # and returns the value of every cut triangle at every point, shape (batch, points, triangles)
+
+    risingSlope, risingOffset, fallingSlope, fallingOffset = triangleSides(a, b, c)
+
+    y = x * risingSlope
+    y += risingOffset
+    falling = x * fallingSlope
+    falling += fallingOffset
+    np.minimum(y, falling, out=y)
+    np.minimum(y, h, out=y)
+    np.maximum(y, 0, out=y)
+
+    return y
+
+
+# A function that finds the corners of the aggregated output
+def aggregatedOutline(terms, heights, lo, hi, aggregation='max'):
+    # This function takes in:
+    # terms => list of triangles (a, b, c), one per rule (or per action term for max aggregation),
+    #          or for sum aggregation an array of shape (batch, triangles, 3) with the triangles of every row
+    # heights => the strength every triangle is cut at, shape (batch, triangles)
+    # lo, hi => the ends of the output universe
+    # aggregation => 'max' or 'sum'
+    # It returns the sorted x positions of all corners, shape (batch, points),
+    # and the value of the aggregated output at these corners.
+    # Between two corners the aggregated output is a straight line.
+
+    heights = np.asarray(heights, dtype=float)
+    a, b, c = np.moveaxis(np.asarray(terms, dtype=float), -1, 0)
+    batch = len(heights)
+    if a.ndim > 1 and aggregation == 'max':
+        raise ValueError("max aggregation needs the same triangles in every row")
+
+    # Triangles that are not cut above zero in any row add nothing to the output
+    active = heights.any(axis=0)
+    if not active.all():
+        heights, a, b, c = heights[:, active], a[..., active], b[..., active], c[..., active]
+
+    # Corners of every cut triangle: a, b, c and the two points where it is cut
+    h = np.minimum(heights, 1)
+    corners = [np.broadcast_to(a, heights.shape), np.broadcast_to(b, heights.shape),
+               np.broadcast_to(c, heights.shape), a + (b - a) * h, c - (c - b) * h]
+    points = [np.full((batch, 1), float(lo)), np.full((batch, 1), float(hi))] + corners
+
+    if aggregation == 'max':
+        # The max of the triangles also bends where the sides of two different triangles cross.
+        # Every rising, falling and flat (cut) side is a line y = m * x + q, the slopes
+        # do not depend on the input so the pairs of lines that can cross are found once
+        risingSlope, risingOffset, fallingSlope, fallingOffset = triangleSides(a, b, c)
+        k = len(a)
+        owner = np.tile(np.arange(k), 3)
+        m = np.concatenate([risingSlope, fallingSlope, np.zeros(k)])
+        sloped = np.concatenate([risingOffset, fallingOffset, np.zeros(k)])
+        real = np.concatenate([np.isfinite(risingOffset), np.isfinite(fallingOffset), np.ones(k, dtype=bool)])
+        i, j = np.triu_indices(3 * k, 1)
+        crossing = (owner[i] != owner[j]) & (m[i] != m[j]) & real[i] & real[j]
+        i, j = i[crossing], j[crossing]
+
+        q = np.concatenate([np.broadcast_to(sloped[:2 * k], (batch, 2 * k)), heights], axis=1)
+        points.append((q[:, j] - q[:, i]) / (m[i] - m[j]))
+    elif aggregation != 'sum':
+        raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+
+    xs = np.sort(np.clip(np.concatenate(points, axis=1), lo, hi), axis=1)
+
+    values = clippedTriangleValues(xs[:, :, None], a[..., None, :], b[..., None, :], c[..., None, :],
+                                   heights[:, None, :])
+    if aggregation == 'max':
+        fs = np.max(values, axis=2)
+    else:
+        fs = np.sum(values, axis=2)
+
+    return xs, fs
+
+
+# A function that computes the area and the moment (integral of x * y) of cut triangles
+def clippedTriangleMoments(terms, heights):
+    # This function takes in:
+    # terms => list of triangles (a, b, c), or an array of shape (batch, triangles, 3)
+    #          with the triangles of every row
+    # heights => the strength every triangle is cut at, shape (batch, triangles)
+    # and returns the area and the moment of every cut triangle, shapes (batch, triangles)
+    # A cut triangle is a rising triangle, a flat block and a falling triangle
+
+    a, b, c = np.moveaxis(np.asarray(terms, dtype=float), -1, 0)
+    h = np.minimum(np.asarray(heights, dtype=float), 1)
+    p = a + (b - a) * h  # where the rising side is cut
+    q = c - (c - b) * h  # where the falling side is cut
+
+    rising = h * (p - a) / 2
+    flat = h * (q - p)
+    falling = h * (c - q) / 2
+
+    area = rising + flat + falling
+    moment = rising * (a + 2 * p) / 3 + flat * (p + q) / 2 + falling * (2 * q + c) / 3
+
+    return area, moment
+
+
+# Exact center of gravity of a sum of cut triangles
+def AnalyticSumCentroid(terms, heights):
+    # This function takes in the triangles and the strength every triangle is cut at,
+    # one row per input, and returns the centroid of the sum of the cut triangles.
+    # The centroid of a sum is the sum of the moments over the sum of the areas,
+    # so no outline is needed
+
+    area, moment = clippedTriangleMoments(terms, heights)
+
+    return np.sum(moment, axis=1) / np.sum(area, axis=1)
+
+
+# Exact center of gravity of a piecewise linear function
+def AnalyticCentroid(xs, fs):
+    # This function takes in the sorted corners xs and the values fs of the
+    # aggregated output, one row per input, and returns the centroid of every row
+
+    x0, x1 = xs[:, :-1], xs[:, 1:]
+    f0, f1 = fs[:, :-1], fs[:, 1:]
+    dx = x1 - x0
+
+    area = np.sum(dx * (f0 + f1) / 2, axis=1)
+    moment = np.sum(dx * (x0 * (2 * f0 + f1) + x1 * (f0 + 2 * f1)) / 6, axis=1)
+
+    return moment / area
+
+
+# Exact mean of maximum of a piecewise linear function
+def AnalyticMeanOfMax(xs, fs):
+    # This function takes in the sorted corners xs and the values fs of the
+    # aggregated output, one row per input, and returns the mean of the
+    # x positions where every row reaches its maximum
+
+    # The maximum of a piecewise linear function is always reached at a corner
+    top = np.max(fs, axis=1, keepdims=True)
+    isMax = fs >= top - 1e-12 * np.maximum(top, 1)
+
+    # Flat pieces at the maximum => mean over their length
+    flat = isMax[:, :-1] & isMax[:, 1:]
+    length = np.where(flat, xs[:, 1:] - xs[:, :-1], 0)
+    middle = (xs[:, 1:] + xs[:, :-1]) / 2
+    totalLength = np.sum(length, axis=1)
+
+    # No flat piece => the maximum is reached at single points, mean over the distinct points
+    distinct = isMax & np.concatenate([np.ones((len(xs), 1), dtype=bool), xs[:, 1:] != xs[:, :-1]], axis=1)
+    pointsMean = np.sum(xs * distinct, axis=1) / np.sum(distinct, axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        flatMean = np.sum(length * middle, axis=1) / totalLength
+
+    return np.where(totalLength > 0, flatMean, pointsMean)
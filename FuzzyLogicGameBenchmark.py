@@ -0,0 +1,284 @@
+# This module measures the performance of the fuzzy logic game engine
+#   latency => p50 / p99 time of one decision, for every combination, method and universe resolution
+#   throughput => decisions per second for batch sizes from 1 to 1e6
+#   surface => time to build the decision surface for several grid sizes
+#   inputs => decisions per second of the MultiInputController against the number of inputs k,
+#             firing the at most 2^k rules of the active terms (sparse) or every rule (dense)
+# The batched measurements of the sampled method are repeated for every precision.
+# Every measurement also records the peak memory allocated (tracemalloc), in one more run of the same
+# work: tracing slows every allocation down, so the timed runs are never traced.
+# The results are saved as JSON together with the commit and the versions used,
+# so runs on different commits can be compared with --compare.
+#
+# Usage: python FuzzyLogicGameBenchmark.py [--quick] [--output results.json] [--compare old.json]
+
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from FuzzyLogicGameController import FuzzyController, METHODS, PRECISIONS
+from FuzzyLogicGameInference import fuzzyEngine, x_ammo, x_health, x_action, COMBINATIONS
+from FuzzyLogicGameMultiInput import randomRuleBase
+from FuzzyLogicGameSurface import buildSurface
+
+INFERENCES = ['dense', 'sparse']
+
+# Combinations of the inputs benchmark: the cheapest and the one whose analytic outline grows with
+# the 2^k fired rules (with sum aggregation every fired rule adds its own triangle)
+INPUT_COMBINATIONS = [('max', 'centroid'), ('sum', 'mom')]
+
+# Largest number of decisions evaluated in one engine call, bigger batches are split
+# so the (batch, len(x_action)) aggregated output stays in memory
+CHUNK_SIZE = 8192
+
+
+# A function that runs fn and returns the seconds it took
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+# A function that runs fn with tracemalloc and returns the peak bytes allocated, the run is not timed
+def peakMemory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+# A function that runs fn once timed and once traced, returns (seconds, peak bytes allocated)
+def measure(fn):
+    return timed(fn), peakMemory(fn)
+
+
+# A function that repeats fn until it took about budget seconds (at least once),
+# returns (calls, seconds, peak bytes allocated by one more traced call)
+def repeatMeasure(fn, budget):
+    calls, seconds = 0, 0.0
+    while seconds < budget or calls == 0:
+        seconds += timed(fn)
+        calls += 1
+    return calls, seconds, peakMemory(fn)
+
+
+# Random but reproducible inputs
+def randomInputs(size, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 100, size), rng.uniform(0, 100, size), rng.integers(1, 4, size)
+
+
+# The (aggregation, defuzzification) combinations measured for a method,
+# the sugeno method does not use them and is measured once
+def _combinations(method):
+    return COMBINATIONS[:1] if method == 'sugeno' else COMBINATIONS
+
+
+# Evaluates a batch of any size in chunks of CHUNK_SIZE decisions
+def evaluateBatch(controller, ammo, health, mode, aggregation, defuzzification, method, inference='dense'):
+    crisp = np.empty(len(ammo))
+    for start in range(0, len(ammo), CHUNK_SIZE):
+        stop = start + CHUNK_SIZE
+        crisp[start:stop] = controller.evaluate(ammo[start:stop], health[start:stop], mode[start:stop],
+                                                aggregation, defuzzification, method, inference)
+    return crisp
+
+
+# Latency of single decisions
+def benchmarkLatency(resolutions, repeats):
+    results = []
+    ammo, health, mode = randomInputs(repeats)
+
+    # The original scalar engine, which builds the membership functions on every call
+    times = []
+    for a, h in zip(ammo[:max(repeats // 10, 10)].tolist(), health.tolist()):
+        start = time.perf_counter()
+        fuzzyEngine(x_ammo, x_health, x_action, h, a)
+        times.append(time.perf_counter() - start)
+    results.append({'benchmark': 'latency', 'engine': 'fuzzyEngine', 'aggregation': 'max',
+                    'defuzzification': 'centroid', 'method': 'sampled', 'resolution': len(x_action),
+                    'p50_us': np.percentile(times, 50) * 1e6, 'p99_us': np.percentile(times, 99) * 1e6})
+
+    for resolution in resolutions:
+        universe = np.linspace(0, 100, resolution)
+        controller = FuzzyController(x_ammo=universe, x_health=universe, x_action=universe)
+        for method, inference in itertools.product(METHODS, INFERENCES):
+            for aggregation, defuzzification in _combinations(method):
+                times = []
+                for a, h, m in zip(ammo.tolist(), health.tolist(), mode.tolist()):
+                    start = time.perf_counter()
+                    controller.evaluate(a, h, m, aggregation, defuzzification, method, inference)
+                    times.append(time.perf_counter() - start)
+                peak = peakMemory(lambda: controller.evaluate(50.0, 50.0, 3, aggregation, defuzzification, method,
+                                                              inference))
+                results.append({'benchmark': 'latency', 'engine': 'FuzzyController', 'aggregation': aggregation,
+                                'defuzzification': defuzzification, 'method': method, 'inference': inference,
+                                'resolution': resolution, 'p50_us': np.percentile(times, 50) * 1e6,
+                                'p99_us': np.percentile(times, 99) * 1e6, 'peak_bytes': peak})
+    return results
+
+
+# The (precision, method) pairs measured, the analytic and sugeno methods are always float64
+def _precisionMethods():
+    return [(precision, method) for precision in PRECISIONS for method in METHODS
+            if method == 'sampled' or precision == 'float64']
+
+
+# Decisions per second for every batch size
+def benchmarkThroughput(batchSizes, budget):
+    results = []
+    for (precision, method), inference in itertools.product(_precisionMethods(), INFERENCES):
+        controller = FuzzyController(precision=precision)
+        for aggregation, defuzzification in _combinations(method):
+            for size in batchSizes:
+                ammo, health, mode = randomInputs(size)
+                # Small batches are repeated until they take about budget seconds
+                calls, seconds, peak = repeatMeasure(lambda: evaluateBatch(controller, ammo, health, mode,
+                                                                           aggregation, defuzzification, method,
+                                                                           inference), budget)
+                results.append({'benchmark': 'throughput', 'aggregation': aggregation,
+                                'defuzzification': defuzzification, 'method': method, 'inference': inference,
+                                'precision': precision, 'batch': size, 'decisions_per_second': size * calls / seconds,
+                                'peak_bytes': peak})
+    return results
+
+
+# Time to build the decision surface
+def benchmarkSurface(gridSizes):
+    results = []
+    for precision, method in _precisionMethods():
+        controller = FuzzyController(precision=precision)
+        for size in gridSizes:
+            axis = np.linspace(0, 100, size)
+            seconds, peak = measure(lambda: buildSurface(axis, axis, method=method, controller=controller,
+                                                         workers=1))
+            results.append({'benchmark': 'surface', 'aggregation': 'max', 'defuzzification': 'centroid',
+                            'method': method, 'precision': precision, 'grid': size, 'seconds': seconds,
+                            'peak_bytes': peak})
+    return results
+
+
+# Decisions per second against the number of inputs, with 5 terms per input and a full rule base
+# (5^k rules), the dense inference is only measured up to denseRules rules
+def benchmarkInputs(inputCounts, batch, budget, denseRules=625):
+    results = []
+    for k in inputCounts:
+        controller = randomRuleBase(k)
+        rng = np.random.default_rng(0)
+        inputs, mode = [rng.uniform(0, 100, batch) for _ in range(k)], rng.integers(1, 4, batch)
+        ruleBytes = controller.ruleKeys.nbytes + controller.ruleAction.nbytes + controller.ruleClass.nbytes
+        for (aggregation, defuzzification), method, inference in itertools.product(
+                INPUT_COMBINATIONS, ('sampled', 'analytic'), INFERENCES):
+            if inference == 'dense' and controller.nRules > denseRules:
+                continue
+            calls, seconds, peak = repeatMeasure(lambda: controller.evaluate(inputs, mode, aggregation, defuzzification,
+                                                                             method, inference), budget)
+            results.append({'benchmark': 'inputs', 'aggregation': aggregation, 'defuzzification': defuzzification,
+                            'method': method, 'inference': inference, 'inputs': k, 'rules': controller.nRules,
+                            'batch': batch, 'decisions_per_second': batch * calls / seconds, 'peak_bytes': peak,
+                            'rule_bytes': ruleBytes})
+    return results
+
+
+# Information about the run, to tell results of different commits apart
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'processor': platform.processor()}
+
+
+def runBenchmarks(quick=False):
+    if quick:
+        resolutions, repeats, batchSizes, gridSizes, budget = [100, 1000], 200, [1, 100, 10000], [50, 100], 0.2
+        inputCounts, inputBatch = [1, 2, 3, 4], 1000
+    else:
+        resolutions, repeats = [100, 250, 1000, 4000], 1000
+        batchSizes, gridSizes, budget = [1, 10, 100, 1000, 10000, 100000, 1000000], [100, 250, 500], 1.0
+        inputCounts, inputBatch = [1, 2, 3, 4, 5, 6, 7, 8], 10000
+
+    return {'environment': environment(),
+            'results': benchmarkLatency(resolutions, repeats)
+            + benchmarkThroughput(batchSizes, budget)
+            + benchmarkSurface(gridSizes)
+            + benchmarkInputs(inputCounts, inputBatch, budget)}
+
+
+# The fields that tell which measurement a result is
+#   Results saved before the sparse inference existed were all dense,
+#   results saved before the precisions existed were all float64
+def _key(result):
+    if result['benchmark'] in ('latency', 'throughput') and result.get('engine') != 'fuzzyEngine':
+        result = dict(result, inference=result.get('inference', 'dense'))
+    if result['benchmark'] in ('throughput', 'surface'):
+        result = dict(result, precision=result.get('precision', 'float64'))
+    return tuple((name, result[name]) for name in ('benchmark', 'engine', 'aggregation', 'defuzzification',
+                                                   'method', 'inference', 'precision', 'resolution', 'inputs',
+                                                   'batch', 'grid')
+                 if name in result)
+
+
+# The field holding the measurement and whether higher is better
+def _value(result):
+    for name, higherIsBetter in (('p50_us', False), ('decisions_per_second', True), ('seconds', False)):
+        if name in result:
+            return name, result[name], higherIsBetter
+
+
+# Prints the speedup of every measurement of new compared with old
+def compareResults(old, new, stream=sys.stdout):
+    previous = {_key(result): result for result in old['results']}
+    print("old commit: %s, new commit: %s" % (old['environment'].get('commit'), new['environment'].get('commit')),
+          file=stream)
+    for result in new['results']:
+        if _key(result) not in previous:
+            continue
+        name, value, higherIsBetter = _value(result)
+        _, oldValue, _ = _value(previous[_key(result)])
+        speedup = value / oldValue if higherIsBetter else oldValue / value
+        label = ", ".join("%s=%s" % item for item in _key(result))
+        print("%-100s %s %12.4g -> %12.4g  (x%.2f)" % (label, name, oldValue, value, speedup), file=stream)
+
+
+# Prints the results as a table
+def printResults(results, stream=sys.stdout):
+    for result in results['results']:
+        name, value, _ = _value(result)
+        label = ", ".join("%s=%s" % item for item in _key(result))
+        extra = " p99_us=%.1f" % result['p99_us'] if 'p99_us' in result else ""
+        print("%-100s %s=%.4g%s peak=%.1f MB" % (label, name, value, extra, result.get('peak_bytes', 0) / 2 ** 20),
+              file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the fuzzy logic game engine")
+    parser.add_argument('--quick', action='store_true', help="small sizes, for a fast check")
+    parser.add_argument('--output', help="save the results to this JSON file")
+    parser.add_argument('--compare', help="JSON file of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.quick)
+    printResults(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=1)
+    if args.compare:
+        with open(args.compare) as file:
+            compareResults(json.load(file), results)
+
+
+if __name__ == '__main__':
+    main()
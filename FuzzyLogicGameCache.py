@@ -0,0 +1,126 @@
+# This module puts a memoization layer in front of the fuzzy logic game engine
+# Game states are often integers or come from a small set of values, so the same
+# (ammo, health, mode) inputs are evaluated over and over. The inputs are rounded to
+# a grid of the given step and the crisp action of every grid point is kept in a
+# bounded LRU (least recently used) cache.
+
+from collections import OrderedDict
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController
+from FuzzyLogicGameInference import NORMAL_MODE
+
+
+class CachedController:
+    # A FuzzyController with an LRU cache of its crisp outputs
+    #   controller => the FuzzyController to cache, by default the rule base from the article
+    #   step => inputs are rounded to a multiple of step before the lookup (None => exact inputs)
+    #   maxSize => the number of entries kept, the least recently used entry is evicted first
+    # The cache is emptied when the controller is compiled again (new terms, rules or weights)
+
+    def __init__(self, controller=None, step=1.0, maxSize=65536):
+        if step is not None and step <= 0:
+            raise ValueError("step must be positive or None")
+        if maxSize < 1:
+            raise ValueError("maxSize must be at least 1")
+        self.controller = controller if controller is not None else defaultController()
+        self.step = step
+        self.maxSize = maxSize
+        self._entries = OrderedDict()
+        self._version = self.controller.version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # Empties the cache (the counters are kept)
+    def clear(self):
+        self._entries.clear()
+        self._version = self.controller.version
+
+    # Sets all the counters back to zero
+    def resetStats(self):
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'invalidations': self.invalidations, 'size': len(self._entries), 'maxSize': self.maxSize,
+                'hitRate': self.hits / lookups if lookups else 0.0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Rounds the inputs to the grid of the cache, the result is a grid index (or the exact value)
+    def _quantize(self, value):
+        if self.step is None:
+            return value
+        return np.round(np.asarray(value, dtype=float) / self.step)
+
+    # The inputs the engine is evaluated at for a grid index
+    def _value(self, index):
+        if self.step is None:
+            return index
+        return index * self.step
+
+    def _checkVersion(self):
+        if self.controller.version != self._version:
+            self.invalidations += 1
+            self.clear()
+
+    def _store(self, key, crisp):
+        self._entries[key] = crisp
+        if len(self._entries) > self.maxSize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # Crisp action for scalar or array inputs, see FuzzyController.evaluate
+    #   Every distinct input that is not in the cache is evaluated in one batched engine call
+    def evaluate(self, ammo, health, mode=NORMAL_MODE, aggregation='max', defuzzification='centroid',
+                 method='sampled'):
+        self._checkVersion()
+        settings = (aggregation, defuzzification, method)
+
+        # One decision => a single dictionary lookup
+        if np.ndim(ammo) == 0 and np.ndim(health) == 0 and np.ndim(mode) == 0:
+            key = (float(self._quantize(ammo)), float(self._quantize(health)), int(mode)) + settings
+            crisp = self._entries.get(key)
+            if crisp is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return crisp
+            self.misses += 1
+            crisp = self.controller.evaluate(self._value(key[0]), self._value(key[1]), key[2],
+                                             aggregation, defuzzification, method)
+            self._store(key, crisp)
+            return crisp
+
+        ammo, health, mode = np.broadcast_arrays(self._quantize(ammo), self._quantize(health),
+                                                 np.asarray(mode, dtype=int))
+        shape = ammo.shape
+        keys = list(zip(ammo.ravel().tolist(), health.ravel().tolist(), mode.ravel().tolist()))
+
+        crisp = np.empty(len(keys))
+        missing = {}  # key => rows of the batch with that key
+        for row, key in enumerate(keys):
+            value = self._entries.get(key + settings)
+            if value is None:
+                missing.setdefault(key, []).append(row)
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key + settings)
+                crisp[row] = value
+
+        if missing:
+            self.misses += len(missing)
+            ammoIndex, healthIndex, modes = (np.array(column) for column in zip(*missing))
+            values = self.controller.evaluate(self._value(ammoIndex), self._value(healthIndex), modes,
+                                              aggregation, defuzzification, method)
+            for (key, rows), value in zip(missing.items(), values.tolist()):
+                crisp[rows] = value
+                self._store(key + settings, value)
+            # Rows that repeat a missing key inside the batch are hits of the first one
+            self.hits += sum(len(rows) - 1 for rows in missing.values())
+
+        return crisp.reshape(shape)
@@ -0,0 +1,172 @@
+# This module finds the smallest universe resolution that keeps the fuzzy logic game engine accurate
+# The resolution of every universe is a setting of the controller (FuzzyController.setResolution):
+#   action => the sampled method integrates the aggregated output on x_action, the error of the
+#             crisp action against the exact (analytic) value shrinks about as 45 / resolution
+#             for the centroid
+#   ammo, health => the inputs are fuzzified by np.interp between the points of x_ammo / x_health,
+#                   which is exact only where the corners of the terms are points of the universe
+#                   (resolution = 4k + 1 for the terms of the article)
+# The error of a resolution is measured on a points x points grid of inputs for every mode, against
+# the analytic method, only changing the universe calibrated so the errors of the others are not counted:
+#   action => the sampled method against the analytic method of the same controller
+#   ammo, health => the analytic method against the analytic method of a controller with exact
+#                   fuzzification of that input (the corners of the terms added to its universe)
+#
+# The search doubles the resolution until the error is under the tolerance, then bisects between
+# the last two resolutions. It assumes the error does not grow with the resolution, which holds
+# for the centroid. The mean of maximum of the sampled method does not converge (the maximum
+# plateau can move by a whole term when two samples tie), calibrate it with the mean statistic.
+#
+# Smallest resolutions of the default controller (51 x 51 grid, max/centroid, max error):
+#   action, tolerance 0.5 => 92 points (8.7x faster than 1000), 0.1 => 456 points (1.9x faster),
+#           0.05 => 910 points, 0.01 => 4546 points; the 1000 points of the article give 0.045
+#   ammo, health => 5 points (0, 25, 50, 75, 100) are exact, the 1000 points of the article give 0.088
+#
+# Usage: python FuzzyLogicGameCalibration.py [--tolerance 0.1] [--universe action] [--statistic max]
+
+import argparse
+import time
+
+import numpy as np
+
+from FuzzyLogicGameController import FuzzyController, defaultController
+from FuzzyLogicGameInference import universe, COMBINATIONS
+
+UNIVERSES = {'ammo': 'x_ammo', 'health': 'x_health', 'action': 'x_action'}
+STATISTICS = {'max': np.max, 'mean': np.mean, 'p99': lambda error: np.percentile(error, 99)}
+
+
+# A function that adds the corners of the terms to an input universe, so np.interp is exact
+def _withCorners(x, terms):
+    corners = [value for term in terms for value in term if x[0] <= value <= x[-1]]
+    return np.union1d(x, corners)
+
+
+# The controller the errors of a universe are measured against, used with the analytic method
+def exactController(controller, universeName='action'):
+    settings = dict(controller.settings(), precision='float64')
+    if universeName == 'ammo':
+        settings['x_ammo'] = _withCorners(controller.x_ammo, controller.ammoTerms)
+    elif universeName == 'health':
+        settings['x_health'] = _withCorners(controller.x_health, controller.healthTerms)
+    return FuzzyController(**settings)
+
+
+# Error of one resolution of a universe
+#   inputs => (ammo, health) grids the error is measured on
+#   reference => dict of (mode, aggregation, defuzzification) => exact crisp actions on the inputs
+def resolutionError(controller, resolution, universeName, inputs, reference,
+                    combinations=COMBINATIONS[:1], statistic='max'):
+    name = UNIVERSES[universeName]
+    x = getattr(controller, name)
+    candidate = FuzzyController(**dict(controller.settings(), **{name: universe(resolution, x[0], x[-1])}))
+    method = 'sampled' if universeName == 'action' else 'analytic'
+
+    errors = [np.abs(candidate.evaluate(*inputs, mode, aggregation, defuzzification, method, 'sparse')
+                     - reference[mode, aggregation, defuzzification]).ravel()
+              for mode in sorted(controller.modeWeights) for aggregation, defuzzification in combinations]
+    return float(STATISTICS[statistic](np.concatenate(errors)))
+
+
+# A function that finds the smallest resolution of a universe with an error under the tolerance
+#   universeName => 'action', 'ammo' or 'health'
+#   points => test inputs along each input axis
+#   combinations => (aggregation, defuzzification) pairs the error is measured on
+#   statistic => 'max', 'mean' or 'p99' of the absolute error over the test inputs
+# Returns a dict with the resolution found (None when even maxResolution is not accurate enough),
+# its error, the current resolution and error of the controller and every resolution measured
+def calibrateResolution(tolerance, universeName='action', controller=None, points=51,
+                        combinations=COMBINATIONS[:1], statistic='max', minResolution=5, maxResolution=8001):
+    if universeName not in UNIVERSES:
+        raise ValueError("universe must be 'action', 'ammo' or 'health', not %r" % (universeName,))
+    if statistic not in STATISTICS:
+        raise ValueError("statistic must be 'max', 'mean' or 'p99', not %r" % (statistic,))
+    if controller is None:
+        controller = defaultController()
+
+    ammo = np.linspace(controller.x_ammo[0], controller.x_ammo[-1], points)
+    health = np.linspace(controller.x_health[0], controller.x_health[-1], points)
+    inputs = np.meshgrid(ammo, health, indexing='ij')
+    exact = exactController(controller, universeName)
+    reference = {(mode, aggregation, defuzzification): exact.evaluate(*inputs, mode, aggregation, defuzzification,
+                                                                      'analytic', 'sparse')
+                 for mode in sorted(controller.modeWeights) for aggregation, defuzzification in combinations}
+
+    measured = {}
+
+    def error(resolution):
+        if resolution not in measured:
+            measured[resolution] = resolutionError(controller, resolution, universeName, inputs, reference,
+                                                   combinations, statistic)
+        return measured[resolution]
+
+    # Doubling until the tolerance is met, then bisecting between the last failing and the first passing
+    low, high = None, minResolution
+    while error(high) > tolerance:
+        if high >= maxResolution:
+            high = None
+            break
+        low, high = high, min(2 * high - 1, maxResolution)
+    if high is not None and low is not None:
+        while high - low > 1:
+            middle = (low + high) // 2
+            if error(middle) > tolerance:
+                low = middle
+            else:
+                high = middle
+
+    current = len(getattr(controller, UNIVERSES[universeName]))
+    return {'universe': universeName, 'tolerance': tolerance, 'statistic': statistic,
+            'resolution': high, 'error': measured[high] if high is not None else None,
+            'currentResolution': current, 'currentError': error(current),
+            'measured': dict(sorted(measured.items()))}
+
+
+# Seconds per decision of a controller with the sampled method, on a batch of random inputs
+def decisionSeconds(controller, batch=10000, repeats=3, seed=0):
+    rng = np.random.default_rng(seed)
+    ammo, health, mode = rng.uniform(0, 100, batch), rng.uniform(0, 100, batch), rng.integers(1, 4, batch)
+    controller.evaluateBounded(ammo, health, mode, inference='sparse')
+    start = time.perf_counter()
+    for _ in range(repeats):
+        controller.evaluateBounded(ammo, health, mode, inference='sparse')
+    return (time.perf_counter() - start) / (repeats * batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the smallest universe resolution under an error tolerance")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="largest error of the crisp action")
+    parser.add_argument('--universe', choices=sorted(UNIVERSES), default='action')
+    parser.add_argument('--statistic', choices=sorted(STATISTICS), default='max')
+    parser.add_argument('--points', type=int, default=51, help="test inputs along each input axis")
+    parser.add_argument('--all', action='store_true', help="measure all four combinations, not only max/centroid")
+    parser.add_argument('--max-resolution', type=int, default=8001)
+    parser.add_argument('--verbose', action='store_true', help="print the error of every resolution measured")
+    args = parser.parse_args(argv)
+
+    controller = defaultController()
+    result = calibrateResolution(args.tolerance, args.universe, controller, args.points,
+                                 COMBINATIONS if args.all else COMBINATIONS[:1], args.statistic,
+                                 maxResolution=args.max_resolution)
+    if args.verbose:
+        for resolution, error in result['measured'].items():
+            print("  %6d points => %s error %.4g" % (resolution, args.statistic, error))
+
+    print("current %s universe: %d points, %s error %.4g"
+          % (args.universe, result['currentResolution'], args.statistic, result['currentError']))
+    if result['resolution'] is None:
+        print("no resolution up to %d points keeps the %s error under %g"
+              % (args.max_resolution, args.statistic, args.tolerance))
+        return
+
+    print("smallest %s universe under %g: %d points, %s error %.4g"
+          % (args.universe, args.tolerance, result['resolution'], args.statistic, result['error']))
+    calibrated = FuzzyController(**controller.settings())
+    calibrated.setResolution(**{args.universe: result['resolution']})
+    before, after = decisionSeconds(controller), decisionSeconds(calibrated)
+    print("sampled method: %.2f us per decision => %.2f us per decision (x%.2f)"
+          % (before * 1e6, after * 1e6, before / after))
+
+
+if __name__ == '__main__':
+    main()
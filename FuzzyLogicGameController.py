@@ -0,0 +1,955 @@
+# This module contains a compiled version of the fuzzy logic game engine
+# The membership functions, the rule index arrays and the rule weights are built
+# once when the controller is created, so every decision only does the inference
+
+import copy
+import hashlib
+import time
+from bisect import bisect_right
+
+import numpy as np
+
+from FuzzyLogicGameAnalytic import aggregatedOutline, AnalyticCentroid, AnalyticSumCentroid, AnalyticMeanOfMax
+from FuzzyLogicGameProfiler import Profiler
+from FuzzyLogicGameInference import (triangleMembershipFunction, Centroid, MeanOfMax, CentroidBatch, MeanOfMaxBatch,
+                                     universe, x_ammo, x_health, x_action,
+                                     AMMO_TERMS, HEALTH_TERMS, ACTION_TERMS, ACTION_NAMES,
+                                     RULE_CONSEQUENTS, RULE_WEIGHT_CLASSES, MODE_WEIGHTS, COMBINATIONS,
+                                     DEFENSIVE, OFFENSIVE, NORMAL_MODE)
+
+# Default working memory of evaluateBounded, in bytes
+MEMORY_BUDGET = 64 * 2 ** 20
+
+# Working memory of one decision with the analytic method (the outline of the cut action sets),
+# measured on the sum/mom combination, the one that needs the most
+ANALYTIC_ROW_BYTES = 56 * 1024
+
+# Types of the batched sampled path (FuzzyController(precision=...))
+#   float64 => the reference
+#   float32 => memberships, rule strengths and aggregated outputs in float32, half the bandwidth
+#   uint16 => the same in fixed point, value * 65535 / (largest rule weight), a quarter of the bandwidth
+# The centroid and mean of maximum sums are always done in float64. Scalar inputs, evaluateAll,
+# profiled calls and the analytic method stay in float64.
+#
+# Difference of the crisp actions from float64, 301 x 301 grid of the universe, all three modes:
+#   precision  combination      max        mean
+#   float32    max / centroid   6.2e-07    1.0e-07
+#   float32    sum / centroid   8.7e-07    1.1e-07
+#   uint16     max / centroid   1.0e-03    1.3e-04
+#   uint16     sum / centroid   1.8e-03    1.2e-04
+# The mean of maximum of float64 already depends on rounding: the samples of a plateau can
+# differ by one unit in the last place, and float64 keeps only some of them where the lower
+# precisions keep them all. Compared with the exact analytic value (151 x 151 grid) the
+# lower precisions are as close as float64 or closer:
+#   combination   float64 max / mean   float32 max / mean   uint16 max / mean
+#   max / mom     25 / 0.053           0.050 / 0.021        0.050 / 0.021
+#   sum / mom     28 / 0.13            23 / 0.14            14 / 0.033
+# Batches of 8192 decisions use 128 MB (float64), 64 MB (float32) and 33 MB (uint16, 48 MB with
+# sum aggregation) and run 3 to 8 times faster than float64 with max aggregation.
+PRECISIONS = ['float64', 'float32', 'uint16']
+
+# Methods of evaluate
+#   sampled, analytic => Mamdani inference (cut action sets, aggregation, defuzzification)
+#   sugeno => zero-order Takagi-Sugeno inference, every action term is a singleton at its peak
+METHODS = ['sampled', 'analytic', 'sugeno']
+
+
+class FuzzyController:
+    # A rule base compiled into numpy arrays
+    #   ammoTerms, healthTerms, actionTerms => lists of triangle terms (a, b, c)
+    #   consequents => table of action term indices, one row per ammo term and one column per health term
+    #   weightClasses => table of the same shape saying if a rule is NEUTRAL, DEFENSIVE or OFFENSIVE
+    #   modeWeights => dict of mode => (defenseWeight, attackWeight)
+    #   x_ammo, x_health, x_action => the universes the membership functions are sampled on
+    #   precision => type of the action memberships, rule strengths and aggregated outputs of the
+    #                batched sampled path: 'float64', 'float32' or 'uint16' (fixed point),
+    #                see PRECISIONS for the error of the crisp actions
+    #   compiled => arrays of compiledArrays() saved from a controller with the same settings,
+    #               used instead of sampling the membership functions again (not a setting)
+
+    def __init__(self, ammoTerms=AMMO_TERMS, healthTerms=HEALTH_TERMS, actionTerms=ACTION_TERMS,
+                 consequents=RULE_CONSEQUENTS, weightClasses=RULE_WEIGHT_CLASSES, modeWeights=MODE_WEIGHTS,
+                 x_ammo=x_ammo, x_health=x_health, x_action=x_action, actionNames=ACTION_NAMES,
+                 precision='float64', compiled=None):
+        # version goes up every time the rule base is compiled again,
+        # caches of controller outputs compare it to know when they are stale
+        self.version = 0
+        # Profiler of the stages of evaluate, None => no profiling
+        self.profiler = None
+        self._compile(ammoTerms, healthTerms, actionTerms, consequents, weightClasses, modeWeights,
+                      x_ammo, x_health, x_action, actionNames, precision, compiled)
+
+    # The keyword arguments of the constructor that build this controller,
+    # FuzzyController(**dict(controller.settings(), x_action=...)) is a changed copy
+    def settings(self):
+        return dict(ammoTerms=self.ammoTerms, healthTerms=self.healthTerms, actionTerms=self.actionTerms,
+                    consequents=self.consequents, weightClasses=self.weightClasses,
+                    modeWeights=self.modeWeights, x_ammo=self.x_ammo, x_health=self.x_health,
+                    x_action=self.x_action, actionNames=self.actionNames, precision=self.precision)
+
+    # Changes part of the rule base and compiles it again
+    #   Takes the same keyword arguments as the constructor, e.g. update(modeWeights={...}),
+    #   compiled => arrays of compiledArrays() for the changed settings
+    # The rule base is compiled on a copy first, a rule base that does not compile raises
+    # and leaves the controller as it was
+    def update(self, compiled=None, **changes):
+        settings = self.settings()
+        unknown = set(changes) - set(settings)
+        if unknown:
+            raise TypeError("unknown settings: %s" % ", ".join(sorted(unknown)))
+        settings.update(changes)
+        staged = copy.copy(self)
+        staged._compile(**settings, compiled=compiled)
+        self.__dict__.update(staged.__dict__)
+        self.version += 1
+
+    # The arrays of the rule base that take the longest to build: the membership functions sampled
+    # on the universes and the tables of the terms active on every interval of the input universes
+    def compiledArrays(self):
+        return {'ammo_mf': self.ammo_mf, 'health_mf': self.health_mf, 'action_mf': self.action_mf,
+                'ammoActiveTerms': self._ammoActive[0], 'ammoActiveValid': self._ammoActive[1],
+                'healthActiveTerms': self._healthActive[0], 'healthActiveValid': self._healthActive[1]}
+
+    # Changes the (defenseWeight, attackWeight) of one mode
+    def setModeWeights(self, mode, defenseWeight, attackWeight):
+        modeWeights = dict(self.modeWeights)
+        modeWeights[mode] = (defenseWeight, attackWeight)
+        self.update(modeWeights=modeWeights)
+
+    # Number of points of the (ammo, health, action) universes
+    @property
+    def resolution(self):
+        return len(self.x_ammo), len(self.x_health), len(self.x_action)
+
+    # Resamples the universes given a number of points with evenly spaced points over the same range
+    #   ammo, health => change how exactly the inputs are fuzzified (np.interp between the points)
+    #   action => changes how exactly the sampled method integrates the aggregated output
+    def setResolution(self, ammo=None, health=None, action=None):
+        changes = {}
+        for name, resolution in (('x_ammo', ammo), ('x_health', health), ('x_action', action)):
+            if resolution is not None:
+                x = getattr(self, name)
+                changes[name] = universe(resolution, x[0], x[-1])
+        self.update(**changes)
+
+    # Starts recording the time of every stage of evaluate, returns the Profiler
+    def enableProfiling(self, profiler=None):
+        self.profiler = profiler if profiler is not None else Profiler()
+        return self.profiler
+
+    def disableProfiling(self):
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
+    # Builds all the arrays of the rule base
+    def _compile(self, ammoTerms, healthTerms, actionTerms, consequents, weightClasses, modeWeights,
+                 x_ammo, x_health, x_action, actionNames, precision='float64', compiled=None):
+        consequents = np.asarray(consequents)
+        weightClasses = np.asarray(weightClasses)
+        if consequents.shape != (len(ammoTerms), len(healthTerms)):
+            raise ValueError("consequents must have one row per ammo term and one column per health term")
+        if weightClasses.shape != consequents.shape:
+            raise ValueError("weightClasses must have the same shape as consequents")
+        if not np.isin(consequents, range(len(actionTerms))).all():
+            raise ValueError("consequents must be indices into actionTerms")
+        if precision not in PRECISIONS:
+            raise ValueError("precision must be one of %s, not %r" % (", ".join(PRECISIONS), precision))
+
+        self.ammoTerms = list(ammoTerms)
+        self.healthTerms = list(healthTerms)
+        self.actionTerms = list(actionTerms)
+        self.actionNames = list(actionNames)
+        self.precision = precision
+        self.consequents = consequents
+        self.weightClasses = weightClasses
+        self.modeWeights = dict(modeWeights)
+
+        # Universes
+        self.x_ammo = np.asarray(x_ammo, dtype=float)
+        self.x_health = np.asarray(x_health, dtype=float)
+        self.x_action = np.asarray(x_action, dtype=float)
+
+        # Membership functions, one row per term
+        if compiled is None:
+            compiled = {}
+        else:
+            self._checkCompiled(compiled)
+        self.ammo_mf = compiled.get('ammo_mf')
+        if self.ammo_mf is None:
+            self.ammo_mf = np.array([triangleMembershipFunction(self.x_ammo, *term) for term in self.ammoTerms])
+        self.health_mf = compiled.get('health_mf')
+        if self.health_mf is None:
+            self.health_mf = np.array([triangleMembershipFunction(self.x_health, *term)
+                                       for term in self.healthTerms])
+        self.action_mf = compiled.get('action_mf')
+        if self.action_mf is None:
+            self.action_mf = np.array([triangleMembershipFunction(self.x_action, *term)
+                                       for term in self.actionTerms])
+
+        # Rule index arrays, in the order rule1 ... ruleN (ammo major)
+        self.ruleAmmo, self.ruleHealth = np.divmod(np.arange(consequents.size), consequents.shape[1])
+        self.ruleAction = consequents.ravel()
+
+        # ruleTerm[r][k] is True when rule r has action term k as consequent
+        self.ruleTerm = self.ruleAction[:, None] == np.arange(len(self.actionTerms))
+
+        # ruleWeights[mode] => the weight of every rule in that mode
+        self.ruleWeights = np.ones((max(self.modeWeights) + 1, consequents.size))
+        for mode, (defenseWeight, attackWeight) in self.modeWeights.items():
+            self.ruleWeights[mode][weightClasses.ravel() == DEFENSIVE] = defenseWeight
+            self.ruleWeights[mode][weightClasses.ravel() == OFFENSIVE] = attackWeight
+        self.validModes = np.zeros(len(self.ruleWeights), dtype=bool)
+        self.validModes[list(self.modeWeights)] = True
+
+        # Plain python copies of the tables for the single decision path,
+        # where numpy call overhead costs more than the arithmetic itself
+        self._ammoTable = self._interpolationTable(self.x_ammo, self.ammo_mf)
+        self._healthTable = self._interpolationTable(self.x_health, self.health_mf)
+        self._rules = list(zip(self.ruleAmmo.tolist(), self.ruleHealth.tolist(), self.ruleAction.tolist()))
+
+        # Peak of every action term and of the consequent of every rule, the singletons of the sugeno method
+        self.actionPeaks = np.array([b for _, b, _ in self.actionTerms], dtype=float)
+        self._rulePeaks = self.actionPeaks[self.ruleAction]
+        self._ruleWeights = {mode: self.ruleWeights[mode].tolist() for mode in self.modeWeights}
+
+        # Terms that can be non-zero between two samples, for the sparse inference
+        self._ammoActive = self._activeTermTable(self.x_ammo, self.ammo_mf, compiled.get('ammoActiveTerms'),
+                                                 compiled.get('ammoActiveValid'))
+        self._healthActive = self._activeTermTable(self.x_health, self.health_mf, compiled.get('healthActiveTerms'),
+                                                   compiled.get('healthActiveValid'))
+        self._ammoSlopes = np.array(self._ammoTable[2])
+        self._healthSlopes = np.array(self._healthTable[2])
+
+        # Action memberships in the type of the precision
+        #   uint16 stores round(value * fixedScale), the scale leaves room for the largest rule weight
+        self.fixedScale = 65535 / max(1.0, float(self.ruleWeights.max()))
+        if precision == 'uint16':
+            self._actionLow = np.rint(self.action_mf * self.fixedScale).astype(np.uint16)
+        else:
+            self._actionLow = self.action_mf.astype(precision)
+
+    # Checks the shapes of arrays of compiledArrays() against the settings being compiled
+    def _checkCompiled(self, compiled):
+        shapes = {'ammo_mf': (len(self.ammoTerms), len(self.x_ammo)),
+                  'health_mf': (len(self.healthTerms), len(self.x_health)),
+                  'action_mf': (len(self.actionTerms), len(self.x_action))}
+        for name, array in compiled.items():
+            if name not in ('ammo_mf', 'health_mf', 'action_mf', 'ammoActiveTerms', 'ammoActiveValid',
+                            'healthActiveTerms', 'healthActiveValid'):
+                raise ValueError("unknown compiled array %r" % (name,))
+            universeLength = len(self.x_ammo) if name.startswith('ammo') else len(self.x_health)
+            if np.shape(array)[:1] != (shapes[name][0] if name in shapes else universeLength - 1,) or (
+                    name in shapes and np.shape(array) != shapes[name]):
+                raise ValueError("compiled array %r does not match the settings" % (name,))
+
+    # Universe, membership values and slopes of every term as python lists
+    @staticmethod
+    def _interpolationTable(x, mf):
+        slopes = (mf[:, 1:] - mf[:, :-1]) / (x[1:] - x[:-1])
+        return x.tolist(), mf.tolist(), slopes.tolist()
+
+    # Degree of membership of every term for one value
+    # It follows the steps of np.interp so it gives exactly the same numbers
+    @staticmethod
+    def _interpolateScalar(table, value):
+        x, mf, slopes = table
+        if value >= x[-1]:
+            return [y[-1] for y in mf]
+        if value < x[0]:
+            return [y[0] for y in mf]
+        j = bisect_right(x, value) - 1
+        if x[j] == value:
+            return [y[j] for y in mf]
+        dx = value - x[j]
+        return [slope[j] * dx + y[j] for slope, y in zip(slopes, mf)]
+
+    # Terms with a non-zero membership on each interval [x[j], x[j + 1]] of a universe
+    #   Returns (terms, valid, termLists, step)
+    #   terms[j] => the active terms of interval j in increasing order, padded to the same width
+    #   valid[j] => False for the padding
+    #   termLists[j] => the same terms as a python list
+    #   step => the sample spacing of a uniform universe, None when the samples are not evenly spaced
+    # Triangles that overlap pairwise give at most two active terms, the sampled ones
+    # can give three on the interval around a peak
+    #   terms, valid => the tables of compiledArrays(), None => built from mf
+    @staticmethod
+    def _activeTermTable(x, mf, terms=None, valid=None):
+        if terms is None or valid is None:
+            nonzero = mf > 0
+            active = (nonzero[:, :-1] | nonzero[:, 1:]).T
+            width = max(int(active.sum(axis=1).max()), 1)
+            terms = np.argsort(~active, axis=1, kind='stable')[:, :width]
+            valid = np.take_along_axis(active, terms, axis=1)
+        # The active terms come first in every row, so the valid ones are a prefix
+        termLists = [row[:count] for row, count in zip(terms.tolist(), valid.sum(axis=1).tolist())]
+
+        step = (x[-1] - x[0]) / (len(x) - 1)
+        if not np.allclose(np.diff(x), step, rtol=1e-9, atol=0):
+            step = None
+        return terms, valid, termLists, step
+
+    # Index j of the interval x[j] <= value < x[j + 1] of every value, found by dividing
+    # by the sample spacing instead of searching (the division is checked against the
+    # samples, so the index is the one np.interp uses)
+    @staticmethod
+    def _intervals(x, step, values):
+        if step is None:
+            return np.clip(np.searchsorted(x, values, side='right') - 1, 0, len(x) - 2)
+        with np.errstate(invalid='ignore'):
+            j = np.clip(np.nan_to_num((values - x[0]) / step), 0, len(x) - 2).astype(np.intp)
+        j -= (x[j] > values) & (j > 0)
+        j += (x[j + 1] <= values) & (j < len(x) - 2)
+        return j
+
+    # Active terms and their degree of membership for an array of values, shapes (batch, width)
+    # The degrees follow the steps of np.interp so they are exactly the same numbers
+    def _activeLevels(self, x, mf, slopes, active, values):
+        terms, valid, _, step = active
+        j = self._intervals(x, step, values)
+        activeTerms = terms[j]
+        columns = j[:, None]
+        levels = slopes[activeTerms, columns] * (values - x[j])[:, None] + mf[activeTerms, columns]
+
+        levels = np.where((x[j] == values)[:, None], mf[activeTerms, columns], levels)
+        levels = np.where((values < x[0])[:, None], mf[activeTerms, 0], levels)
+        levels = np.where((values >= x[-1])[:, None], mf[activeTerms, -1], levels)
+        return activeTerms, np.where(valid[j], levels, 0.0)
+
+    # Active terms and their degree of membership for one value, as python lists
+    @staticmethod
+    def _activeLevelsScalar(table, active, value):
+        x, mf, slopes = table
+        _, _, termLists, step = active
+        if value >= x[-1]:
+            return termLists[-1], [mf[t][-1] for t in termLists[-1]]
+        if value < x[0]:
+            return termLists[0], [mf[t][0] for t in termLists[0]]
+        if step is None:
+            j = bisect_right(x, value) - 1
+        else:
+            j = min(int((value - x[0]) / step), len(x) - 2)
+            if x[j] > value:
+                j -= 1
+            elif x[j + 1] <= value:
+                j += 1
+        terms = termLists[j]
+        if x[j] == value:
+            return terms, [mf[t][j] for t in terms]
+        dx = value - x[j]
+        return terms, [slopes[t][j] * dx + mf[t][j] for t in terms]
+
+    @property
+    def nRules(self):
+        return len(self.ruleAction)
+
+    # A hash of everything that changes the output of the controller
+    # Files built from a controller (like lookup tables) store it to find out when they are stale
+    def fingerprint(self):
+        digest = hashlib.sha256()
+        for array in (self.x_ammo, self.x_health, self.x_action,
+                      np.array(self.ammoTerms, dtype=float), np.array(self.healthTerms, dtype=float),
+                      np.array(self.actionTerms, dtype=float), self.consequents, self.weightClasses,
+                      np.array(sorted((m, d, a) for m, (d, a) in self.modeWeights.items()), dtype=float)):
+            array = np.ascontiguousarray(array, dtype=float)
+            digest.update(repr(array.shape).encode())
+            digest.update(array.tobytes())
+        # float64 controllers keep the fingerprint they had before there was a precision setting
+        if self.precision != 'float64':
+            digest.update(self.precision.encode())
+        return digest.hexdigest()
+
+    # Degree of membership of every ammo and health term, shapes (batch, terms)
+    def fuzzify(self, ammo, health):
+        ammo_levels = np.stack([np.interp(ammo, self.x_ammo, mf) for mf in self.ammo_mf], axis=-1)
+        health_levels = np.stack([np.interp(health, self.x_health, mf) for mf in self.health_mf], axis=-1)
+        return ammo_levels, health_levels
+
+    def _checkModes(self, mode):
+        if mode.size and (mode.min() < 0 or mode.max() >= len(self.validModes) or not self.validModes[mode].all()):
+            raise ValueError("Select a value from the specified options: %s"
+                             % ", ".join(str(m) for m in sorted(self.modeWeights)))
+
+    # Weight of every rule for an array of modes, shape (batch, rules)
+    def modeRuleWeights(self, mode):
+        mode = np.asarray(mode)
+        self._checkModes(mode)
+        return self.ruleWeights[mode]
+
+    # Firing strength of every rule (AND => MIN operator) times its mode weight, shape (batch, rules)
+    def ruleStrengths(self, ammo_levels, health_levels, mode=NORMAL_MODE):
+        rules = np.fmin(ammo_levels[:, self.ruleAmmo], health_levels[:, self.ruleHealth])
+        return rules * self.modeRuleWeights(mode)
+
+    # Firing strength of the rules of the active terms only, shapes (batch, slots)
+    #   Returns (rule index, strength) of every slot, the slots of a row are in rule order
+    #   and the padding slots have strength 0
+    def sparseRuleStrengths(self, ammo, health, mode=NORMAL_MODE):
+        mode = np.asarray(mode)
+        self._checkModes(mode)
+        return self.sparseFire(self.sparseFuzzify(ammo, health), mode)
+
+    # Active terms and degrees of membership of the inputs, (ammoTerms, ammo_levels, healthTerms, health_levels)
+    def sparseFuzzify(self, ammo, health):
+        return (self._activeLevels(self.x_ammo, self.ammo_mf, self._ammoSlopes, self._ammoActive, ammo)
+                + self._activeLevels(self.x_health, self.health_mf, self._healthSlopes, self._healthActive, health))
+
+    # Rule index and firing strength of every slot from the output of sparseFuzzify
+    def sparseFire(self, active, mode):
+        ruleIndex, rules = self.sparseFireUnweighted(active)
+        weights = self.ruleWeights[np.broadcast_to(mode, (len(rules),))[:, None], ruleIndex]
+        return ruleIndex, rules * weights
+
+    # Rule index and firing strength (AND => MIN operator) of every slot before the mode weights,
+    # which do not depend on the mode
+    def sparseFireUnweighted(self, active):
+        ammoTerms, ammo_levels, healthTerms, health_levels = active
+        # The shape is given in full, -1 cannot be resolved for an empty batch
+        shape = (len(ammo_levels), ammoTerms.shape[1] * healthTerms.shape[1])
+        ruleIndex = (ammoTerms[:, :, None] * len(self.healthTerms) + healthTerms[:, None, :]).reshape(shape)
+        rules = np.fmin(ammo_levels[:, :, None], health_levels[:, None, :]).reshape(shape)
+        return ruleIndex, rules
+
+    # The sparse rule strengths as a (batch, rules) array like ruleStrengths
+    def denseRuleStrengths(self, ruleIndex, rules):
+        dense = np.zeros((len(rules), self.nRules))
+        fired = rules != 0
+        dense[np.nonzero(fired)[0], ruleIndex[fired]] = rules[fired]
+        return dense
+
+    # Strength of the strongest rule pointing to every action term, shape (batch, action terms)
+    #   Cutting every action set only once at this height gives the same area
+    #   as cutting it for every rule and taking the max
+    def termCuts(self, rules):
+        return np.max(np.where(self.ruleTerm, rules[:, :, None], 0), axis=1)
+
+    # Aggregated output area of every row, shape (batch, len(x_action))
+    #   out => optional buffer of that shape the output is reduced into
+    #   area => optional buffer of the same shape for the cut action sets
+    def aggregate(self, rules, aggregation='max', out=None, area=None):
+        if aggregation == 'max':
+            return self._aggregateCuts(self.termCuts(rules), out, area)
+        elif aggregation == 'sum':
+            aggregated_output = self._outputBuffer(len(rules), out)
+            # Rules that do not fire in any row add nothing and are skipped
+            for r in np.flatnonzero(rules.any(axis=0)):
+                aggregated_output += np.fmin(self.action_mf[self.ruleAction[r]], rules[:, r, None], out=area)
+        else:
+            raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+
+        return aggregated_output
+
+    # An aggregated output of zeros, in out when it is given
+    def _outputBuffer(self, batch, out=None):
+        if out is None:
+            return np.zeros((batch, len(self.x_action)))
+        out.fill(0)
+        return out
+
+    # Max aggregated output of the action sets cut at the given heights, shape (batch, len(x_action))
+    def _aggregateCuts(self, termCuts, out=None, area=None):
+        aggregated_output = self._outputBuffer(len(termCuts), out)
+        for k in range(len(self.actionTerms)):
+            if termCuts[:, k].any():
+                np.fmax(aggregated_output, np.fmin(self.action_mf[k], termCuts[:, k, None], out=area),
+                        out=aggregated_output)
+        return aggregated_output
+
+    # termCuts from the sparse rule strengths, shape (batch, action terms)
+    def sparseTermCuts(self, ruleIndex, rules):
+        rows = np.arange(len(rules))
+        actions = self.ruleAction[ruleIndex]
+        termCuts = np.zeros((len(rules), len(self.actionTerms)))
+        for slot in range(rules.shape[1]):
+            termCuts[rows, actions[:, slot]] = np.maximum(termCuts[rows, actions[:, slot]], rules[:, slot])
+        return termCuts
+
+    # Aggregated output of every row from the sparse rule strengths, the same numbers as aggregate
+    #   Slots that do not fire add exactly 0 to a sum, so adding the slots of every row
+    #   in rule order repeats the additions of the dense path
+    def aggregateSparse(self, ruleIndex, rules, aggregation='max', out=None, area=None):
+        if aggregation == 'max':
+            return self._aggregateCuts(self.sparseTermCuts(ruleIndex, rules), out, area)
+        elif aggregation == 'sum':
+            actions = self.ruleAction[ruleIndex]
+            aggregated_output = self._outputBuffer(len(rules), out)
+            for slot in range(rules.shape[1]):
+                if rules[:, slot].any():
+                    clipped = np.take(self.action_mf, actions[:, slot], axis=0, out=area, mode='clip')
+                    aggregated_output += np.fmin(clipped, rules[:, slot, None], out=clipped)
+            return aggregated_output
+        raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+
+    # Max and sum aggregated outputs built in one loop over the cut action sets,
+    # shape (2, batch, len(x_action)) with the max output first
+    #   rules => dense rule strengths, or the slots of sparseRuleStrengths with their ruleIndex
+    #   Every cut action set is made once, in a reused buffer, and added to both outputs,
+    #   which give the same numbers as aggregate and aggregateSparse
+    def aggregateAll(self, rules, ruleIndex=None):
+        aggregated_output = np.zeros((2, len(rules), len(self.x_action)))
+        maxOutput, sumOutput = aggregated_output
+        area = np.empty((len(rules), len(self.x_action)))
+
+        for column in np.flatnonzero(rules.any(axis=0)):
+            if ruleIndex is None:
+                np.fmin(self.action_mf[self.ruleAction[column]], rules[:, column, None], out=area)
+            else:
+                np.take(self.action_mf, self.ruleAction[ruleIndex[:, column]], axis=0, out=area, mode='clip')
+                np.fmin(area, rules[:, column, None], out=area)
+            np.fmax(maxOutput, area, out=maxOutput)
+            sumOutput += area
+
+        return aggregated_output
+
+    # Rule strengths in the type of the precision
+    def _lowRules(self, rules):
+        if self.precision == 'uint16':
+            return np.rint(rules * self.fixedScale).astype(np.uint16)
+        return rules.astype(self.precision)
+
+    # aggregate / aggregateSparse with the action memberships, rule strengths and aggregated
+    # output in the type of the precision (sums of uint16 are kept in uint32)
+    #   ruleIndex => the rule index of sparse rule strengths, None for dense ones
+    def aggregateLow(self, rules, aggregation='max', ruleIndex=None):
+        batch = len(rules)
+        if aggregation == 'max':
+            termCuts = self.termCuts(rules) if ruleIndex is None else self.sparseTermCuts(ruleIndex, rules)
+            termCuts = self._lowRules(termCuts)
+            aggregated_output = np.zeros((batch, len(self.x_action)), dtype=self._actionLow.dtype)
+            for k in range(len(self.actionTerms)):
+                if termCuts[:, k].any():
+                    np.maximum(aggregated_output, np.minimum(self._actionLow[k], termCuts[:, k, None]),
+                               out=aggregated_output)
+            return aggregated_output
+        elif aggregation == 'sum':
+            rules = self._lowRules(rules)
+            accumulator = np.uint32 if self.precision == 'uint16' else self._actionLow.dtype
+            aggregated_output = np.zeros((batch, len(self.x_action)), dtype=accumulator)
+            area = np.empty((batch, len(self.x_action)), dtype=self._actionLow.dtype)
+            for column in np.flatnonzero(rules.any(axis=0)):
+                if ruleIndex is None:
+                    np.minimum(self._actionLow[self.ruleAction[column]], rules[:, column, None], out=area)
+                else:
+                    np.take(self._actionLow, self.ruleAction[ruleIndex[:, column]], axis=0, out=area, mode='clip')
+                    np.minimum(area, rules[:, column, None], out=area)
+                aggregated_output += area
+            return aggregated_output
+        raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+
+    # Crisp value of every row of an aggregated output of aggregateLow
+    #   The sums are done in float64 (einsum casts the rows in small blocks), the fixed point
+    #   scale cancels out in both the centroid and the mean of maximum
+    def defuzzifyLow(self, aggregated_output, defuzzification='centroid'):
+        if defuzzification == 'centroid':
+            return (np.einsum('bn,n->b', aggregated_output, self.x_action)
+                    / np.sum(aggregated_output, axis=1, dtype=np.float64))
+        elif defuzzification == 'mom':
+            isMax = aggregated_output == np.max(aggregated_output, axis=1, keepdims=True)
+            return np.einsum('bn,n->b', isMax, self.x_action) / np.sum(isMax, axis=1)
+        raise ValueError("defuzzification must be 'centroid' or 'mom', not %r" % (defuzzification,))
+
+    # Crisp value of every row of the aggregated output
+    def defuzzify(self, aggregated_output, defuzzification='centroid'):
+        if defuzzification == 'centroid':
+            return CentroidBatch(self.x_action, aggregated_output)
+        elif defuzzification == 'mom':
+            return MeanOfMaxBatch(self.x_action, aggregated_output)
+        raise ValueError("defuzzification must be 'centroid' or 'mom', not %r" % (defuzzification,))
+
+    # defuzzify writing into out, with work (same shape as the aggregated output) for the products
+    # Same steps as CentroidBatch and MeanOfMaxBatch, so the same numbers
+    def _defuzzifyInto(self, aggregated_output, defuzzification, work, out):
+        if defuzzification == 'centroid':
+            np.multiply(self.x_action, aggregated_output, out=work)
+            np.divide(np.sum(work, axis=1), np.sum(aggregated_output, axis=1), out=out)
+        elif defuzzification == 'mom':
+            isMax = aggregated_output == np.max(aggregated_output, axis=1, keepdims=True)
+            np.multiply(self.x_action, isMax, out=work)
+            np.divide(np.sum(work, axis=1), np.sum(isMax, axis=1), out=out)
+        else:
+            raise ValueError("defuzzification must be 'centroid' or 'mom', not %r" % (defuzzification,))
+        return out
+
+    # Crisp value of every row computed exactly from the corners of the cut action sets
+    # instead of the sampled aggregated output
+    def defuzzifyAnalytic(self, rules, aggregation='max', defuzzification='centroid'):
+        if aggregation == 'max':
+            terms, heights = self.actionTerms, self.termCuts(rules)
+        else:
+            terms, heights = [self.actionTerms[k] for k in self.ruleAction], rules
+            if defuzzification == 'centroid':
+                return AnalyticSumCentroid(terms, heights)
+        xs, fs = aggregatedOutline(terms, heights, self.x_action[0], self.x_action[-1], aggregation)
+
+        if defuzzification == 'centroid':
+            return AnalyticCentroid(xs, fs)
+        elif defuzzification == 'mom':
+            return AnalyticMeanOfMax(xs, fs)
+        raise ValueError("defuzzification must be 'centroid' or 'mom', not %r" % (defuzzification,))
+
+    # Crisp value of every row with zero-order Sugeno inference: the average of the peaks of the
+    # consequents weighted by the rule strengths (the aggregation and defuzzification are not used)
+    #   ruleIndex => the rule index of sparse rule strengths, None for dense ones
+    #   The rules are added one column at a time in rule order, so dense and sparse rule
+    #   strengths give the same numbers
+    def defuzzifySugeno(self, rules, ruleIndex=None):
+        weighted = np.zeros(len(rules))
+        total = np.zeros(len(rules))
+        for column in np.flatnonzero(rules.any(axis=0)):
+            peaks = self._rulePeaks[column] if ruleIndex is None else self._rulePeaks[ruleIndex[:, column]]
+            weighted += rules[:, column] * peaks
+            total += rules[:, column]
+        return weighted / total
+
+    # (action term, strength) of the rules of the active terms of one decision, in rule order
+    def _sparseRulesScalar(self, ammo, health, weights):
+        ammoTerms, ammo_levels = self._activeLevelsScalar(self._ammoTable, self._ammoActive, ammo)
+        healthTerms, health_levels = self._activeLevelsScalar(self._healthTable, self._healthActive, health)
+        nHealth = len(self.healthTerms)
+        rules = []
+        for a, ammo_level in zip(ammoTerms, ammo_levels):
+            for h, health_level in zip(healthTerms, health_levels):
+                r = a * nHealth + h
+                rules.append((self._rules[r][2], min(ammo_level, health_level) * weights[r]))
+        return rules
+
+    # Crisp values of the four combinations from the rule strengths with the analytic method,
+    # the max outline is used for both its centroid and its mean of maximum
+    def defuzzifyAllAnalytic(self, rules):
+        maxOutline = aggregatedOutline(self.actionTerms, self.termCuts(rules),
+                                       self.x_action[0], self.x_action[-1], 'max')
+        ruleTerms = [self.actionTerms[k] for k in self.ruleAction]
+        sumOutline = aggregatedOutline(ruleTerms, rules, self.x_action[0], self.x_action[-1], 'sum')
+        return {('max', 'centroid'): AnalyticCentroid(*maxOutline),
+                ('sum', 'centroid'): AnalyticSumCentroid(ruleTerms, rules),
+                ('max', 'mom'): AnalyticMeanOfMax(*maxOutline),
+                ('sum', 'mom'): AnalyticMeanOfMax(*sumOutline)}
+
+    # Crisp action for one decision, with the same steps as evaluate done on python floats
+    def _evaluateScalar(self, ammo, health, mode, aggregation, defuzzification, inference='dense',
+                        method='sampled'):
+        if mode not in self._ruleWeights:
+            self.modeRuleWeights(mode)  # raises the error for an unknown mode
+        weights = self._ruleWeights[mode]
+        if inference == 'sparse':
+            rules = self._sparseRulesScalar(float(ammo), float(health), weights)
+        else:
+            ammo_levels = self._interpolateScalar(self._ammoTable, float(ammo))
+            health_levels = self._interpolateScalar(self._healthTable, float(health))
+            rules = [(k, min(ammo_levels[a], health_levels[h]) * weight)
+                     for (a, h, k), weight in zip(self._rules, weights)]
+
+        if method == 'sugeno':
+            weighted = total = 0.0
+            for k, rule in rules:
+                weighted += rule * self.actionPeaks[k]
+                total += rule
+            return weighted / total if total else float('nan')
+
+        aggregated_output = np.zeros(len(self.x_action))
+        if aggregation == 'max':
+            termCuts = [0.0] * len(self.actionTerms)
+            for k, rule in rules:
+                termCuts[k] = max(termCuts[k], rule)
+            for k, cut in enumerate(termCuts):
+                if cut > 0:
+                    np.fmax(aggregated_output, np.fmin(self.action_mf[k], cut), out=aggregated_output)
+        elif aggregation == 'sum':
+            for k, rule in rules:
+                if rule > 0:
+                    aggregated_output += np.fmin(self.action_mf[k], rule)
+        else:
+            raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+
+        if defuzzification == 'centroid':
+            return float(Centroid(self.x_action, aggregated_output))
+        elif defuzzification == 'mom':
+            return float(MeanOfMax(self.x_action, aggregated_output))
+        raise ValueError("defuzzification must be 'centroid' or 'mom', not %r" % (defuzzification,))
+
+    # Crisp action of every row from the sparse rule strengths, the last stages of evaluate
+    def defuzzifySparse(self, ruleIndex, rules, aggregation='max', defuzzification='centroid', method='sampled'):
+        if method == 'analytic':
+            return self.defuzzifyAnalytic(self.denseRuleStrengths(ruleIndex, rules), aggregation, defuzzification)
+        elif method == 'sugeno':
+            return self.defuzzifySugeno(rules, ruleIndex)
+        elif self.precision != 'float64':
+            return self.defuzzifyLow(self.aggregateLow(rules, aggregation, ruleIndex), defuzzification)
+        return self.defuzzify(self.aggregateSparse(ruleIndex, rules, aggregation), defuzzification)
+
+    # Crisp action for scalar or array inputs
+    #   Returns a float for scalar inputs and an array with the shape of the inputs otherwise
+    #   aggregation => 'max' or 'sum'
+    #   defuzzification => 'centroid' or 'mom' (mean of maximum)
+    #   method => 'sampled' defuzzifies the aggregated output sampled on x_action,
+    #             'analytic' computes the exact value from the corners of the cut action sets,
+    #             'sugeno' takes the weighted average of the action peaks (defuzzifySugeno),
+    #             without aggregated output, see FuzzyLogicGameSugeno.py for its distance to Mamdani
+    #   inference => 'dense' evaluates every rule,
+    #                'sparse' finds the active terms of each input from its interval on the universe
+    #                and only evaluates their rules, with exactly the same results
+    def evaluate(self, ammo, health, mode=NORMAL_MODE, aggregation='max', defuzzification='centroid',
+                 method='sampled', inference='dense'):
+        if method not in METHODS:
+            raise ValueError("method must be 'sampled', 'analytic' or 'sugeno', not %r" % (method,))
+        if inference not in ('dense', 'sparse'):
+            raise ValueError("inference must be 'dense' or 'sparse', not %r" % (inference,))
+        if self.profiler is not None:
+            return self._evaluateProfiled(ammo, health, mode, aggregation, defuzzification, method, inference)
+        if method != 'analytic' and np.ndim(ammo) == 0 and np.ndim(health) == 0 and np.ndim(mode) == 0:
+            return self._evaluateScalar(ammo, health, int(mode), aggregation, defuzzification, inference, method)
+
+        ammo, health, mode = np.broadcast_arrays(np.asarray(ammo, dtype=float),
+                                                 np.asarray(health, dtype=float),
+                                                 np.asarray(mode))
+        shape = ammo.shape
+
+        if inference == 'sparse':
+            ruleIndex, rules = self.sparseRuleStrengths(ammo.ravel(), health.ravel(), mode.ravel())
+            crisp = self.defuzzifySparse(ruleIndex, rules, aggregation, defuzzification, method)
+        else:
+            ammo_levels, health_levels = self.fuzzify(ammo.ravel(), health.ravel())
+            rules = self.ruleStrengths(ammo_levels, health_levels, mode.ravel())
+            if method == 'analytic':
+                crisp = self.defuzzifyAnalytic(rules, aggregation, defuzzification)
+            elif method == 'sugeno':
+                crisp = self.defuzzifySugeno(rules)
+            elif self.precision != 'float64':
+                crisp = self.defuzzifyLow(self.aggregateLow(rules, aggregation), defuzzification)
+            else:
+                crisp = self.defuzzify(self.aggregate(rules, aggregation), defuzzification)
+
+        crisp = crisp.reshape(shape)
+        if shape == ():
+            return float(crisp)
+        return crisp
+
+
+    # Crisp actions of all four combinations for scalar or array inputs, for logging and comparing them
+    #   Returns an array with the shape of the inputs plus a last axis of length 4,
+    #   in the order of COMBINATIONS (max/centroid, sum/centroid, max/mom, sum/mom)
+    #   The inputs are fuzzified and the rules fired once, both aggregated outputs are built
+    #   in one loop (aggregateAll) and defuzzified together, with the same numbers as four
+    #   batched calls of evaluate
+    def evaluateAll(self, ammo, health, mode=NORMAL_MODE, method='sampled', inference='dense'):
+        if method not in ('sampled', 'analytic'):
+            raise ValueError("method must be 'sampled' or 'analytic', not %r" % (method,))
+        if inference not in ('dense', 'sparse'):
+            raise ValueError("inference must be 'dense' or 'sparse', not %r" % (inference,))
+
+        ammo, health, mode = np.broadcast_arrays(np.asarray(ammo, dtype=float),
+                                                 np.asarray(health, dtype=float),
+                                                 np.asarray(mode))
+        shape = ammo.shape
+
+        ruleIndex = None
+        if inference == 'sparse':
+            ruleIndex, rules = self.sparseRuleStrengths(ammo.ravel(), health.ravel(), mode.ravel())
+        else:
+            ammo_levels, health_levels = self.fuzzify(ammo.ravel(), health.ravel())
+            rules = self.ruleStrengths(ammo_levels, health_levels, mode.ravel())
+
+        if method == 'analytic':
+            if ruleIndex is not None:
+                rules = self.denseRuleStrengths(ruleIndex, rules)
+            crisp = self.defuzzifyAllAnalytic(rules)
+        else:
+            aggregated_output = self.aggregateAll(rules, ruleIndex)
+            both = aggregated_output.reshape(-1, len(self.x_action))
+            centroid = CentroidBatch(self.x_action, both).reshape(2, -1)
+            mom = MeanOfMaxBatch(self.x_action, both).reshape(2, -1)
+            crisp = {('max', 'centroid'): centroid[0], ('sum', 'centroid'): centroid[1],
+                     ('max', 'mom'): mom[0], ('sum', 'mom'): mom[1]}
+
+        return np.stack([crisp[combination] for combination in COMBINATIONS], axis=-1).reshape(shape + (4,))
+
+    # Working memory of one decision in evaluateBounded, in bytes
+    def rowBytes(self, method='sampled'):
+        # rule strengths and term cuts with their temporaries
+        rules = 8 * self.nRules * (4 + len(self.actionTerms))
+        if method == 'analytic':
+            return ANALYTIC_ROW_BYTES + rules
+        if method == 'sugeno':
+            # weighted sum, total and the peaks of a column
+            return 24 + rules
+        if self.precision == 'float64':
+            # aggregated output, cut action set and defuzzification products (float64) and the maxima (bool)
+            return 25 * len(self.x_action) + rules
+        # aggregated output (sums of uint16 in uint32), cut action set and its temporary and the maxima (bool)
+        itemsize = self._actionLow.itemsize
+        return (max(itemsize, 4) + 2 * itemsize + 1) * len(self.x_action) + rules
+
+    # evaluate for batches of any size with bounded working memory
+    #   memoryBudget => bytes of working memory, the inputs and the output are not counted
+    #   out => optional float64 array with the shape of the inputs the actions are written into
+    # The batch is split in chunks of memoryBudget // rowBytes(method) decisions. The aggregated
+    # output of a chunk is reduced in place, one cut action set at a time, into buffers that are
+    # allocated once and reused by every chunk, so the peak memory does not grow with the batch.
+    # The results are the same as evaluate (for the analytic method up to rounding, as the
+    # corners of the outlines of a batch are padded to the longest outline of that batch).
+    def evaluateBounded(self, ammo, health, mode=NORMAL_MODE, aggregation='max', defuzzification='centroid',
+                        method='sampled', inference='dense', memoryBudget=MEMORY_BUDGET, out=None):
+        if method not in METHODS:
+            raise ValueError("method must be 'sampled', 'analytic' or 'sugeno', not %r" % (method,))
+        if inference not in ('dense', 'sparse'):
+            raise ValueError("inference must be 'dense' or 'sparse', not %r" % (inference,))
+        chunkSize = memoryBudget // self.rowBytes(method)
+        if chunkSize < 1:
+            raise ValueError("memoryBudget must hold at least one decision (%d bytes)" % self.rowBytes(method))
+
+        ammo, health, mode = (np.asarray(ammo, dtype=float), np.asarray(health, dtype=float), np.asarray(mode))
+        shape = np.broadcast_shapes(ammo.shape, health.shape, mode.shape)
+        if out is None:
+            out = np.empty(shape)
+        elif out.shape != shape or out.dtype != np.float64 or not out.flags.c_contiguous:
+            raise ValueError("out must be a contiguous float64 array of shape %r" % (shape,))
+        crisp = out.reshape(-1)
+        batch = crisp.size
+
+        # Inputs of the whole shape are read through flat views, single values are repeated per chunk
+        # (broadcasting one input against the others only copies that input)
+        def flat(values):
+            if values.size == 1:
+                return values.reshape(())
+            return np.broadcast_to(values, shape).reshape(-1)
+
+        ammo, health, mode = flat(ammo), flat(health), flat(mode)
+        self._checkModes(mode)
+
+        chunkSize = min(chunkSize, batch)
+        if method == 'sampled' and self.precision == 'float64':
+            buffers = np.empty((3, chunkSize, len(self.x_action)))
+        for start in range(0, batch, chunkSize):
+            stop = min(start + chunkSize, batch)
+            a, h, m = (np.broadcast_to(values, (stop - start,)) if values.ndim == 0 else values[start:stop]
+                       for values in (ammo, health, mode))
+
+            if inference == 'sparse':
+                ruleIndex, rules = self.sparseRuleStrengths(a, h, m)
+            else:
+                rules = self.ruleStrengths(*self.fuzzify(a, h), m)
+
+            if method == 'analytic':
+                if inference == 'sparse':
+                    rules = self.denseRuleStrengths(ruleIndex, rules)
+                crisp[start:stop] = self.defuzzifyAnalytic(rules, aggregation, defuzzification)
+                continue
+            if method == 'sugeno':
+                crisp[start:stop] = self.defuzzifySugeno(rules, ruleIndex if inference == 'sparse' else None)
+                continue
+            if self.precision != 'float64':
+                aggregated_output = self.aggregateLow(rules, aggregation, ruleIndex if inference == 'sparse' else None)
+                crisp[start:stop] = self.defuzzifyLow(aggregated_output, defuzzification)
+                continue
+
+            aggregated_output, area, work = buffers[:, :stop - start]
+            if inference == 'sparse':
+                self.aggregateSparse(ruleIndex, rules, aggregation, aggregated_output, area)
+            else:
+                self.aggregate(rules, aggregation, aggregated_output, area)
+            self._defuzzifyInto(aggregated_output, defuzzification, work, crisp[start:stop])
+
+        if shape == ():
+            return float(out)
+        return out
+
+    # evaluate with the time of every stage recorded by self.profiler
+    #   The stages are run one after the other (the action sets are all cut before they are
+    #   aggregated), with the same arithmetic as evaluate, so the results are the same
+    def _evaluateProfiled(self, ammo, health, mode, aggregation, defuzzification, method, inference):
+        if aggregation not in ('max', 'sum'):
+            raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+        if defuzzification not in ('centroid', 'mom'):
+            raise ValueError("defuzzification must be 'centroid' or 'mom', not %r" % (defuzzification,))
+        profiler = self.profiler
+        scalar = np.ndim(ammo) == 0 and np.ndim(health) == 0 and np.ndim(mode) == 0
+        ammo, health, mode = np.broadcast_arrays(np.asarray(ammo, dtype=float),
+                                                 np.asarray(health, dtype=float),
+                                                 np.asarray(mode))
+        shape = ammo.shape
+        ammo, health, mode = ammo.ravel(), health.ravel(), mode.ravel()
+        batch = len(ammo)
+        self._checkModes(mode)
+
+        start = time.perf_counter()
+        if inference == 'sparse':
+            active = self.sparseFuzzify(ammo, health)
+        else:
+            ammo_levels, health_levels = self.fuzzify(ammo, health)
+        end = time.perf_counter()
+        profiler.record('fuzzification', start, end, batch)
+
+        start = end
+        if inference == 'sparse':
+            ruleIndex, rules = self.sparseFire(active, mode)
+            actions = self.ruleAction[ruleIndex]
+            firings = np.bincount(ruleIndex[rules > 0], minlength=self.nRules)
+        else:
+            rules = self.ruleStrengths(ammo_levels, health_levels, mode)
+            firings = np.count_nonzero(rules > 0, axis=0)
+        end = time.perf_counter()
+        profiler.record('rule firing', start, end, batch)
+        profiler.countRules(firings, batch)
+
+        if method == 'analytic':
+            start = end
+            if inference == 'sparse':
+                rules = self.denseRuleStrengths(ruleIndex, rules)
+            crisp = self.defuzzifyAnalytic(rules, aggregation, defuzzification)
+            profiler.record('defuzzification', start, time.perf_counter(), batch)
+        elif method == 'sugeno':
+            start = end
+            crisp = self.defuzzifySugeno(rules, ruleIndex if inference == 'sparse' else None)
+            profiler.record('defuzzification', start, time.perf_counter(), batch)
+        else:
+            # Implication => the cut action sets, in the order they are aggregated
+            start = end
+            if aggregation == 'max':
+                if inference == 'sparse':
+                    termCuts = self.sparseTermCuts(ruleIndex, rules)
+                else:
+                    termCuts = self.termCuts(rules)
+                areas = [np.fmin(self.action_mf[k], termCuts[:, k, None])
+                         for k in range(len(self.actionTerms)) if termCuts[:, k].any()]
+            elif inference == 'sparse':
+                areas = [np.fmin(self.action_mf[actions[:, slot]], rules[:, slot, None])
+                         for slot in range(rules.shape[1]) if rules[:, slot].any()]
+            else:
+                areas = [np.fmin(self.action_mf[self.ruleAction[r]], rules[:, r, None])
+                         for r in np.flatnonzero(rules.any(axis=0))]
+            end = time.perf_counter()
+            profiler.record('implication', start, end, batch)
+
+            start = end
+            aggregated_output = np.zeros((batch, len(self.x_action)))
+            for area in areas:
+                if aggregation == 'max':
+                    np.fmax(aggregated_output, area, out=aggregated_output)
+                else:
+                    aggregated_output += area
+            end = time.perf_counter()
+            profiler.record('aggregation', start, end, batch)
+
+            start = end
+            if scalar and defuzzification == 'centroid':
+                crisp = np.array(Centroid(self.x_action, aggregated_output[0]))
+            elif scalar:
+                crisp = np.array(MeanOfMax(self.x_action, aggregated_output[0]))
+            else:
+                crisp = self.defuzzify(aggregated_output, defuzzification)
+            profiler.record('defuzzification', start, time.perf_counter(), batch)
+
+        crisp = crisp.reshape(shape)
+        if shape == ():
+            return float(crisp)
+        return crisp
+
+
+# The controller of the rule base from the article, built the first time it is needed
+_defaultController = None
+
+
+def defaultController():
+    global _defaultController
+    if _defaultController is None:
+        _defaultController = FuzzyController()
+    return _defaultController
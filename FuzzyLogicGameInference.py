@@ -0,0 +1,395 @@
+# This module contains the inference part of the fuzzy logic game engine
+# It has no plotting and no user input and only needs numpy, so it can be imported by other code.
+# Next to the scalar engine it has a batched engine that evaluates many
+# (ammo, health) pairs in one call using numpy arrays
+
+import numpy as np
+
+
+# A function that creates a triangle membership function
+def triangleMembershipFunction(x, a, b, c):
+    # This function takes in an array of x points and
+    # a vector containing a, b and c
+    # where a=> left side, b = center, c = right side
+
+    y = np.zeros(len(x))  # shape of the output array
+
+    # Setting the areas outside of our interest to zero
+    y[x <= a] = 0
+    y[x >= c] = 0
+
+    # Setting the center to 1
+    y[x == b] = 1
+
+    # Determine the index of the left side and right side
+    left_side = np.logical_and(a < x, x <= b)
+    right_side = np.logical_and(b < x, x < c)
+
+    # Replacing those values with the appropriate values using interpolation
+    y[left_side] = (x[left_side] - a) / (b - a)
+    y[right_side] = (x[right_side] - c) / (b - c)
+
+    return y
+
+
+# A function that interpolates the fuzzy data to give the degree of membership
+def Interpolate(x, y, value):
+    # This function takes in:
+    # x => a 1d array of x-axis coordinates
+    # y => a 1d array of y-axis coordinates
+    # value => the exact value (or array of values) we desire the interpolation for
+
+    y = np.interp(value, x, y)
+
+    return y
+
+
+# A function that computes the center of Gravity of 2 Arrays
+def Centroid(x, aggregate):
+    # This function takes in the x-axis of the curve and the aggregated area of the
+    # fuzzy set and returns the centroid position
+
+    centroid = np.sum(x * aggregate) / np.sum(aggregate)
+
+    return centroid
+
+
+# A function that computes the mean of maximum of 2 arrays
+def MeanOfMax(x, a):
+    # This function takes in a 1-D array a => aggregate of the fuzzy logic
+    # another 1-D array x=> the x-axis
+    # Returns the mean of the maximum value(s) of the aggregate array
+
+    idx = np.argwhere(a == np.max(a))  # Finding the index of all max values on the y-axis
+
+    res = np.mean(x[idx])  # computing the mean of the max values on the x-axis
+
+    return res
+
+
+# Batched center of gravity
+def CentroidBatch(x, aggregate):
+    # This function takes in the x-axis of the curve and a 2-D array of aggregated
+    # areas, one row per input, and returns the centroid of every row
+
+    centroid = np.sum(x * aggregate, axis=1) / np.sum(aggregate, axis=1)
+
+    return centroid
+
+
+# Batched mean of maximum
+def MeanOfMaxBatch(x, a):
+    # This function takes in a 2-D array a => one aggregate per row
+    # and the x-axis, and returns the mean of the maximum value(s) of every row
+
+    isMax = a == np.max(a, axis=1, keepdims=True)  # all max values of each row
+
+    res = np.sum(x * isMax, axis=1) / np.sum(isMax, axis=1)
+
+    return res
+
+
+# A function that creates a universe of evenly spaced points
+def universe(resolution, low=0, high=100):
+    # This function takes in the number of points and the range of the variable
+    # Universes with resolution = 4k + 1 points have the corners of the terms (multiples of 25) on them
+
+    if resolution < 2:
+        raise ValueError("a universe needs at least 2 points, not %r" % (resolution,))
+
+    return np.linspace(low, high, resolution)
+
+
+# Generating the universe variables
+#   *Ammo and Health input ranges [0, 100]
+#   *Action output ranges [0, 100]
+n = 1000  # number of points
+x_ammo = universe(n)
+x_health = universe(n)
+x_action = universe(n)
+
+# Triangle terms (a, b, c) of every variable, from very low to very high
+AMMO_TERMS = [(0, 0, 25), (0, 25, 50), (25, 50, 75), (50, 75, 100), (75, 100, 100)]
+HEALTH_TERMS = [(0, 0, 25), (0, 25, 50), (25, 50, 75), (50, 75, 100), (75, 100, 100)]
+
+# Action terms: hide, run away, stop, walk around and attack
+HIDE, RUN, STOP, WALK, ATTACK = range(5)
+ACTION_TERMS = [(0, 0, 25), (0, 25, 50), (25, 50, 75), (50, 75, 100), (75, 100, 100)]
+ACTION_NAMES = ['hide', 'run away', 'stop', 'walk around', 'attack']
+
+# The 25 rules from the article
+# Rows are the ammo terms and columns the health terms, so rule1 is [0][0],
+# rule2 is [0][1] ... and rule25 is [4][4]
+RULE_CONSEQUENTS = np.array([
+    [HIDE, HIDE, RUN, RUN, STOP],  # ammo very low
+    [HIDE, RUN, RUN, STOP, WALK],  # ammo low
+    [RUN, RUN, STOP, WALK, WALK],  # ammo mid
+    [RUN, STOP, WALK, WALK, ATTACK],  # ammo high
+    [STOP, WALK, WALK, ATTACK, ATTACK],  # ammo very high
+])
+
+# The weight each rule gets in the different modes
+# Defensive rules are multiplied by the defenseWeight and offensive rules by the attackWeight
+NEUTRAL, DEFENSIVE, OFFENSIVE = range(3)
+RULE_WEIGHT_CLASSES = np.array([
+    [DEFENSIVE, DEFENSIVE, DEFENSIVE, DEFENSIVE, NEUTRAL],
+    [DEFENSIVE, DEFENSIVE, DEFENSIVE, NEUTRAL, OFFENSIVE],
+    [DEFENSIVE, DEFENSIVE, NEUTRAL, OFFENSIVE, OFFENSIVE],
+    [DEFENSIVE, NEUTRAL, OFFENSIVE, OFFENSIVE, OFFENSIVE],
+    [NEUTRAL, OFFENSIVE, OFFENSIVE, OFFENSIVE, OFFENSIVE],
+])
+
+# Modes of the engine: 1. Attack Mode, 2. Defence Mode, 3. Normal Mode
+ATTACK_MODE, DEFENCE_MODE, NORMAL_MODE = 1, 2, 3
+MODE_NAMES = {ATTACK_MODE: 'Attack', DEFENCE_MODE: 'Defence', NORMAL_MODE: 'Normal'}
+
+# (defenseWeight, attackWeight) of every mode
+MODE_WEIGHTS = {
+    ATTACK_MODE: (1, 1.5),
+    DEFENCE_MODE: (1.5, 1),
+    NORMAL_MODE: (1, 1),
+}
+
+# The four (aggregation, defuzzification) combinations of the engine, in the order it prints them
+COMBINATIONS = [('max', 'centroid'), ('sum', 'centroid'), ('max', 'mom'), ('sum', 'mom')]
+
+# Index arrays of the rules, in the order rule1 ... rule25
+RULE_AMMO, RULE_HEALTH = np.divmod(np.arange(RULE_CONSEQUENTS.size), RULE_CONSEQUENTS.shape[1])
+RULE_ACTION = RULE_CONSEQUENTS.ravel()
+
+
+# A function that returns the weight of every rule for an array of modes
+def modeRuleWeights(mode):
+    # This function takes in an array of modes (1, 2 or 3)
+    # and returns an array with one extra axis holding the weight of each of the 25 rules
+
+    mode = np.asarray(mode)
+    if not np.isin(mode, list(MODE_WEIGHTS)).all():
+        raise ValueError("Select a value from the specified options: 1. Attack Mode, 2. Defence Mode, 3. Normal Mode")
+
+    # classWeights[m] => weight of the neutral, defensive and offensive rules in mode m
+    classWeights = np.ones((max(MODE_WEIGHTS) + 1, 3))
+    for m, (defenseWeight, attackWeight) in MODE_WEIGHTS.items():
+        classWeights[m, DEFENSIVE] = defenseWeight
+        classWeights[m, OFFENSIVE] = attackWeight
+
+    return classWeights[mode][..., RULE_WEIGHT_CLASSES.ravel()]
+
+
+# Fuzzy Logic Game Engine
+#   This function takes in the health and ammo value and returns the
+#   fuzzy action output after applying fuzzy logic
+#   it returns 4 outputs: *the crisp value from Sum aggregate and centroid defuzz
+#                         *the crisp value from Sum aggregate and Mean of Maximum defuzz
+#                         *the crisp value from Max aggregate and Mean of Maximum defuzz
+#                         *the crisp value from Max aggregate and Mean of Maximum defuzz
+def fuzzyEngine(x_ammo, x_health, x_action, health, ammo):
+    # This function takes in the ammo x-axis, health x-axis, ammo x-axis
+    # the health and ammo input
+    # Then returns the crisp value of the action to be take.
+
+    # Creating triangle fuzzy membership functions for the ammo
+    ammo_vlo = triangleMembershipFunction(x_ammo, 0, 0, 25)  # very low ammo
+    ammo_lo = triangleMembershipFunction(x_ammo, 0, 25, 50)  # low ammo
+    ammo_md = triangleMembershipFunction(x_ammo, 25, 50, 75)  # medium ammo
+    ammo_hi = triangleMembershipFunction(x_ammo, 50, 75, 100)  # high ammo
+    ammo_vhi = triangleMembershipFunction(x_ammo, 75, 100, 100)  # very high ammo
+
+    # Creating triangle fuzzy membership functions for the health set
+    health_vlo = triangleMembershipFunction(x_health, 0, 0, 25)  # very low health
+    health_lo = triangleMembershipFunction(x_health, 0, 25, 50)  # low health
+    health_md = triangleMembershipFunction(x_health, 25, 50, 75)  # medium health
+    health_hi = triangleMembershipFunction(x_health, 50, 75, 100)  # high health
+    health_vhi = triangleMembershipFunction(x_health, 75, 100, 100)  # very high health
+
+    # Creating triangle fuzzy membership functions for the action set
+    hide = triangleMembershipFunction(x_action, 0, 0, 25)
+    run = triangleMembershipFunction(x_action, 0, 25, 50)
+    stop = triangleMembershipFunction(x_action, 25, 50, 75)
+    walk = triangleMembershipFunction(x_action, 50, 75, 100)
+    attack = triangleMembershipFunction(x_action, 75, 100, 100)
+
+    # Calculating the degree of membership for the input variables
+    # Degree of memberships for ammo
+    ammo_level_vlo = Interpolate(x_ammo, ammo_vlo, ammo)
+    ammo_level_lo = Interpolate(x_ammo, ammo_lo, ammo)
+    ammo_level_md = Interpolate(x_ammo, ammo_md, ammo)
+    ammo_level_hi = Interpolate(x_ammo, ammo_hi, ammo)
+    ammo_level_vhi = Interpolate(x_ammo, ammo_vhi, ammo)
+
+    # Degree of memberships for health
+    health_level_vlo = Interpolate(x_health, health_vlo, health)
+    health_level_lo = Interpolate(x_health, health_lo, health)
+    health_level_md = Interpolate(x_health, health_md, health)
+    health_level_hi = Interpolate(x_health, health_hi, health)
+    health_level_vhi = Interpolate(x_health, health_vhi, health)
+
+    # Applying the rules specified by the article.
+    # The condition is the AND condition, thus we use the MIN operator
+    # There are 25 rules in total from the article
+
+    rule1 = np.fmin(ammo_level_vlo, health_level_vlo)  # ammo very low and health very low => hide
+    rule2 = np.fmin(ammo_level_vlo, health_level_lo)  # ammo very low and health low => hide
+    rule3 = np.fmin(ammo_level_vlo, health_level_md)  # ammo very low and health mid => run away
+    rule4 = np.fmin(ammo_level_vlo, health_level_hi)  # ammo very low and health high => run away
+    rule5 = np.fmin(ammo_level_vlo, health_level_vhi)  # ammo very low and health very high => stop
+
+    rule6 = np.fmin(ammo_level_lo, health_level_vlo)  # ammo low and health very low => hide
+    rule7 = np.fmin(ammo_level_lo, health_level_lo)  # ammo low and health low => run away
+    rule8 = np.fmin(ammo_level_lo, health_level_md)  # ammo low and health mid => run away
+    rule9 = np.fmin(ammo_level_lo, health_level_hi)  # ammo low and health high => stop
+    rule10 = np.fmin(ammo_level_lo, health_level_vhi)  # ammo low and health very high => walk around
+
+    rule11 = np.fmin(ammo_level_md, health_level_vlo)  # ammo mid and health very low  => run away
+    rule12 = np.fmin(ammo_level_md, health_level_lo)  # ammo mid and health low => run away
+    rule13 = np.fmin(ammo_level_md, health_level_md)  # ammo mid and health mid => stop
+    rule14 = np.fmin(ammo_level_md, health_level_hi)  # ammo mid and health high => walk around
+    rule15 = np.fmin(ammo_level_md, health_level_vhi)  # ammo mid and health very high => walk around
+
+    rule16 = np.fmin(ammo_level_hi, health_level_vlo)  # ammo high and health very low  => run away
+    rule17 = np.fmin(ammo_level_hi, health_level_lo)  # ammo high and health low => stop
+    rule18 = np.fmin(ammo_level_hi, health_level_md)  # ammo high and health mid => walk around
+    rule19 = np.fmin(ammo_level_hi, health_level_hi)  # ammo high and health high => walk around
+    rule20 = np.fmin(ammo_level_hi, health_level_vhi)  # ammo high and health very high => attack
+
+    rule21 = np.fmin(ammo_level_vhi, health_level_vlo)  # ammo very high and health very low => stop
+    rule22 = np.fmin(ammo_level_vhi, health_level_lo)  # ammo very high and health low => walk around
+    rule23 = np.fmin(ammo_level_vhi, health_level_md)  # ammo very high and health mid => walk around
+    rule24 = np.fmin(ammo_level_vhi, health_level_hi)  # ammo very high and health high => attack
+    rule25 = np.fmin(ammo_level_vhi, health_level_vhi)  # ammo very high and health very high => attack
+
+    # Finding the points in the universe activated by the rules
+    # This is useful for plotting the region on the graph
+    # The logic is to cut the output domain but the y-value of the rules
+    rule1_area = np.fmin(hide, rule1)  # hide zone
+    rule2_area = np.fmin(hide, rule2)  # hide zone
+    rule3_area = np.fmin(run, rule3)  # run away zone
+    rule4_area = np.fmin(run, rule4)  # run zone
+    rule5_area = np.fmin(stop, rule5)  # stop zone
+
+    rule6_area = np.fmin(hide, rule6)  # hide zone
+    rule7_area = np.fmin(run, rule7)  # run away zone
+    rule8_area = np.fmin(run, rule8)  # run away zone
+    rule9_area = np.fmin(stop, rule9)  # stop zone
+    rule10_area = np.fmin(walk, rule10)  # walk around zone
+
+    rule11_area = np.fmin(run, rule11)  # run away zone
+    rule12_area = np.fmin(run, rule12)  # run away zone
+    rule13_area = np.fmin(stop, rule13)  # stop zone
+    rule14_area = np.fmin(walk, rule14)  # walk around zone
+    rule15_area = np.fmin(walk, rule15)  # walk around zone
+
+    rule16_area = np.fmin(run, rule16)  # run away zone
+    rule17_area = np.fmin(stop, rule17)  # stop zone
+    rule18_area = np.fmin(walk, rule18)  # walk around zone
+    rule19_area = np.fmin(walk, rule19)  # walk around zone
+    rule20_area = np.fmin(attack, rule20)  # attack zone
+
+    rule21_area = np.fmin(stop, rule21)  # stop zone
+    rule22_area = np.fmin(walk, rule22)  # walk around zone
+    rule23_area = np.fmin(walk, rule23)  # walk around zone
+    rule24_area = np.fmin(attack, rule24)  # attack zone
+    rule25_area = np.fmin(attack, rule25)  # attack zone
+
+    # Aggregation of Output
+    # Max Aggregation
+    max_aggregated_output = np.fmax(rule1_area, np.fmax(rule2_area, np.fmax(rule3_area, np.fmax(rule4_area, np.fmax(rule5_area,
+                            np.fmax(rule6_area, np.fmax(rule7_area, np.fmax(rule8_area, np.fmax(rule9_area, np.fmax(rule10_area,
+                            np.fmax(rule11_area, np.fmax(rule12_area, np.fmax(rule13_area, np.fmax(rule14_area, np.fmax(rule15_area,
+                            np.fmax(rule16_area, np.fmax(rule17_area, np.fmax(rule18_area, np.fmax(rule19_area, np.fmax(rule20_area,
+                            np.fmax(rule21_area, np.fmax(rule22_area, np.fmax(rule23_area, np.fmax(rule24_area, rule25_area))))))))))))))))))))))))
+
+    # Defuzzification
+    # Max aggregated output and Centroid Defuzzification
+    max_centroid = Centroid(x_action, max_aggregated_output)
+
+    return max_centroid
+
+
+# Fuzzy Logic Game Engine with every intermediate result
+#   This function runs the engine of FuzzyLogicGameEngine.py for one health and ammo value
+#   in the given mode and returns a dict with the membership functions, the degrees of
+#   membership, the rule strengths, the rule areas, both aggregated outputs and the four
+#   crisp values, so they can be printed or plotted
+def fuzzyEngineDetailed(x_ammo, x_health, x_action, health, ammo, mode=NORMAL_MODE):
+    ruleWeights = modeRuleWeights(mode)
+
+    # Creating triangle fuzzy membership functions for every set
+    ammo_sets = np.array([triangleMembershipFunction(x_ammo, *term) for term in AMMO_TERMS])
+    health_sets = np.array([triangleMembershipFunction(x_health, *term) for term in HEALTH_TERMS])
+    action_sets = np.array([triangleMembershipFunction(x_action, *term) for term in ACTION_TERMS])
+
+    # Degree of memberships of the inputs
+    ammo_levels = np.array([Interpolate(x_ammo, y, ammo) for y in ammo_sets])
+    health_levels = np.array([Interpolate(x_health, y, health) for y in health_sets])
+
+    # Applying the 25 rules (AND => MIN operator) and cutting the action sets at the rule strengths
+    rules = np.fmin(ammo_levels[RULE_AMMO], health_levels[RULE_HEALTH]) * ruleWeights
+    rule_areas = np.fmin(action_sets[RULE_ACTION], rules[:, None])
+
+    # Aggregation of Output, the sum adds the rule areas in the order rule1 ... rule25
+    max_aggregated_output = np.fmax.reduce(rule_areas, axis=0)
+    sum_aggregated_output = np.add.reduce(rule_areas, axis=0)
+
+    return {
+        'ammo_sets': ammo_sets, 'health_sets': health_sets, 'action_sets': action_sets,
+        'ammo_levels': ammo_levels, 'health_levels': health_levels,
+        'rules': rules, 'rule_areas': rule_areas,
+        'max_aggregated_output': max_aggregated_output, 'sum_aggregated_output': sum_aggregated_output,
+        'max_centroid': Centroid(x_action, max_aggregated_output),
+        'sum_centroid': Centroid(x_action, sum_aggregated_output),
+        'max_MOM': MeanOfMax(x_action, max_aggregated_output),
+        'sum_MOM': MeanOfMax(x_action, sum_aggregated_output),
+    }
+
+
+# Batched Fuzzy Logic Game Engine
+#   This function takes in arrays of health and ammo values and an optional mode per row
+#   and returns an array of crisp actions, one for every (health, ammo) pair.
+#   Every step (fuzzification, rules, clipping, aggregation and defuzzification)
+#   is done as an array operation over the whole batch.
+#   aggregation => 'max' or 'sum'
+#   defuzzification => 'centroid' or 'mom' (mean of maximum)
+def fuzzyEngineBatch(x_ammo, x_health, x_action, health, ammo, mode=NORMAL_MODE,
+                     aggregation='max', defuzzification='centroid'):
+    if aggregation not in ('max', 'sum'):
+        raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+    if defuzzification not in ('centroid', 'mom'):
+        raise ValueError("defuzzification must be 'centroid' or 'mom', not %r" % (defuzzification,))
+
+    # Bringing all the inputs to one flat shape, the output gets the shape of the inputs
+    health, ammo, mode = np.broadcast_arrays(np.asarray(health, dtype=float),
+                                             np.asarray(ammo, dtype=float),
+                                             np.asarray(mode))
+    shape = health.shape
+    health = health.ravel()
+    ammo = ammo.ravel()
+    ruleWeights = modeRuleWeights(mode.ravel())  # shape (batch, 25)
+
+    # Degree of memberships of every input, shape (batch, 5)
+    ammo_levels = np.stack([Interpolate(x_ammo, triangleMembershipFunction(x_ammo, *term), ammo)
+                            for term in AMMO_TERMS], axis=1)
+    health_levels = np.stack([Interpolate(x_health, triangleMembershipFunction(x_health, *term), health)
+                              for term in HEALTH_TERMS], axis=1)
+
+    # Applying the 25 rules (AND => MIN operator) for the whole batch, shape (batch, 25)
+    rules = np.fmin(ammo_levels[:, RULE_AMMO], health_levels[:, RULE_HEALTH]) * ruleWeights
+
+    # Cutting the action sets at the rule strengths and aggregating them
+    # one rule at a time, so only one (batch, n) area exists at any point
+    actions = [triangleMembershipFunction(x_action, *term) for term in ACTION_TERMS]
+    aggregated_output = np.zeros((len(health), len(x_action)))
+    for r in range(len(RULE_ACTION)):
+        rule_area = np.fmin(actions[RULE_ACTION[r]], rules[:, r, None])
+        if aggregation == 'max':
+            np.fmax(aggregated_output, rule_area, out=aggregated_output)
+        else:
+            aggregated_output += rule_area
+
+    # Defuzzification
+    if defuzzification == 'centroid':
+        crisp = CentroidBatch(x_action, aggregated_output)
+    else:
+        crisp = MeanOfMaxBatch(x_action, aggregated_output)
+
+    return crisp.reshape(shape)
@@ -0,0 +1,227 @@
+# This module bakes the decision surface of the fuzzy logic game engine into a lookup table
+# The crisp action of every mode and every (aggregation, defuzzification) combination is
+# computed once on a regular ammo x health grid and saved in a binary file.
+# The file is opened with np.memmap, so processes on the same host that open the same
+# file share its pages through the page cache instead of each holding their own copy.
+# Queries are answered by bilinear interpolation between the four nearest grid points.
+#
+# File layout (little endian):
+#   header of HEADER_SIZE bytes => magic, format version, grid resolution, number of modes,
+#                                  number of combinations, ammo and health ranges,
+#                                  the mode codes, the fingerprint of the controller and the
+#                                  method of the engine (index into METHODS)
+#   data => float32 array of shape (modes, combinations, resolution, resolution),
+#           table[m][c][i][j] is the action for ammo grid point i and health grid point j
+#
+# Worst-case error against the live engine (lookupError over a 101 x 101 grid of cell centers,
+# default controller, resolution 201 => one grid point every 0.5, all three modes):
+#   max/centroid => max 0.44, mean 0.006
+#   sum/centroid => max 0.64, mean 0.007
+#   max/mom => max 25, mean 0.27
+#   sum/mom => max 18, mean 0.27
+# The largest centroid errors are next to the term boundaries, where the surface bends sharply.
+# The mean of maximum surface has jumps (the maximum moves from one plateau to another),
+# interpolating across a jump gives a value in between, which is where the large errors are.
+
+import os
+import struct
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController, METHODS
+from FuzzyLogicGameInference import COMBINATIONS, NORMAL_MODE
+
+MAGIC = b'FZLUT\0\0\0'
+FORMAT_VERSION = 2
+HEADER_SIZE = 128
+MAX_MODES = 8
+_HEADER = struct.Struct('<8sIIII4d%di32sI' % MAX_MODES)
+
+
+class LookupTable:
+    # A decision surface loaded from a lookup table file
+    #   table => array of shape (modes, combinations, resolution, resolution)
+    #   modes => the mode codes, in the order of the first axis of the table
+    #   ammoRange, healthRange => (low, high) of the grid
+    #   fingerprint => of the controller the table was built from
+    #   method => the method of the engine the table was built with (see FuzzyController.evaluate)
+
+    def __init__(self, table, modes, ammoRange, healthRange, fingerprint=None, method='sampled'):
+        self.table = table
+        self.modes = list(modes)
+        self.ammoRange = ammoRange
+        self.healthRange = healthRange
+        self.fingerprint = fingerprint
+        self.method = method
+        self.resolution = table.shape[-1]
+
+        # modeIndex[mode] => index of that mode on the first axis of the table (-1 => unknown mode)
+        self.modeIndex = np.full(max(self.modes) + 1, -1)
+        self.modeIndex[self.modes] = np.arange(len(self.modes))
+
+    # Grid cell and position inside the cell of every value
+    def _cell(self, value, valueRange):
+        lo, hi = valueRange
+        position = np.clip((value - lo) / (hi - lo) * (self.resolution - 1), 0, self.resolution - 1)
+        i = np.minimum(position.astype(int), self.resolution - 2)
+        return i, position - i
+
+    # Crisp action for scalar or array inputs, by bilinear interpolation of the table
+    #   Returns a float for scalar inputs and an array with the shape of the inputs otherwise
+    def evaluate(self, ammo, health, mode=NORMAL_MODE, aggregation='max', defuzzification='centroid'):
+        if (aggregation, defuzzification) not in COMBINATIONS:
+            raise ValueError("unknown combination %r" % ((aggregation, defuzzification),))
+        combination = COMBINATIONS.index((aggregation, defuzzification))
+
+        ammo, health, mode = np.broadcast_arrays(np.asarray(ammo, dtype=float),
+                                                 np.asarray(health, dtype=float),
+                                                 np.asarray(mode))
+        modes = self.modeIndex[np.clip(mode, 0, len(self.modeIndex) - 1)]
+        if (modes < 0).any() or (mode >= len(self.modeIndex)).any():
+            raise ValueError("Select a value from the specified options: %s"
+                             % ", ".join(str(m) for m in self.modes))
+        # A nan has no grid cell, infinite values are clamped to the ends of the axes like other values
+        if np.isnan(ammo).any() or np.isnan(health).any():
+            raise ValueError("ammo and health must not be nan")
+
+        i, t = self._cell(ammo, self.ammoRange)
+        j, u = self._cell(health, self.healthRange)
+        surface = self.table[:, combination]
+
+        crisp = ((1 - t) * (1 - u) * surface[modes, i, j] + t * (1 - u) * surface[modes, i + 1, j]
+                 + (1 - t) * u * surface[modes, i, j + 1] + t * u * surface[modes, i + 1, j + 1])
+
+        if crisp.shape == ():
+            return float(crisp)
+        return crisp
+
+
+# A function that computes the decision surface and writes it to a lookup table file
+def buildLookupTable(path, controller=None, resolution=201, method='sampled', chunkSize=4096):
+    # This function takes in:
+    # path => the file to write
+    # controller => the FuzzyController to bake, by default the rule base from the article
+    # resolution => number of grid points along the ammo and the health axis
+    # method => 'sampled' or 'analytic' defuzzification (see FuzzyController.evaluate)
+    # chunkSize => number of grid points evaluated per engine call
+    # The file is written next to the target and renamed when complete,
+    # so other processes never open a half written table. A failed build removes it.
+    # Returns the LookupTable opened from the new file
+
+    if method not in METHODS:
+        raise ValueError("method must be 'sampled', 'analytic' or 'sugeno', not %r" % (method,))
+    if controller is None:
+        controller = defaultController()
+    modes = sorted(controller.modeWeights)
+    if len(modes) > MAX_MODES:
+        raise ValueError("a lookup table holds at most %d modes" % MAX_MODES)
+    ammoRange = (float(controller.x_ammo[0]), float(controller.x_ammo[-1]))
+    healthRange = (float(controller.x_health[0]), float(controller.x_health[-1]))
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, resolution, len(modes), len(COMBINATIONS),
+                          *ammoRange, *healthRange, *(modes + [0] * (MAX_MODES - len(modes))),
+                          bytes.fromhex(controller.fingerprint()), METHODS.index(method))
+    shape = (len(modes), len(COMBINATIONS), resolution, resolution)
+
+    # Grid points in the same order as the last two axes of the table
+    ammoGrid, healthGrid = np.meshgrid(np.linspace(*ammoRange, resolution),
+                                       np.linspace(*healthRange, resolution), indexing='ij')
+    ammoGrid, healthGrid = ammoGrid.ravel(), healthGrid.ravel()
+
+    temporary = '%s.%d.tmp' % (path, os.getpid())
+    table = None
+    try:
+        with open(temporary, 'wb') as file:
+            file.write(header.ljust(HEADER_SIZE, b'\0'))
+        table = np.memmap(temporary, dtype='<f4', mode='r+', offset=HEADER_SIZE, shape=shape)
+
+        for m, mode in enumerate(modes):
+            for c, (aggregation, defuzzification) in enumerate(COMBINATIONS):
+                surface = table[m, c].reshape(-1)
+                for start in range(0, len(ammoGrid), chunkSize):
+                    stop = start + chunkSize
+                    surface[start:stop] = controller.evaluate(ammoGrid[start:stop], healthGrid[start:stop], mode,
+                                                              aggregation, defuzzification, method=method)
+
+        table.flush()
+        table = None
+        os.replace(temporary, path)
+    except BaseException:
+        # The memmap is closed first, an open file cannot be removed on Windows
+        table = None
+        try:
+            os.remove(temporary)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return openLookupTable(path)
+
+
+# A function that opens a lookup table file, read only and shared between processes
+def openLookupTable(path, controller=None):
+    # This function takes in the path of the file and optionally the controller
+    # the table must have been built from. A table built from another rule base raises a ValueError
+
+    with open(path, 'rb') as file:
+        header = file.read(_HEADER.size)
+    if len(header) < _HEADER.size or header[:len(MAGIC)] != MAGIC:
+        raise ValueError("%s is not a lookup table file" % path)
+
+    (_, version, resolution, nModes, nCombinations,
+     ammoLo, ammoHi, healthLo, healthHi, *rest) = _HEADER.unpack(header)
+    modes, fingerprint, method = list(rest[:nModes]), rest[-2].hex(), rest[-1]
+    if version != FORMAT_VERSION:
+        raise ValueError("%s has format version %d, expected %d" % (path, version, FORMAT_VERSION))
+    if nCombinations != len(COMBINATIONS):
+        raise ValueError("%s holds %d combinations, expected %d" % (path, nCombinations, len(COMBINATIONS)))
+    if controller is not None and fingerprint != controller.fingerprint():
+        raise ValueError("%s was built from a different rule base" % path)
+    if method >= len(METHODS):
+        raise ValueError("%s was built with an unknown method (%d)" % (path, method))
+
+    table = np.memmap(path, dtype='<f4', mode='r', offset=HEADER_SIZE,
+                      shape=(nModes, nCombinations, resolution, resolution))
+
+    return LookupTable(table, modes, (ammoLo, ammoHi), (healthLo, healthHi), fingerprint, METHODS[method])
+
+
+# A function that opens a lookup table and only builds it when it is missing or stale
+#   A table built with another resolution or method is built again
+def loadOrBuildLookupTable(path, controller=None, resolution=201, method='sampled'):
+    if controller is None:
+        controller = defaultController()
+    try:
+        table = openLookupTable(path, controller)
+        if table.resolution == resolution and table.method == method:
+            return table
+    except (OSError, ValueError):
+        pass
+    return buildLookupTable(path, controller, resolution, method)
+
+
+# A function that measures the error of a lookup table against the live engine
+def lookupError(table, controller=None, points=101):
+    # This function takes in a LookupTable, the controller it was built from
+    # and the number of test points along each axis.
+    # The engine is evaluated with the method the table was built with.
+    # The test points are the centers of grid cells, where bilinear interpolation is the worst.
+    # Returns a dict of (mode, aggregation, defuzzification) => (max error, mean error)
+
+    if controller is None:
+        controller = defaultController()
+
+    # Centers of evenly spread grid cells
+    cells = np.linspace(0, table.resolution - 2, points).round()
+    ammo = table.ammoRange[0] + (cells + 0.5) / (table.resolution - 1) * (table.ammoRange[1] - table.ammoRange[0])
+    health = table.healthRange[0] + (cells + 0.5) / (table.resolution - 1) * (table.healthRange[1] - table.healthRange[0])
+    ammo, health = (axis.ravel() for axis in np.meshgrid(ammo, health, indexing='ij'))
+
+    errors = {}
+    for mode in table.modes:
+        for aggregation, defuzzification in COMBINATIONS:
+            error = np.abs(table.evaluate(ammo, health, mode, aggregation, defuzzification)
+                           - controller.evaluate(ammo, health, mode, aggregation, defuzzification, table.method))
+            errors[mode, aggregation, defuzzification] = (float(error.max()), float(error.mean()))
+
+    return errors
@@ -0,0 +1,371 @@
+# This module generalizes the fuzzy logic game engine to any number of input variables
+# (ammo, health, enemy distance, ally count, cover quality, ...)
+# With k inputs of T terms a dense rule table has T^k rules, and cutting a sampled action set for
+# every rule costs T^k * len(x_action) per decision. Here:
+#   rules => a sparse consequent tensor: only the rules that exist are stored, as sorted flat
+#            indices of their (term of input 1, ..., term of input k) cell with their action term
+#            and weight class, so the memory grows with the number of rules and not with T^k
+#   fuzzification => exact (triangleMembershipFunction on the input values, no input universe),
+#                    the terms of every input form a partition (every term lies between the peaks
+#                    of its neighbours), so at most two neighbouring terms of an input are active
+#   rule firing => only the 2^k cells of the active terms of a decision are looked up
+#                  (np.searchsorted in the sorted indices), cells without a rule do not fire
+#   aggregation, defuzzification => as in FuzzyController, from the at most 2^k fired rules,
+#                                    in chunks of the memory budget (MultiInputController.rowBytes)
+# Inputs outside the terms of a variable are clamped to their ends, like np.interp on a universe.
+#
+# With the terms and rules of the article (fromRuleTable(ARTICLE_INPUT_TERMS, RULE_CONSEQUENTS,
+# RULE_WEIGHT_CLASSES)) the results are the same as a FuzzyController with exact input
+# universes (x_ammo = x_health = universe(5)) up to rounding, except for the sampled sum / mom:
+# the cut action sets are summed in another order, the samples of a plateau can differ in the
+# last place and the mean of maximum keeps other samples (270 of 3000 random inputs differ, by up
+# to 6.7, as the float64 and exact mean of maximum do in FuzzyLogicGameController).
+#
+# Rows where no rule fires (cells without a rule) have no crisp action (nan), as in FuzzyController,
+# with every method and defuzzification, they are not aggregated.
+#
+# Cost against the number of inputs k (FuzzyLogicGameBenchmark.benchmarkInputs: 5 terms per input,
+# full rule base of 5^k rules, batches of 10000 decisions, decisions per second):
+#   k                 1      2      3      4      5      6      7      8
+#   max / centroid
+#     sparse        66k    85k    78k    76k    60k    49k    37k    20k     (sampled, peak 27 to 41 MB)
+#     sparse       101k   100k    97k    84k    74k    60k    39k    21k     (analytic, peak 14 to 19 MB)
+#     dense         79k    76k    52k    20k                                 (sampled)
+#   sum / mom
+#     sparse       119k    83k    48k    27k    15k   8.7k   4.4k   2.2k     (sampled, peak 24 to 43 MB)
+#     sparse       821k   415k   182k    63k    20k   5.6k   1.3k    390     (analytic, peak 7 to 43 MB)
+#     dense         74k    20k   4.5k    890                                 (sampled)
+# With max aggregation the sparse cost is the aggregation of the action universe, which does not
+# depend on k, plus firing the 2^k slots, which dominates from k = 6. With sum aggregation every
+# fired rule adds its own cut action set, so the cost grows with the 2^k slots: one cut of the
+# action universe per slot (sampled), or an outline of 2 + 5 * 2^k corners with the value of every
+# slot at every corner (analytic, the fastest up to k = 4; sum / centroid needs no outline).
+# The dense cost grows with the 5^k rules. The peaks stay below the default budget of 64 MB.
+# The rule base takes 24 bytes per rule (9 MB for the 390625 rules of k = 8).
+
+import numpy as np
+
+from FuzzyLogicGameAnalytic import aggregatedOutline, AnalyticCentroid, AnalyticSumCentroid, AnalyticMeanOfMax
+from FuzzyLogicGameController import MEMORY_BUDGET
+from FuzzyLogicGameInference import (triangleMembershipFunction, CentroidBatch, MeanOfMaxBatch, x_action,
+                                     AMMO_TERMS, HEALTH_TERMS, ACTION_TERMS, ACTION_NAMES, MODE_WEIGHTS,
+                                     NEUTRAL, DEFENSIVE, OFFENSIVE, NORMAL_MODE)
+
+ARTICLE_INPUT_TERMS = [AMMO_TERMS, HEALTH_TERMS]
+
+
+# A function that computes the degree of membership of values in triangles with their own corners
+def _membership(x, a, b, c):
+    # This function takes in arrays of values and of the corners of the triangle of every value
+    # and gives the same numbers as triangleMembershipFunction
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.where(x <= b, (x - a) / (b - a), (x - c) / (b - c))
+    y = np.where((x <= a) | (x >= c), 0.0, y)
+    return np.where(x == b, 1.0, y)
+
+
+class MultiInputController:
+    # A rule base with any number of inputs, compiled into numpy arrays
+    #   inputTerms => one list of triangle terms (a, b, c) per input, sorted by their peak b
+    #   rules => the sparse consequent tensor: dict of (term of input 1, ..., term of input k) =>
+    #            action term or (action term, weight class), cells that are missing have no rule
+    #   actionTerms, modeWeights, x_action, actionNames => as in FuzzyController
+    #   inputNames => optional names of the inputs
+
+    def __init__(self, inputTerms, rules, actionTerms=ACTION_TERMS, modeWeights=MODE_WEIGHTS, x_action=x_action,
+                 actionNames=ACTION_NAMES, inputNames=None):
+        self.inputTerms = [[tuple(float(v) for v in term) for term in terms] for terms in inputTerms]
+        self.actionTerms = [tuple(term) for term in actionTerms]
+        self._actionCorners = np.array(self.actionTerms, dtype=float).reshape(-1, 3)
+        self.modeWeights = dict(modeWeights)
+        self.x_action = np.asarray(x_action, dtype=float)
+        self.actionNames = list(actionNames)
+        self.inputNames = list(inputNames) if inputNames is not None else ['input%d' % (j + 1)
+                                                                           for j in range(len(inputTerms))]
+        if len(self.inputNames) != len(self.inputTerms):
+            raise ValueError("inputNames must have one name per input")
+
+        for j, terms in enumerate(self.inputTerms):
+            if not terms:
+                raise ValueError("input %d has no terms" % (j + 1))
+            peaks = [b for _, b, _ in terms]
+            if peaks != sorted(peaks):
+                raise ValueError("the terms of input %d must be sorted by their peak" % (j + 1))
+            for t, (a, b, c) in enumerate(terms):
+                if not a <= b <= c or (t > 0 and a < peaks[t - 1]) or (t < len(terms) - 1 and c > peaks[t + 1]):
+                    raise ValueError("term %d of input %d must lie between the peaks of its neighbours"
+                                     % (t + 1, j + 1))
+
+        # Row-major strides of the (term of input 1, ..., term of input k) cells
+        self.shape = tuple(len(terms) for terms in self.inputTerms)
+        strides = [1] * len(self.shape)
+        for j in range(len(self.shape) - 2, -1, -1):
+            strides[j] = strides[j + 1] * self.shape[j + 1]
+        if strides and strides[0] * self.shape[0] >= 2 ** 63:
+            raise ValueError("too many cells for int64 rule indices")
+        self.strides = np.array(strides, dtype=np.int64)
+
+        keys, actions, classes = [], [], []
+        for cell, consequent in rules.items():
+            action, weightClass = consequent if isinstance(consequent, tuple) else (consequent, NEUTRAL)
+            if len(cell) != len(self.shape) or not all(0 <= t < n for t, n in zip(cell, self.shape)):
+                raise ValueError("rule %r is not a cell of the input terms" % (cell,))
+            if not 0 <= action < len(self.actionTerms):
+                raise ValueError("rule %r has no action term %r" % (cell, action))
+            if weightClass not in (NEUTRAL, DEFENSIVE, OFFENSIVE):
+                raise ValueError("rule %r has an unknown weight class %r" % (cell, weightClass))
+            keys.append(sum(t * stride for t, stride in zip(cell, strides)))
+            actions.append(action)
+            classes.append(weightClass)
+
+        order = np.argsort(np.array(keys, dtype=np.int64), kind='stable')
+        self.ruleKeys = np.array(keys, dtype=np.int64)[order]
+        self.ruleAction = np.array(actions, dtype=np.intp)[order]
+        self.ruleClass = np.array(classes, dtype=np.intp)[order]
+
+        # Weight of every weight class in every mode, modes that do not exist are nan
+        self._modeTable = np.full((max(self.modeWeights, default=0) + 1, 3), np.nan)
+        for mode, (defenseWeight, attackWeight) in self.modeWeights.items():
+            self._modeTable[mode, [NEUTRAL, DEFENSIVE, OFFENSIVE]] = (1.0, defenseWeight, attackWeight)
+
+        self._corners = [np.array(terms, dtype=float).T for terms in self.inputTerms]
+        self._peaks = [corners[1] for corners in self._corners]
+        self._ranges = [(corners[0].min(), corners[2].max()) for corners in self._corners]
+        self.action_mf = np.array([triangleMembershipFunction(self.x_action, *term) for term in self.actionTerms])
+
+        # Bits of the active term (0 => left, 1 => right) of every input in every slot, input 1 most
+        # significant, so the slots of a decision are in the order of the rule indices
+        k = len(self.shape)
+        self._slotBits = (np.arange(2 ** k)[:, None] >> np.arange(k - 1, -1, -1)) & 1
+
+    @property
+    def nInputs(self):
+        return len(self.shape)
+
+    @property
+    def nRules(self):
+        return len(self.ruleKeys)
+
+    def _checkModes(self, mode):
+        mode = np.asarray(mode)
+        valid = (mode >= 0) & (mode < len(self._modeTable))
+        if not valid.all() or np.isnan(self._modeTable[mode, 0]).any():
+            bad = np.unique(mode[~valid]) if not valid.all() else np.unique(mode[np.isnan(self._modeTable[mode, 0])])
+            raise ValueError("Select a value from the specified options, unknown modes: %s" % bad.tolist())
+
+    # The inputs as one (batch, inputs) array and the shape of the decisions
+    def _inputs(self, inputs, mode):
+        if len(inputs) != self.nInputs:
+            raise ValueError("expected %d inputs, not %d" % (self.nInputs, len(inputs)))
+        arrays = np.broadcast_arrays(*(np.asarray(values, dtype=float) for values in inputs), np.asarray(mode))
+        shape = arrays[0].shape
+        values = np.stack([array.ravel() for array in arrays[:-1]], axis=1) if self.nInputs else np.zeros((1, 0))
+        return values, arrays[-1].ravel(), shape
+
+    # The two neighbouring terms of every input that can be active and their degrees of membership
+    #   values => array of shape (batch, inputs)
+    #   Returns terms (int) and levels, both of shape (batch, inputs, 2)
+    def fuzzify(self, values):
+        batch = len(values)
+        terms = np.zeros((batch, self.nInputs, 2), dtype=np.intp)
+        levels = np.zeros((batch, self.nInputs, 2))
+        for j, (corners, peaks, (low, high)) in enumerate(zip(self._corners, self._peaks, self._ranges)):
+            x = np.clip(values[:, j], low, high)
+            if len(peaks) == 1:
+                levels[:, j, 0] = _membership(x, *corners[:, 0])
+                continue
+            left = np.clip(np.searchsorted(peaks, x, side='right') - 1, 0, len(peaks) - 2)
+            for side in (0, 1):
+                t = left + side
+                terms[:, j, side] = t
+                levels[:, j, side] = _membership(x, corners[0][t], corners[1][t], corners[2][t])
+        return terms, levels
+
+    # Strengths of the rules of the active cells
+    #   Returns ruleIndex (positions in the rule arrays) and rules (strengths), shape (batch, 2^inputs),
+    #   slots of cells without a rule have a strength of 0
+    def fire(self, terms, levels, mode):
+        batch = len(terms)
+        keys = np.zeros((batch, len(self._slotBits)), dtype=np.int64)
+        strengths = np.full((batch, len(self._slotBits)), np.inf)
+        for j in range(self.nInputs):
+            bits = self._slotBits[:, j]
+            keys += terms[:, j, bits] * self.strides[j]
+            np.minimum(strengths, levels[:, j, bits], out=strengths)
+        if self.nInputs == 0:
+            strengths[:] = 1.0
+
+        ruleIndex = np.minimum(np.searchsorted(self.ruleKeys, keys), max(self.nRules - 1, 0))
+        if self.nRules == 0:
+            return ruleIndex, np.zeros(keys.shape)
+        found = self.ruleKeys[ruleIndex] == keys
+        weights = self._modeTable[np.broadcast_to(mode, (batch,))[:, None], self.ruleClass[ruleIndex]]
+        return ruleIndex, np.where(found, strengths * weights, 0.0)
+
+    # Strength of every stored rule, shape (batch, rules), for comparing with the sparse inference
+    def denseRuleStrengths(self, values, mode):
+        cells = (self.ruleKeys[:, None] // self.strides) % np.array(self.shape)
+        strengths = np.full((len(values), self.nRules), np.inf)
+        for j, corners in enumerate(self._corners):
+            low, high = self._ranges[j]
+            x = np.clip(values[:, j], low, high)
+            levels = np.stack([_membership(x, *term) for term in corners.T], axis=1)
+            np.minimum(strengths, levels[:, cells[:, j]], out=strengths)
+        return strengths * self._modeTable[np.broadcast_to(mode, (len(values),))[:, None], self.ruleClass]
+
+    # Strength of the strongest rule pointing to every action term, shape (batch, action terms)
+    def termCuts(self, ruleIndex, rules):
+        actions = self.ruleAction[ruleIndex]
+        return np.max(np.where(actions[:, :, None] == np.arange(len(self.actionTerms)), rules[:, :, None], 0), axis=1)
+
+    # Aggregated output area of every row, shape (batch, len(x_action))
+    #   ruleIndex => the rule index of every column of rules, None when rules has a column per stored rule
+    def aggregate(self, ruleIndex, rules, aggregation='max'):
+        if ruleIndex is None:
+            ruleIndex = np.broadcast_to(np.arange(self.nRules), rules.shape)
+        aggregated_output = np.zeros((len(rules), len(self.x_action)))
+        if aggregation == 'max':
+            termCuts = self.termCuts(ruleIndex, rules)
+            for k in range(len(self.actionTerms)):
+                if termCuts[:, k].any():
+                    np.fmax(aggregated_output, np.fmin(self.action_mf[k], termCuts[:, k, None]),
+                            out=aggregated_output)
+            return aggregated_output
+        elif aggregation == 'sum':
+            area = np.empty_like(aggregated_output)
+            actions = self.ruleAction[ruleIndex]
+            for column in np.flatnonzero(rules.any(axis=0)):
+                np.take(self.action_mf, actions[:, column], axis=0, out=area, mode='clip')
+                aggregated_output += np.fmin(area, rules[:, column, None], out=area)
+            return aggregated_output
+        raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+
+    # Crisp value of every row computed exactly from the corners of the cut action sets
+    #   With sum aggregation every fired rule adds its own cut triangle, so every column that fired
+    #   gets the triangle of the action term of its rule, which differs from row to row
+    def defuzzifyAnalytic(self, ruleIndex, rules, aggregation='max', defuzzification='centroid'):
+        if ruleIndex is None:
+            ruleIndex = np.broadcast_to(np.arange(self.nRules), rules.shape)
+        if aggregation == 'max':
+            terms, heights = self.actionTerms, self.termCuts(ruleIndex, rules)
+        elif aggregation == 'sum':
+            columns = np.flatnonzero(rules.any(axis=0))
+            terms, heights = self._actionCorners[self.ruleAction[ruleIndex[:, columns]]], rules[:, columns]
+            if defuzzification == 'centroid':
+                return AnalyticSumCentroid(terms, heights)
+        else:
+            raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+        xs, fs = aggregatedOutline(terms, heights, self.x_action[0], self.x_action[-1], aggregation)
+
+        if defuzzification == 'centroid':
+            return AnalyticCentroid(xs, fs)
+        elif defuzzification == 'mom':
+            return AnalyticMeanOfMax(xs, fs)
+        raise ValueError("defuzzification must be 'centroid' or 'mom', not %r" % (defuzzification,))
+
+    # Bytes of working memory of one decision in evaluate, which splits batches by it
+    def rowBytes(self, method='sampled', inference='sparse', aggregation='max', defuzzification='centroid'):
+        columns = len(self._slotBits) if inference == 'sparse' else self.nRules
+        # rule keys, strengths, indices and weights with their temporaries, and the term cuts
+        rules = 8 * columns * (8 + 2 * len(self.actionTerms))
+        if method == 'sampled':
+            # aggregated output, cut action set and defuzzification products
+            return 25 * len(self.x_action) + rules
+        if aggregation == 'sum' and defuzzification == 'centroid':
+            # corners, areas and moments of the triangle of every column
+            return 8 * 16 * columns + rules
+        # outline of the cut triangles: their corners (and the crossings of their sides with max
+        # aggregation) and the value of every triangle at every corner
+        triangles = columns if aggregation == 'sum' else len(self.actionTerms)
+        points = 2 + 5 * triangles + (9 * triangles ** 2 // 2 if aggregation == 'max' else 0)
+        return 8 * points * (3 * triangles + 8) + rules
+
+    # Crisp action for scalar or array inputs
+    #   inputs => one value or array per input, broadcast together
+    #   aggregation, defuzzification, method => as in FuzzyController.evaluate
+    #   inference => 'sparse' fires the at most 2^k rules of the active terms,
+    #                'dense' fires every stored rule, with the same results
+    #   memoryBudget => bytes of working memory, the batch is split in chunks of
+    #                   memoryBudget // rowBytes(...) decisions (see FuzzyController.evaluateBounded)
+    def evaluate(self, inputs, mode=NORMAL_MODE, aggregation='max', defuzzification='centroid', method='sampled',
+                 inference='sparse', memoryBudget=MEMORY_BUDGET):
+        if method not in ('sampled', 'analytic'):
+            raise ValueError("method must be 'sampled' or 'analytic', not %r" % (method,))
+        if inference not in ('dense', 'sparse'):
+            raise ValueError("inference must be 'dense' or 'sparse', not %r" % (inference,))
+        if aggregation not in ('max', 'sum'):
+            raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+        if defuzzification not in ('centroid', 'mom'):
+            raise ValueError("defuzzification must be 'centroid' or 'mom', not %r" % (defuzzification,))
+        rowBytes = self.rowBytes(method, inference, aggregation, defuzzification)
+        chunkSize = memoryBudget // rowBytes
+        if chunkSize < 1:
+            raise ValueError("memoryBudget must hold at least one decision (%d bytes)" % rowBytes)
+        values, mode, shape = self._inputs(inputs, mode)
+        self._checkModes(mode)
+
+        # Rows where no rule fires have no crisp action and are not aggregated
+        crisp = np.full(len(values), np.nan)
+        for start in range(0, len(values), chunkSize):
+            rows = slice(start, start + chunkSize)
+            if inference == 'sparse':
+                ruleIndex, rules = self.fire(*self.fuzzify(values[rows]), mode[rows])
+            else:
+                ruleIndex, rules = None, self.denseRuleStrengths(values[rows], mode[rows])
+
+            fired = rules.any(axis=1)
+            if not fired.any():
+                continue
+            if not fired.all():
+                rows = start + np.flatnonzero(fired)
+                rules = rules[fired]
+                if ruleIndex is not None:
+                    ruleIndex = ruleIndex[fired]
+
+            if method == 'analytic':
+                crisp[rows] = self.defuzzifyAnalytic(ruleIndex, rules, aggregation, defuzzification)
+            elif defuzzification == 'centroid':
+                crisp[rows] = CentroidBatch(self.x_action, self.aggregate(ruleIndex, rules, aggregation))
+            else:
+                crisp[rows] = MeanOfMaxBatch(self.x_action, self.aggregate(ruleIndex, rules, aggregation))
+
+        crisp = crisp.reshape(shape)
+        if shape == ():
+            return float(crisp)
+        return crisp
+
+
+# A function that builds a MultiInputController from dense tables of k dimensions
+#   consequents => action term of every cell, negative => no rule
+#   weightClasses => optional weight class of every cell (NEUTRAL when not given)
+def fromRuleTable(inputTerms, consequents, weightClasses=None, **settings):
+    consequents = np.asarray(consequents)
+    if weightClasses is None:
+        weightClasses = np.full(consequents.shape, NEUTRAL)
+    weightClasses = np.asarray(weightClasses)
+    if weightClasses.shape != consequents.shape:
+        raise ValueError("weightClasses must have the shape of consequents")
+    rules = {cell: (int(consequents[cell]), int(weightClasses[cell]))
+             for cell in np.ndindex(consequents.shape) if consequents[cell] >= 0}
+    return MultiInputController(inputTerms, rules, **settings)
+
+
+# A function that makes a rule base of k inputs with T evenly spread terms each, for benchmarks
+#   Like the rule table of the article, the action grows with the mean term of the cell, low actions
+#   are defensive and high ones offensive; density => share of the T^k cells that get a rule
+def randomRuleBase(k, nTerms=5, density=1.0, seed=0, **settings):
+    peaks = np.linspace(0, 100, nTerms)
+    step = peaks[1] - peaks[0] if nTerms > 1 else 100
+    terms = [(max(p - step, 0), p, min(p + step, 100)) for p in peaks]
+    rng = np.random.default_rng(seed)
+
+    cells = np.indices((nTerms,) * k).reshape(k, -1).T
+    nActions = len(settings.get('actionTerms', ACTION_TERMS))
+    actions = np.rint(cells.mean(axis=1) / max(nTerms - 1, 1) * (nActions - 1)).astype(int) if k else np.zeros(1, int)
+    middle = (nActions - 1) / 2
+    classes = np.where(actions < middle, DEFENSIVE, np.where(actions > middle, OFFENSIVE, NEUTRAL))
+    keep = rng.random(len(cells)) < density
+    rules = {tuple(cell.tolist()): (int(action), int(weightClass))
+             for cell, action, weightClass, kept in zip(cells, actions, classes, keep) if kept}
+    return MultiInputController([terms] * k, rules, **settings)
@@ -0,0 +1,129 @@
+# This module contains the plots of the fuzzy logic game engine
+# matplotlib is only imported when a plot is made, so the engine can be used without it
+
+import numpy as np
+
+from FuzzyLogicGameInference import Interpolate, ACTION_NAMES
+
+TERM_NAMES = ['very low', 'low', 'medium', 'high', 'very high']
+TERM_COLORS = ['b', 'g', 'r', 'c', 'm']
+
+# Colors of the 25 rule areas, rule1 ... rule25
+RULE_COLORS = ['b', 'g', 'r', 'b', 'g',
+               'r', 'b', 'g', 'r', 'g',
+               'g', 'r', 'b', 'g', 'r',
+               'b', 'g', 'r', 'b', 'g',
+               'r', 'b', 'g', 'r', 'b']
+
+
+# A function that imports matplotlib the first time a plot is made
+def _pyplot():
+    import matplotlib.pyplot as plt
+    return plt
+
+
+# Shows all the figures
+def show():
+    _pyplot().show()
+
+
+# Plotting the membership functions of one variable
+def plotMemberships(x, sets, title, names=TERM_NAMES):
+    plt = _pyplot()
+    fig = plt.figure()
+    for y, color, name in zip(sets, TERM_COLORS, names):
+        plt.plot(x, y, color, label=name)
+    plt.title(title)
+    plt.legend()
+    plt.grid(True)
+    return fig
+
+
+# Plotting the membership functions of the ammo, health and action universes
+def plotUniverses(x_ammo, ammo_sets, x_health, health_sets, x_action, action_sets):
+    plt = _pyplot()
+    figures = [plotMemberships(x_ammo, ammo_sets, "Input: Ammo Fuzzy Universe"),
+               plotMemberships(x_health, health_sets, "Input: Health Fuzzy Universe"),
+               plotMemberships(x_action, action_sets, "Output: Action Fuzzy Universe", ACTION_NAMES)]
+    plt.tight_layout()
+    return figures
+
+
+# Plotting the original output domains as dashed lines
+def _plotActionSets(ax0, x_action, action_sets):
+    for y, color, name in zip(action_sets, TERM_COLORS, ACTION_NAMES):
+        ax0.plot(x_action, y, color, label=name, linestyle='--', alpha=0.5)
+
+
+# Plotting the rule activated areas in the action function
+def plotRuleAreas(x_action, action_sets, rule_areas):
+    plt = _pyplot()
+    action0 = np.zeros_like(x_action)  # This is needed for plotting the shaded area
+
+    _, ax0 = plt.subplots(nrows=1, figsize=(9, 4))
+    _plotActionSets(ax0, x_action, action_sets)
+    ax0.legend()
+    ax0.set_title('Output membership')
+    ax0.grid(True)
+
+    for area, color in zip(rule_areas, RULE_COLORS):
+        ax0.fill_between(x_action, action0, area, facecolor=color, alpha=0.7)
+
+    return ax0
+
+
+# Plotting an aggregated area with its centroid and mean of maximum
+#   name => 'Max' or 'Sum', the aggregator used
+def plotAggregate(x_action, action_sets, aggregated_output, centroid, mom, name):
+    plt = _pyplot()
+    action0 = np.zeros_like(x_action)
+
+    # Height of the aggregated output at the crisp values, for the plot
+    centroid_line = Interpolate(x_action, aggregated_output, centroid)
+    mom_line = Interpolate(x_action, aggregated_output, mom)
+
+    _, ax0 = plt.subplots(figsize=(9, 4))
+    _plotActionSets(ax0, x_action, action_sets)
+    ax0.fill_between(x_action, action0, aggregated_output, facecolor='b', alpha=0.5)  # plot for area under curve
+    ax0.plot([centroid, centroid], [0, centroid_line], 'k', linewidth=1.5, alpha=0.9, label='%s & Centroid' % name)
+    ax0.plot([mom, mom], [0, mom_line], 'r', linewidth=1.5, alpha=0.9, label='%s & Mean of Maximum' % name)
+    ax0.legend()
+    ax0.set_title('Action Output: %s Aggregator' % name)
+    ax0.grid(True)
+
+    return ax0
+
+
+# Plotting everything the engine did for one decision
+#   details => the dict returned by fuzzyEngineDetailed
+def plotDecision(x_action, details):
+    return [plotRuleAreas(x_action, details['action_sets'], details['rule_areas']),
+            plotAggregate(x_action, details['action_sets'], details['max_aggregated_output'],
+                          details['max_centroid'], details['max_MOM'], 'Max'),
+            plotAggregate(x_action, details['action_sets'], details['sum_aggregated_output'],
+                          details['sum_centroid'], details['sum_MOM'], 'Sum')]
+
+
+# Plotting the decision surface, Z[i][j] is the action for ammo x[i] and health y[j]
+def plotSurface(x, y, Z):
+    plt = _pyplot()
+
+    # Developing the 3D surface plot
+    X, Y = np.meshgrid(x, y)
+
+    # Pseudo Color Plot
+    plt.figure()
+    plt.pcolor(X, Y, Z, cmap='viridis', edgecolor='k', linewidths=1)
+    plt.title("Mesh Plot of Input and Output Parameters")
+
+    # 3D surface plot
+    plt.figure()
+    ax = plt.axes(projection='3d')
+    ax.plot_surface(X, Y, Z, cmap='viridis', edgecolor='k', linewidths=1)
+
+    ax.set_xlabel('Ammo')
+    ax.set_ylabel('Health')
+    ax.set_zlabel("Action")
+    ax.set_title('Evolution of Input and Output Parameters')
+
+    return ax
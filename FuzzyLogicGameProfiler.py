@@ -0,0 +1,142 @@
+# This module records where the time of the fuzzy logic game engine goes
+# A Profiler attached to a FuzzyController (controller.enableProfiling()) records for every call:
+#   fuzzification => degrees of membership of the inputs (Interpolate / np.interp)
+#   rule firing => rule strengths (np.fmin of the levels times the mode weights)
+#   implication => action sets cut at the rule strengths (the ruleN_area arrays)
+#   aggregation => max (np.fmax) or sum of the cut action sets
+#   defuzzification => Centroid or MeanOfMax (for the analytic method: the whole analytic step,
+#                      for the sugeno method: the weighted average of the action peaks)
+# the wall time and the number of calls of every stage, and how often every rule fires.
+# Without a profiler the controller does not look at the clock at all.
+#
+# The numbers are available as a dict (snapshot) and can be written as:
+#   a Chrome trace (writeChromeTrace) => open in chrome://tracing or https://ui.perfetto.dev
+#   a cProfile stats file (writeProfile) => pstats.Stats(path), snakeviz, ...
+#
+# Usage: python FuzzyLogicGameProfiler.py [--batch 1000] [--calls 100] [--trace trace.json] [--pstats stats.prof]
+
+import argparse
+import json
+import marshal
+import time
+
+import numpy as np
+
+STAGES = ['fuzzification', 'rule firing', 'implication', 'aggregation', 'defuzzification']
+
+# Largest number of stage events kept for the Chrome trace
+MAX_EVENTS = 100000
+
+
+class Profiler:
+    # Per-stage times and rule firing counts of a FuzzyController
+    #   trace => keep every stage event for writeChromeTrace (at most maxEvents, the oldest are kept)
+
+    def __init__(self, trace=True, maxEvents=MAX_EVENTS):
+        self.trace = trace
+        self.maxEvents = maxEvents
+        self.reset()
+
+    def reset(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.calls = dict.fromkeys(STAGES, 0)
+        self.evaluations = 0
+        self.decisions = 0
+        self.ruleFirings = np.zeros(0, dtype=np.int64)
+        self.events = []  # (stage, start, seconds, batch)
+        self._origin = time.perf_counter()
+
+    # Adds the time of one stage, start and end from time.perf_counter()
+    def record(self, stage, start, end, batch=1):
+        self.seconds[stage] += end - start
+        self.calls[stage] += 1
+        if self.trace and len(self.events) < self.maxEvents:
+            self.events.append((stage, start, end - start, batch))
+
+    # Adds one evaluation of batch decisions and the number of decisions every rule fired in
+    def countRules(self, firings, batch):
+        self.evaluations += 1
+        self.decisions += batch
+        if len(firings) > len(self.ruleFirings):
+            self.ruleFirings = np.concatenate([self.ruleFirings,
+                                               np.zeros(len(firings) - len(self.ruleFirings), dtype=np.int64)])
+        self.ruleFirings[:len(firings)] += firings
+
+    def snapshot(self):
+        total = sum(self.seconds.values())
+        stages = {stage: {'seconds': self.seconds[stage], 'calls': self.calls[stage],
+                          'mean_us': self.seconds[stage] / self.calls[stage] * 1e6 if self.calls[stage] else 0.0,
+                          'share': self.seconds[stage] / total if total > 0 else 0.0}
+                  for stage in STAGES}
+        firings = self.ruleFirings.tolist()
+        return {'evaluations': self.evaluations, 'decisions': self.decisions, 'seconds': total, 'stages': stages,
+                'ruleFirings': {'rule%d' % (r + 1): count for r, count in enumerate(firings)},
+                'ruleFiringRate': {'rule%d' % (r + 1): count / self.decisions if self.decisions else 0.0
+                                   for r, count in enumerate(firings)}}
+
+    # Writes the stage events in the Chrome trace event format
+    def writeChromeTrace(self, path):
+        events = [{'name': stage, 'cat': 'fuzzy', 'ph': 'X', 'pid': 0, 'tid': 0,
+                   'ts': (start - self._origin) * 1e6, 'dur': seconds * 1e6, 'args': {'batch': batch}}
+                  for stage, start, seconds, batch in self.events]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': self.snapshot()}, file)
+
+    # Writes the stage times in the format of cProfile's dump_stats, every stage is a function
+    # called by FuzzyController.evaluate
+    def writeProfile(self, path):
+        caller = ('FuzzyLogicGameController.py', 0, 'evaluate')
+        total = sum(self.seconds.values())
+        stats = {caller: (self.evaluations, self.evaluations, 0.0, total, {})}
+        for stage in STAGES:
+            calls, seconds = self.calls[stage], self.seconds[stage]
+            stats[('FuzzyLogicGameController.py', 0, stage)] = (calls, calls, seconds, seconds,
+                                                                 {caller: (calls, calls, seconds, seconds)})
+        with open(path, 'wb') as file:
+            marshal.dump(stats, file)
+
+
+# Prints a snapshot as a table
+def printSnapshot(snapshot):
+    print("%d evaluations, %d decisions, %.3f s" % (snapshot['evaluations'], snapshot['decisions'],
+                                                   snapshot['seconds']))
+    for stage, stats in snapshot['stages'].items():
+        print("  %-16s %8d calls %10.4f s %10.1f us/call %6.1f%%"
+              % (stage, stats['calls'], stats['seconds'], stats['mean_us'], stats['share'] * 100))
+    print("Rule firing rate:")
+    for rule, rate in snapshot['ruleFiringRate'].items():
+        print("  %-7s %6.1f%%" % (rule, rate * 100))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the stages of the fuzzy logic game engine")
+    parser.add_argument('--batch', type=int, default=1000, help="decisions per call, 0 => scalar calls")
+    parser.add_argument('--calls', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    parser.add_argument('--defuzzification', choices=['centroid', 'mom'], default='centroid')
+    parser.add_argument('--method', choices=['sampled', 'analytic', 'sugeno'], default='sampled')
+    parser.add_argument('--inference', choices=['dense', 'sparse'], default='dense')
+    parser.add_argument('--trace', help="write a Chrome trace to this file")
+    parser.add_argument('--pstats', help="write a cProfile stats file to this file")
+    args = parser.parse_args(argv)
+
+    from FuzzyLogicGameController import FuzzyController
+
+    controller = FuzzyController()
+    profiler = controller.enableProfiling()
+    rng = np.random.default_rng(args.seed)
+    for _ in range(args.calls):
+        size = args.batch or None
+        ammo, health, mode = rng.uniform(0, 100, size), rng.uniform(0, 100, size), rng.integers(1, 4, size)
+        controller.evaluate(ammo, health, mode, args.aggregation, args.defuzzification, args.method, args.inference)
+
+    printSnapshot(profiler.snapshot())
+    if args.trace:
+        profiler.writeChromeTrace(args.trace)
+    if args.pstats:
+        profiler.writeProfile(args.pstats)
+
+
+if __name__ == '__main__':
+    main()
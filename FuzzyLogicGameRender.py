@@ -0,0 +1,345 @@
+# This module renders the explanation figures of the fuzzy logic game engine in bulk, without a display
+# Every figure shows what the engine did for one input, like the plots of FuzzyLogicGameEngine.py:
+#   rule areas => the action sets cut at the strength of every rule
+#   max / sum => the aggregated output with its centroid and mean of maximum
+# A DecisionRenderer draws on one matplotlib Figure with an Agg canvas (pyplot is not used, so no
+# window is opened and the backend of the process is not changed). The axes, the dashed action
+# sets, the legends and the grids are made once; for every input only the rule-area polygons,
+# the aggregated-output polygons, the centroid / mean of maximum markers and the title change.
+# Rules that do not fire are hidden instead of drawn as empty polygons.
+#   png => the axes, ticks and grids are drawn once and kept as a background image; every figure
+#          restores it and draws the areas, then the dashed action sets, the markers, the legends
+#          and the title over them (blitting), and the pixels are written with Pillow
+#          The legends have an opaque square frame, so their pixels are drawn once and copied after
+#   svg => every figure is drawn completely, SVG files have no background image to reuse
+# The grid lines are under the areas in both formats.
+# The rule areas and the max output never go above the largest rule weight, their axes are fixed.
+# The sum output can, the top of its axis is set from the highest sum output of the inputs of a
+# batch before the background is drawn, so no figure of the batch is cut off.
+# On one core this writes about 12 png or 3 svg figures per second, against about 2 inputs per
+# second for the three pyplot figures of FuzzyLogicGameEngine.py saved and closed (--compare).
+#
+# renderDecisions writes one PNG or SVG file per input, on a pool of processes when asked
+# (every process has its own renderer and renders a contiguous share of the inputs), and
+# reports the throughput in figures per second.
+#
+# Usage: python FuzzyLogicGameRender.py [--inputs states.csv | --random 200] [--output figures]
+#                                       [--format png] [--workers 4] [--compare]
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController
+from FuzzyLogicGameInference import ACTION_NAMES, MODE_NAMES, NORMAL_MODE
+from FuzzyLogicGamePlots import TERM_COLORS, RULE_COLORS
+
+FORMATS = ['png', 'svg']
+
+# zlib level of the png files, 1 writes about three times faster than the default 6 for slightly larger files
+PNG_COMPRESSION = 1
+
+# Inputs per call of DecisionRenderer.details, which holds two aggregated outputs of len(x_action) per input
+DETAILS_CHUNK = 256
+
+
+# The inputs broadcast together and flattened
+def _flatInputs(ammo, health, mode):
+    ammo, health, mode = np.broadcast_arrays(np.asarray(ammo, dtype=float), np.asarray(health, dtype=float),
+                                             np.asarray(mode))
+    return ammo.ravel(), health.ravel(), mode.ravel()
+
+
+# Highest sum aggregated output of the inputs, computed DETAILS_CHUNK inputs at a time
+def sumOutputPeak(controller, ammo, health, mode):
+    ammo, health, mode = _flatInputs(ammo, health, mode)
+    peak = 0.0
+    for start in range(0, len(ammo), DETAILS_CHUNK):
+        chunk = slice(start, start + DETAILS_CHUNK)
+        rules = controller.ruleStrengths(*controller.fuzzify(ammo[chunk], health[chunk]), mode[chunk])
+        peak = max(peak, float(controller.aggregate(rules, 'sum').max()))
+    return peak
+
+
+class DecisionRenderer:
+    # One reusable figure for the decisions of a controller
+    #   controller => the FuzzyController to explain, by default the rule base from the article
+    #   dpi, figsize => size of the figure
+
+    def __init__(self, controller=None, dpi=100, figsize=(9, 12)):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from matplotlib.patches import Polygon
+
+        self.controller = controller if controller is not None else defaultController()
+        self.dpi = dpi
+        x = self.controller.x_action
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        axes = self.figure.subplots(3, 1)
+        for ax in axes:
+            for y, color, name in zip(self.controller.action_mf, TERM_COLORS, ACTION_NAMES):
+                ax.plot(x, y, color, label=name, linestyle='--', alpha=0.5)
+            ax.grid(True)
+        axes[0].set_title('Output membership')
+
+        # Polygons of the areas: the samples of the area, then back along the x axis
+        def polygon(ax, color, alpha):
+            vertices = np.zeros((len(x) + 2, 2))
+            vertices[1:-1, 0] = x
+            vertices[0, 0], vertices[-1, 0] = x[0], x[-1]
+            patch = Polygon(vertices, closed=True, facecolor=color, alpha=alpha, linewidth=0)
+            ax.add_patch(patch)
+            return patch, vertices
+
+        self._rulePolygons = [polygon(axes[0], color, 0.7) for color in RULE_COLORS[:self.controller.nRules]]
+        self._aggregates = []
+        for ax, name in zip(axes[1:], ('Max', 'Sum')):
+            patch, vertices = polygon(ax, 'b', 0.5)
+            centroid, = ax.plot([0, 0], [0, 0], 'k', linewidth=1.5, alpha=0.9, label='%s & Centroid' % name)
+            mom, = ax.plot([0, 0], [0, 0], 'r', linewidth=1.5, alpha=0.9, label='%s & Mean of Maximum' % name)
+            ax.set_title('Action Output: %s Aggregator' % name)
+            self._aggregates.append((patch, vertices, centroid, mom))
+        self._ruleLimit = max(1.0, float(self.controller.ruleWeights.max()))
+        for ax in axes:
+            ax.legend(loc='upper right', framealpha=1, fancybox=False)
+            ax.set_xlim(x[0], x[-1])
+            ax.set_ylim(0, 1.05 * self._ruleLimit)
+        self._sumAxes = axes[2]
+        self._title = self.figure.suptitle('')
+        for ax in axes:
+            ax.set_axisbelow(True)
+        self.figure.tight_layout(rect=(0, 0, 1, 0.97))
+
+        # The artists drawn over the background, in drawing order
+        self._foreground = ([patch for patch, _ in self._rulePolygons]
+                            + [patch for patch, _, _, _ in self._aggregates]
+                            + [line for ax in axes for line in ax.get_lines()])
+        self._legends = [ax.get_legend() for ax in axes]
+        self._background = None
+        self._legendImages = None
+
+    # Sets the top of the axis of the sum output so a sum output of height peak fits,
+    # never below the axes of the rule areas and the max output
+    def setSumPeak(self, peak):
+        top = 1.05 * max(self._ruleLimit, peak)
+        if self._sumAxes.get_ylim() != (0, top):
+            self._sumAxes.set_ylim(0, top)
+            # The ticks of the axis are part of the background image
+            if self._background is not None:
+                self._setAnimated(False)
+
+    # What the engine does for a batch of inputs: rule strengths, both aggregated outputs and their crisp values
+    #   The aggregated outputs have shape (2, batch, len(x_action)), render calls it DETAILS_CHUNK inputs at a time
+    def details(self, ammo, health, mode):
+        controller = self.controller
+        ammo, health, mode = _flatInputs(ammo, health, mode)
+        rules = controller.ruleStrengths(*controller.fuzzify(ammo, health), mode)
+        aggregated_output = np.stack([controller.aggregate(rules, 'max'), controller.aggregate(rules, 'sum')])
+        crisp = {(aggregation, defuzzification): controller.defuzzify(output, defuzzification)
+                 for aggregation, output in zip(('max', 'sum'), aggregated_output)
+                 for defuzzification in ('centroid', 'mom')}
+        return ammo, health, mode, rules, aggregated_output, crisp
+
+    # Moves the changing artists to decision i of details
+    def update(self, details, i):
+        ammo, health, mode, rules, aggregated_output, crisp = details
+        controller = self.controller
+        x = controller.x_action
+
+        for r, (patch, vertices) in enumerate(self._rulePolygons):
+            strength = rules[i, r]
+            patch.set_visible(strength > 0)
+            if strength > 0:
+                np.fmin(controller.action_mf[controller.ruleAction[r]], strength, out=vertices[1:-1, 1])
+                patch.set_xy(vertices)
+
+        for aggregation, output, (patch, vertices, centroid, mom) in zip(('max', 'sum'), aggregated_output,
+                                                                          self._aggregates):
+            vertices[1:-1, 1] = output[i]
+            patch.set_xy(vertices)
+            for line, defuzzification in ((centroid, 'centroid'), (mom, 'mom')):
+                value = crisp[aggregation, defuzzification][i]
+                line.set_data([value, value], [0, np.interp(value, x, output[i])])
+
+        self._title.set_text('Ammo %g, Health %g, %s Mode => max/centroid action %.2f'
+                             % (ammo[i], health[i], MODE_NAMES.get(int(mode[i]), mode[i]),
+                                crisp['max', 'centroid'][i]))
+
+    # Draws the figure with the foreground artists over the background image, for png files
+    def _blit(self):
+        canvas = self.figure.canvas
+        if self._background is None:
+            self._setAnimated(True)
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(self.figure.bbox)
+            # The legends on the plain background, with one pixel around them for the frame line
+            for legend in self._legends:
+                self.figure.draw_artist(legend)
+            self._legendImages = [canvas.copy_from_bbox(legend.get_window_extent().padded(1))
+                                  for legend in self._legends]
+        canvas.restore_region(self._background)
+        for artist in self._foreground:
+            if artist.get_visible():
+                self.figure.draw_artist(artist)
+        for image in self._legendImages:
+            canvas.restore_region(image)
+        self.figure.draw_artist(self._title)
+        return np.asarray(canvas.buffer_rgba())
+
+    # Takes the changing artists out of the normal drawing (for blitting) or puts them back
+    def _setAnimated(self, animated):
+        for artist in self._foreground + self._legends + [self._title]:
+            artist.set_animated(animated)
+        if not animated:
+            self._background = self._legendImages = None
+
+    # Writes the figure of every input to paths, the format comes from the extension of each path
+    #   sumPeak => highest sum output the axis of the sum output is made for,
+    #              None => the highest of these inputs (see sumOutputPeak)
+    def render(self, ammo, health, mode, paths, sumPeak=None):
+        from PIL import Image
+
+        ammo, health, mode = _flatInputs(ammo, health, mode)
+        self.setSumPeak(sumOutputPeak(self.controller, ammo, health, mode) if sumPeak is None else sumPeak)
+        for start in range(0, len(paths), DETAILS_CHUNK):
+            chunk = slice(start, start + DETAILS_CHUNK)
+            details = self.details(ammo[chunk], health[chunk], mode[chunk])
+            for i, path in enumerate(paths[chunk]):
+                self.update(details, i)
+                if path.endswith('.png'):
+                    Image.fromarray(self._blit()[:, :, :3]).save(path, dpi=(self.dpi, self.dpi),
+                                                                  compress_level=PNG_COMPRESSION)
+                else:
+                    if self._background is not None:
+                        self._setAnimated(False)
+                    self.figure.savefig(path, dpi=self.dpi)
+        return len(paths)
+
+
+# The renderer of a worker process, made once by _initWorker
+_workerRenderer = None
+
+
+def _initWorker(controller, dpi):
+    global _workerRenderer
+    _workerRenderer = DecisionRenderer(controller, dpi)
+
+
+def _renderShare(ammo, health, mode, paths, sumPeak):
+    return _workerRenderer.render(ammo, health, mode, paths, sumPeak)
+
+
+# File names of the figures, in the order of the inputs
+def figurePaths(directory, ammo, health, mode, format='png'):
+    return [os.path.join(directory, 'decision_%05d_ammo_%g_health_%g_mode_%d.%s' % (i, a, h, m, format))
+            for i, (a, h, m) in enumerate(zip(ammo.tolist(), health.tolist(), mode.tolist()))]
+
+
+# A function that writes the explanation figure of every input to a directory
+#   format => 'png' or 'svg'
+#   workers => number of processes (None => one per CPU, 0 or 1 => everything in this process)
+# Returns a dict with the paths written, the seconds taken and the figures per second
+def renderDecisions(ammo, health, mode=NORMAL_MODE, directory='.', format='png', controller=None, dpi=100,
+                    workers=0):
+    if format not in FORMATS:
+        raise ValueError("format must be 'png' or 'svg', not %r" % (format,))
+    if controller is None:
+        controller = defaultController()
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    ammo, health, mode = np.broadcast_arrays(np.asarray(ammo, dtype=float), np.asarray(health, dtype=float),
+                                             np.asarray(mode))
+    ammo, health, mode = ammo.ravel(), health.ravel(), mode.ravel()
+    controller._checkModes(mode)
+    os.makedirs(directory, exist_ok=True)
+    paths = figurePaths(directory, ammo, health, mode, format)
+
+    start = time.perf_counter()
+    if workers <= 1 or len(paths) <= 1:
+        DecisionRenderer(controller, dpi).render(ammo, health, mode, paths)
+    else:
+        # Every worker gets the sum axis of all the inputs, so the figures of all shares match
+        sumPeak = sumOutputPeak(controller, ammo, health, mode)
+        shares = np.array_split(np.arange(len(paths)), workers)
+        with ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(controller, dpi)) as pool:
+            futures = [pool.submit(_renderShare, ammo[share], health[share], mode[share],
+                                   [paths[i] for i in share], sumPeak) for share in shares if len(share)]
+            for future in futures:
+                future.result()
+    seconds = time.perf_counter() - start
+
+    return {'paths': paths, 'figures': len(paths), 'seconds': seconds,
+            'figuresPerSecond': len(paths) / seconds if seconds > 0 else 0.0}
+
+
+# Figures per second of the plots of FuzzyLogicGameEngine.py (three new pyplot figures per input),
+# saved to one file per input and closed, for comparison
+def pyplotFiguresPerSecond(ammo, health, mode, directory, format='png', dpi=100):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    from FuzzyLogicGameInference import fuzzyEngineDetailed, x_ammo, x_health, x_action
+    from FuzzyLogicGamePlots import plotDecision
+
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    for i, (a, h, m) in enumerate(zip(ammo.tolist(), health.tolist(), mode.tolist())):
+        axes = plotDecision(x_action, fuzzyEngineDetailed(x_ammo, x_health, x_action, h, a, m))
+        for k, ax in enumerate(axes):
+            ax.figure.savefig(os.path.join(directory, 'pyplot_%05d_%d.%s' % (i, k, format)), dpi=dpi)
+        plt.close('all')
+    return len(ammo) / (time.perf_counter() - start)
+
+
+# The inputs of a CSV file with ammo, health and optionally mode columns
+def readInputs(path, mode=NORMAL_MODE):
+    with open(path, newline='') as file:
+        records = list(csv.DictReader(file))
+    return (np.array([float(record['ammo']) for record in records]),
+            np.array([float(record['health']) for record in records]),
+            np.array([int(record['mode']) if record.get('mode') not in (None, '') else mode
+                      for record in records]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the explanation figures of many decisions")
+    parser.add_argument('--inputs', help="CSV file with ammo, health and optionally mode columns")
+    parser.add_argument('--random', type=int, default=100, help="number of random inputs when --inputs is not given")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mode', type=int, default=NORMAL_MODE, help="mode of inputs without one")
+    parser.add_argument('--output', default='figures', help="directory the figures are written to")
+    parser.add_argument('--format', choices=FORMATS, default='png')
+    parser.add_argument('--dpi', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=0, help="processes, 0 => render in this process")
+    parser.add_argument('--compare', action='store_true',
+                        help="also measure the pyplot figures of FuzzyLogicGameEngine.py on the first 20 inputs")
+    args = parser.parse_args(argv)
+
+    if args.inputs:
+        ammo, health, mode = readInputs(args.inputs, args.mode)
+    else:
+        rng = np.random.default_rng(args.seed)
+        ammo = rng.uniform(0, 100, args.random).round(1)
+        health = rng.uniform(0, 100, args.random).round(1)
+        mode = rng.integers(1, 4, args.random)
+
+    result = renderDecisions(ammo, health, mode, args.output, args.format, dpi=args.dpi, workers=args.workers)
+    print("%d figures in %.2f s => %.1f figures/s (%s, %d workers)"
+          % (result['figures'], result['seconds'], result['figuresPerSecond'], args.format, args.workers))
+    if args.compare:
+        count = min(20, len(ammo))
+        rate = pyplotFiguresPerSecond(ammo[:count], health[:count], mode[:count],
+                                      os.path.join(args.output, 'pyplot'), args.format, args.dpi)
+        print("pyplot figures of FuzzyLogicGameEngine.py: %.1f inputs/s (3 files per input)" % rate)
+
+
+if __name__ == '__main__':
+    main()
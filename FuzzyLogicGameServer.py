@@ -0,0 +1,416 @@
+# This module serves decisions of the fuzzy logic game engine to other processes over a socket
+# Game servers connect over a Unix domain socket or TCP and send one JSON object per line:
+#   {"ammo": 22, "health": 82, "mode": 1, "id": 7}  => {"action": 31.2, "id": 7}
+#   {"stats": true}                                  => the metrics of the server
+# "mode" is optional (default: the mode of the server) and "id" is sent back as it was received.
+# Requests can be pipelined, the answers of a connection come back in the order of its requests.
+#
+# Requests that arrive within window seconds of the first waiting request (or until maxBatch
+# requests are waiting) are evaluated together with one batched engine call. A longer window
+# gives bigger batches and more decisions per second, at the cost of the time requests wait.
+# The engine runs on a worker thread, so the server keeps reading requests for the next batch
+# while a batch is being evaluated.
+#
+# With --rules the rule base is read from a file (FuzzyLogicGameRuleFile.py) and reloaded before
+# the next batch when the file changes, so a designer can change rules while the server runs.
+#
+# The load command is a local client that measures latency and throughput, and the sweep command
+# runs the server and the client in this process for several windows to show the trade-off.
+#
+# Usage: python FuzzyLogicGameServer.py serve [--unix PATH | --port PORT] [--window-ms 2] [--max-batch 1024]
+#                                             [--rules FuzzyLogicGameRules.toml]
+#        python FuzzyLogicGameServer.py load [--unix PATH | --port PORT] [--connections 8] [--requests 5000]
+#        python FuzzyLogicGameServer.py sweep [--windows-ms 0 0.5 2 5]
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController, METHODS
+from FuzzyLogicGameInference import NORMAL_MODE
+from FuzzyLogicGameRuleFile import RuleBaseWatcher
+
+# Number of recent request latencies kept for the percentiles
+LATENCY_HISTORY = 100000
+
+
+class DecisionServer:
+    # An asyncio server that evaluates the requests of all its connections in micro-batches
+    #   controller => the FuzzyController to serve, by default the rule base from the article
+    #   window => longest time in seconds the first request of a batch waits for more requests
+    #   maxBatch => largest number of requests per engine call
+    #   mode => the mode of requests without one
+    #   aggregation, defuzzification, method, inference => see FuzzyController.evaluate
+    #   watcher => a RuleBaseWatcher of the controller, polled before every batch
+
+    def __init__(self, controller=None, window=0.002, maxBatch=1024, mode=NORMAL_MODE, aggregation='max',
+                 defuzzification='centroid', method='sampled', inference='sparse', watcher=None):
+        if window < 0:
+            raise ValueError("window must not be negative")
+        if maxBatch < 1:
+            raise ValueError("maxBatch must be at least 1")
+        if controller is None:
+            controller = watcher.controller if watcher is not None else defaultController()
+        self.controller = controller
+        self.watcher = watcher
+        self.window = window
+        self.maxBatch = maxBatch
+        self.mode = mode
+        self.settings = (aggregation, defuzzification, method, inference)
+
+        self._pending = []  # (ammo, health, mode, future, arrival time) of the waiting requests
+        self._ready = None
+        self._full = None
+        self._server = None
+        self._batcher = None
+        self._executor = None
+        # The task of every open connection => its writer
+        self._connections = {}
+        self.resetMetrics()
+
+    def resetMetrics(self):
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.largestBatch = 0
+        self.engineSeconds = 0.0
+        self._latencies = deque(maxlen=LATENCY_HISTORY)
+        self._started = time.perf_counter()
+
+    def metrics(self):
+        seconds = time.perf_counter() - self._started
+        latencies = np.array(self._latencies) * 1e6 if self._latencies else np.zeros(1)
+        return {'requests': self.requests, 'batches': self.batches, 'errors': self.errors,
+                'meanBatch': self.requests / self.batches if self.batches else 0.0,
+                'largestBatch': self.largestBatch, 'seconds': seconds,
+                'requestsPerSecond': self.requests / seconds if seconds > 0 else 0.0,
+                'engineShare': self.engineSeconds / seconds if seconds > 0 else 0.0,
+                'latency_p50_us': float(np.percentile(latencies, 50)),
+                'latency_p99_us': float(np.percentile(latencies, 99)),
+                'window': self.window, 'maxBatch': self.maxBatch,
+                'ruleReloads': self.watcher.reloads if self.watcher is not None else 0,
+                'ruleError': self.watcher.error if self.watcher is not None else None}
+
+    # Starts listening on a Unix domain socket (path) or on TCP (host, port)
+    #   port 0 picks a free port, the address is in self.address
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        self._ready = asyncio.Event()
+        self._full = asyncio.Event()
+        self._executor = ThreadPoolExecutor(1)
+        self._batcher = asyncio.ensure_future(self._batchLoop())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        self.resetMetrics()
+        return self
+
+    # Stops listening, closes the open connections and waits for them to answer what they have read
+    #   The connections are closed before wait_closed, which waits for every open connection
+    #   from Python 3.12.1 on
+    async def close(self):
+        self._server.close()
+        for writer in list(self._connections.values()):
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown()
+
+    async def serveForever(self):
+        await self._server.serve_forever()
+
+    # Queues one request, the returned future gets its crisp action
+    def submit(self, ammo, health, mode):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((ammo, health, mode, future, time.perf_counter()))
+        self._ready.set()
+        if len(self._pending) >= self.maxBatch:
+            self._full.set()
+        return future
+
+    # Evaluates the waiting requests, one batch at a time
+    async def _batchLoop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.wait()
+            delay = self.window - (time.perf_counter() - self._pending[0][4])
+            if len(self._pending) < self.maxBatch and delay > 0:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._pending[:self.maxBatch]
+            del self._pending[:self.maxBatch]
+            if not self._pending:
+                self._ready.clear()
+            ammo, health, mode, futures, arrivals = zip(*batch)
+
+            start = time.perf_counter()
+            try:
+                actions = await loop.run_in_executor(self._executor, self._evaluate, ammo, health, mode)
+            except Exception as error:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            now = time.perf_counter()
+            self.engineSeconds += now - start
+
+            for future, action in zip(futures, actions.tolist()):
+                if not future.done():
+                    future.set_result(action)
+            self.requests += len(batch)
+            self.batches += 1
+            self.largestBatch = max(self.largestBatch, len(batch))
+            self._latencies.extend(now - arrival for arrival in arrivals)
+
+    # Runs on the worker thread, so the rule base never changes during a batch
+    def _evaluate(self, ammo, health, mode):
+        if self.watcher is not None:
+            self.watcher.poll()
+        return np.atleast_1d(self.controller.evaluate(np.array(ammo), np.array(health), np.array(mode),
+                                                      *self.settings))
+
+    # Reads the requests of one connection and queues their answers in order
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        answers = asyncio.Queue()
+        sender = asyncio.ensure_future(self._send(answers, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                answers.put_nowait(self._request(line))
+        except ConnectionError:
+            pass
+        finally:
+            answers.put_nowait(None)
+            await sender
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+            del self._connections[task]
+
+    # The answer of one request line, a future for a decision or a dict right away
+    def _request(self, line):
+        try:
+            request = json.loads(line)
+            if request.get('stats'):
+                return self.metrics()
+            ammo, health = float(request['ammo']), float(request['health'])
+            if not (np.isfinite(ammo) and np.isfinite(health)):
+                raise ValueError("ammo and health must be finite numbers")
+            mode = int(request['mode']) if request.get('mode') is not None else self.mode
+            if mode not in self.controller.modeWeights:
+                raise ValueError("Select a value from the specified options: %s"
+                                 % ", ".join(str(m) for m in sorted(self.controller.modeWeights)))
+        except KeyError as error:
+            self.errors += 1
+            return {'error': "missing field %s" % error}
+        except (ValueError, TypeError, AttributeError) as error:
+            self.errors += 1
+            return {'error': str(error)}
+        return request.get('id'), self.submit(ammo, health, mode)
+
+    # Writes the answers of one connection in the order of its requests
+    async def _send(self, answers, writer):
+        while True:
+            answer = await answers.get()
+            if answer is None:
+                break
+            if isinstance(answer, tuple):
+                id, future = answer
+                try:
+                    answer = {'action': await future}
+                except Exception as error:
+                    answer = {'error': str(error)}
+                if id is not None:
+                    answer['id'] = id
+            try:
+                writer.write((json.dumps(answer) + '\n').encode())
+                if answers.empty():
+                    await writer.drain()
+            except ConnectionError:
+                break
+
+
+# Opens a connection to a decision server
+async def _connect(path=None, host='127.0.0.1', port=None):
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+# Asks a decision server for its metrics
+async def serverMetrics(path=None, host='127.0.0.1', port=None):
+    reader, writer = await _connect(path, host, port)
+    writer.write(b'{"stats": true}\n')
+    metrics = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    return metrics
+
+
+# A load generator that sends random requests to a decision server
+async def loadTest(path=None, host='127.0.0.1', port=None, connections=8, requests=5000, inFlight=32, seed=0):
+    # This function takes in the address of the server, the number of connections,
+    # the number of requests sent on every connection and the largest number of requests
+    # a connection has waiting for an answer.
+    # Returns a dict with the throughput and the latency seen by the clients
+
+    latencies = []
+    errors = [0]
+
+    async def client(number):
+        rng = np.random.default_rng(seed + number)
+        ammo, health, mode = rng.uniform(0, 100, requests), rng.uniform(0, 100, requests), rng.integers(1, 4, requests)
+        reader, writer = await _connect(path, host, port)
+        slots = asyncio.Semaphore(inFlight)
+        sent = deque()
+
+        async def receive():
+            for _ in range(requests):
+                answer = json.loads(await reader.readline())
+                latencies.append(time.perf_counter() - sent.popleft())
+                errors[0] += 'error' in answer
+                slots.release()
+
+        receiver = asyncio.ensure_future(receive())
+        for i in range(requests):
+            await slots.acquire()
+            sent.append(time.perf_counter())
+            writer.write(b'{"ammo": %r, "health": %r, "mode": %d, "id": %d}\n'
+                         % (float(ammo[i]), float(health[i]), int(mode[i]), i))
+            await writer.drain()
+        await receiver
+        writer.close()
+        await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(connections)))
+    seconds = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1e3
+    return {'connections': connections, 'requests': len(latencies), 'errors': errors[0], 'seconds': seconds,
+            'requestsPerSecond': len(latencies) / seconds,
+            'latency_p50_ms': float(np.percentile(latencies, 50)),
+            'latency_p99_ms': float(np.percentile(latencies, 99)),
+            'latency_max_ms': float(latencies.max())}
+
+
+# Runs a server and the load generator in this process for every window
+#   The client uses the same CPU as the server, so the numbers are for comparing windows
+async def sweep(windows, maxBatch=1024, connections=8, requests=2000, inFlight=32):
+    results = []
+    for window in windows:
+        server = DecisionServer(window=window, maxBatch=maxBatch)
+        if hasattr(socket, 'AF_UNIX'):
+            path = os.path.join(tempfile.mkdtemp(), 'decisions.sock')
+            await server.start(path)
+            address = {'path': path}
+        else:
+            await server.start()
+            address = {'host': server.address[0], 'port': server.address[1]}
+        load = await loadTest(connections=connections, requests=requests, inFlight=inFlight, **address)
+        metrics = server.metrics()
+        await server.close()
+        if 'path' in address:
+            os.remove(address['path'])
+        results.append(dict(load, window=window, maxBatch=maxBatch, meanBatch=metrics['meanBatch'],
+                            engineShare=metrics['engineShare']))
+    return results
+
+
+def _address(args):
+    if args.unix:
+        return {'path': args.unix}
+    return {'host': args.host, 'port': args.port}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve decisions of the fuzzy logic game engine over a socket")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, description in (('serve', "run the server"), ('load', "send random requests to a server"),
+                              ('sweep', "measure the batching trade-off for several windows")):
+        command = commands.add_parser(name, help=description)
+        command.add_argument('--max-batch', type=int, default=1024)
+        if name != 'sweep':
+            command.add_argument('--unix', help="path of the Unix domain socket")
+            command.add_argument('--host', default='127.0.0.1')
+            command.add_argument('--port', type=int, default=8765)
+        if name != 'serve':
+            command.add_argument('--connections', type=int, default=8)
+            command.add_argument('--requests', type=int, default=2000, help="requests per connection")
+            command.add_argument('--in-flight', type=int, default=32, help="requests waiting per connection")
+    serve = commands.choices['serve']
+    serve.add_argument('--window-ms', type=float, default=2.0)
+    serve.add_argument('--mode', type=int, default=NORMAL_MODE, help="mode of requests without one")
+    serve.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    serve.add_argument('--defuzzification', choices=['centroid', 'mom'], default='centroid')
+    serve.add_argument('--method', choices=METHODS, default='sampled')
+    serve.add_argument('--inference', choices=['dense', 'sparse'], default='sparse')
+    serve.add_argument('--rules', help="rule base file, reloaded when it changes")
+    serve.add_argument('--reload-interval', type=float, default=1.0, help="seconds between looks at the rule file")
+    commands.choices['sweep'].add_argument('--windows-ms', type=float, nargs='+', default=[0, 0.5, 2, 5])
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        watcher = RuleBaseWatcher(args.rules, interval=args.reload_interval) if args.rules else None
+
+        async def serve():
+            server = DecisionServer(window=args.window_ms / 1000, maxBatch=args.max_batch, mode=args.mode,
+                                    aggregation=args.aggregation, defuzzification=args.defuzzification,
+                                    method=args.method, inference=args.inference, watcher=watcher)
+            await server.start(**_address(args))
+            print("Serving decisions on %s" % (server.address,))
+            try:
+                await server.serveForever()
+            finally:
+                await server.close()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+
+    elif args.command == 'load':
+        address = _address(args)
+        result = asyncio.run(loadTest(connections=args.connections, requests=args.requests,
+                                      inFlight=args.in_flight, **address))
+        print(json.dumps(result, indent=1))
+        print(json.dumps(asyncio.run(serverMetrics(**address)), indent=1))
+
+    else:
+        results = asyncio.run(sweep([window / 1000 for window in args.windows_ms], args.max_batch,
+                                    args.connections, args.requests, args.in_flight))
+        print("%10s %10s %12s %12s %12s %12s" % ('window ms', 'mean batch', 'requests/s', 'p50 ms', 'p99 ms',
+                                                  'errors'))
+        for result in results:
+            print("%10.2f %10.1f %12.0f %12.2f %12.2f %12d"
+                  % (result['window'] * 1000, result['meanBatch'], result['requestsPerSecond'],
+                     result['latency_p50_ms'], result['latency_p99_ms'], result['errors']))
+
+
+if __name__ == '__main__':
+    main()
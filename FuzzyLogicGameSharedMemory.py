@@ -0,0 +1,298 @@
+# This module lets the fuzzy logic game engine run beside a game loop in another process
+# The agent states and the decisions live in two multiprocessing.shared_memory blocks, so
+# nothing is pickled or copied between the processes:
+#   <name>_state => header, then ammo (float64), health (float64) and mode (int8), one value per agent
+#   <name>_decisions => header, then the crisp action (float64) and the winning action term (int8)
+# The engine reads the state arrays in place (numpy views of the block) and writes the
+# decisions straight into the decisions block. Agents with an unknown mode or a non-finite ammo
+# or health get a nan action and the term -1, the decisions header counts them (invalid()).
+#
+# Handshake, one frame at a time:
+#   game loop => writes the states, then publish() raises the request sequence number
+#   engine => sees a request number above the last one it answered, writes the decisions,
+#             then raises the done sequence number to the same value
+#   game loop => wait(sequence) returns when the done number reaches the request number
+# A frame the engine fails to decide is marked as done too, with its sequence number in the
+# failed field of the decisions header (failed(sequence)), so the game loop never waits for it.
+# The sequence numbers are aligned 8 byte values written after the arrays, which is enough
+# on x86-64. The game loop must not change the states between publish() and wait().
+#
+# Before Python 3.13 every process that attaches a block also registers it with its resource
+# tracker, which removes the block when that process exits. Processes started with
+# multiprocessing share the tracker of their parent, so this only matters for unrelated processes.
+#
+# Usage: python FuzzyLogicGameSharedMemory.py [--agents 100000] [--frames 50]
+
+import argparse
+import multiprocessing
+import secrets
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController, METHODS, MEMORY_BUDGET
+
+HEADER_SIZE = 64
+
+# Fields of the state header (int64)
+_REQUEST, _SIZE, _STOP = range(3)
+# Fields of the decisions header (int64)
+#   _DONE => sequence number of the last frame answered
+#   _FAILED => sequence number of the last frame that could not be decided (0 => none)
+#   _INVALID => agents of the last frame answered that could not be decided
+_DONE, _FAILED, _INVALID = range(3)
+
+
+# Opens an existing block without handing it to the resource tracker when Python allows it
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name)
+
+
+class SharedFrame:
+    # The shared memory blocks of the agent states and their decisions
+    # Create them with SharedFrame.create(size) in the game loop and open them with
+    # SharedFrame.attach(name) in the engine process (or the other way round).
+    #   ammo, health, mode => the state arrays, views of the state block
+    #   action, term => the decision arrays, views of the decisions block
+
+    def __init__(self, name, state, decisions, owner=False):
+        self.name = name
+        self._stateBlock = state
+        self._decisionsBlock = decisions
+        self.owner = owner
+
+        self._stateHeader = np.ndarray((HEADER_SIZE // 8,), dtype=np.int64, buffer=state.buf)
+        self._decisionsHeader = np.ndarray((HEADER_SIZE // 8,), dtype=np.int64, buffer=decisions.buf)
+        size = int(self._stateHeader[_SIZE])
+
+        self.ammo = np.ndarray((size,), dtype=np.float64, buffer=state.buf, offset=HEADER_SIZE)
+        self.health = np.ndarray((size,), dtype=np.float64, buffer=state.buf, offset=HEADER_SIZE + 8 * size)
+        self.mode = np.ndarray((size,), dtype=np.int8, buffer=state.buf, offset=HEADER_SIZE + 16 * size)
+        self.action = np.ndarray((size,), dtype=np.float64, buffer=decisions.buf, offset=HEADER_SIZE)
+        self.term = np.ndarray((size,), dtype=np.int8, buffer=decisions.buf, offset=HEADER_SIZE + 8 * size)
+
+    # Creates the blocks for size agents, the name is random when not given
+    @classmethod
+    def create(cls, size, name=None):
+        if name is None:
+            name = 'fzgame_%s' % secrets.token_hex(6)
+        state = shared_memory.SharedMemory('%s_state' % name, create=True, size=HEADER_SIZE + 17 * size)
+        try:
+            decisions = shared_memory.SharedMemory('%s_decisions' % name, create=True, size=HEADER_SIZE + 9 * size)
+        except BaseException:
+            state.close()
+            state.unlink()
+            raise
+        header = np.ndarray((HEADER_SIZE // 8,), dtype=np.int64, buffer=state.buf)
+        header[:] = 0
+        header[_SIZE] = size
+        del header
+        np.ndarray((HEADER_SIZE // 8,), dtype=np.int64, buffer=decisions.buf)[:] = 0
+        return cls(name, state, decisions, owner=True)
+
+    # Opens the blocks made by create
+    @classmethod
+    def attach(cls, name):
+        return cls(name, _attach('%s_state' % name), _attach('%s_decisions' % name))
+
+    def __len__(self):
+        return len(self.ammo)
+
+    # Game loop side
+
+    # Tells the engine the states of a new frame are ready, returns the sequence number of the frame
+    def publish(self):
+        self._stateHeader[_REQUEST] += 1
+        return int(self._stateHeader[_REQUEST])
+
+    # True when the decisions of frame sequence are written
+    def ready(self, sequence):
+        return self._decisionsHeader[_DONE] >= sequence
+
+    # Waits for the decisions of frame sequence, returns False on timeout
+    #   poll => seconds slept between two checks (0 => only yield the CPU)
+    def wait(self, sequence, timeout=None, poll=0.0):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while self._decisionsHeader[_DONE] < sequence:
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    # True when the engine failed to decide frame sequence (its decisions are not written)
+    def failed(self, sequence):
+        return self._decisionsHeader[_FAILED] == sequence
+
+    # Number of agents of the last frame answered with an unknown mode or a non-finite ammo or health
+    def invalid(self):
+        return int(self._decisionsHeader[_INVALID])
+
+    # Asks the engine to stop serving
+    def stop(self):
+        self._stateHeader[_STOP] = 1
+
+    # Engine side
+
+    # The sequence number of the newest frame, or None when the last one is answered
+    def pending(self):
+        sequence = int(self._stateHeader[_REQUEST])
+        return sequence if sequence > self._decisionsHeader[_DONE] else None
+
+    def stopped(self):
+        return bool(self._stateHeader[_STOP])
+
+    # Marks the decisions of frame sequence as written
+    #   invalid => agents that could not be decided, failed => the frame could not be decided at all
+    def complete(self, sequence, invalid=0, failed=False):
+        self._decisionsHeader[_INVALID] = invalid
+        if failed:
+            self._decisionsHeader[_FAILED] = sequence
+        self._decisionsHeader[_DONE] = sequence
+
+    # Releases the views and closes the blocks (and removes them when this frame created them)
+    def close(self):
+        del self.ammo, self.health, self.mode, self.action, self.term
+        del self._stateHeader, self._decisionsHeader
+        for block in (self._stateBlock, self._decisionsBlock):
+            block.close()
+            if self.owner:
+                block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SharedMemoryEngine:
+    # Answers the frames of a SharedFrame with a FuzzyController
+    #   controller => the FuzzyController to use, by default the rule base from the article
+    #   aggregation, defuzzification, method => see FuzzyController.evaluate (the inference is sparse)
+    #   terms => also write the winning action term, the consequent of the strongest rule
+    #            (ties go to the lower term)
+    #   memoryBudget => bytes of working memory, the agents are decided in chunks of
+    #                   memoryBudget // controller.rowBytes(method), see FuzzyController.evaluateBounded
+    # An error while deciding a frame does not stop the engine: the frame is marked as failed and
+    # the error is kept in lastError.
+
+    def __init__(self, frame, controller=None, aggregation='max', defuzzification='centroid', method='sampled',
+                 terms=True, memoryBudget=MEMORY_BUDGET):
+        self.frame = frame
+        self.controller = controller if controller is not None else defaultController()
+        self.aggregation = aggregation
+        self.defuzzification = defuzzification
+        self.method = method
+        self.terms = terms
+        self.chunkSize = memoryBudget // self.controller.rowBytes(method)
+        if self.chunkSize < 1:
+            raise ValueError("memoryBudget must hold at least one decision (%d bytes)"
+                             % self.controller.rowBytes(method))
+        self.frames = 0
+        self.seconds = 0.0
+        self.failures = 0
+        self.lastError = None
+
+    # Writes the decisions for the states as they are in the blocks, one chunk of agents at a time
+    #   Returns the number of agents with an unknown mode or a non-finite ammo or health, which are
+    #   decided with the first mode and inputs of 0 and then get a nan action and the term -1
+    def decide(self):
+        frame, controller = self.frame, self.controller
+        modes = np.array(sorted(controller.modeWeights))
+        invalid = 0
+        for start in range(0, len(frame), self.chunkSize):
+            agents = slice(start, start + self.chunkSize)
+            ammo, health, mode = frame.ammo[agents], frame.health[agents], frame.mode[agents]
+            bad = ~(np.isin(mode, modes) & np.isfinite(ammo) & np.isfinite(health))
+            if bad.any():
+                ammo, health, mode = np.where(bad, 0, ammo), np.where(bad, 0, health), np.where(bad, modes[0], mode)
+            ruleIndex, rules = controller.sparseRuleStrengths(ammo, health, mode)
+            frame.action[agents] = controller.defuzzifySparse(ruleIndex, rules, self.aggregation,
+                                                              self.defuzzification, self.method)
+            if self.terms:
+                frame.term[agents] = np.argmax(controller.sparseTermCuts(ruleIndex, rules), axis=1)
+            if bad.any():
+                frame.action[agents][bad] = np.nan
+                frame.term[agents][bad] = -1
+                invalid += int(bad.sum())
+        return invalid
+
+    # Answers the newest frame if there is one, returns True when it did
+    def process(self):
+        sequence = self.frame.pending()
+        if sequence is None:
+            return False
+        start = time.perf_counter()
+        try:
+            invalid = self.decide()
+        except Exception as error:
+            self.failures += 1
+            self.lastError = error
+            self.frame.complete(sequence, failed=True)
+        else:
+            self.frame.complete(sequence, invalid)
+        self.seconds += time.perf_counter() - start
+        self.frames += 1
+        return True
+
+    # Answers frames until the game loop calls stop()
+    #   poll => seconds slept when there is no frame to answer
+    def serve(self, poll=0.0):
+        while not self.frame.stopped():
+            if not self.process():
+                time.sleep(poll)
+
+
+# Attaches to the blocks of name and answers frames until stopped, for a multiprocessing.Process
+def runEngine(name, aggregation='max', defuzzification='centroid', method='sampled', terms=True, poll=0.0):
+    frame = SharedFrame.attach(name)
+    try:
+        SharedMemoryEngine(frame, aggregation=aggregation, defuzzification=defuzzification, method=method,
+                           terms=terms).serve(poll)
+    finally:
+        frame.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the fuzzy logic game engine in another process "
+                                                 "through shared memory")
+    parser.add_argument('--agents', type=int, default=100000)
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    parser.add_argument('--defuzzification', choices=['centroid', 'mom'], default='centroid')
+    parser.add_argument('--method', choices=METHODS, default='sampled')
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    with SharedFrame.create(args.agents) as frame:
+        engine = multiprocessing.Process(target=runEngine, args=(frame.name, args.aggregation,
+                                                                 args.defuzzification, args.method))
+        engine.start()
+        try:
+            times = []
+            for _ in range(args.frames):
+                # The game loop writes the states of the frame in place
+                frame.ammo[:] = rng.uniform(0, 100, len(frame))
+                frame.health[:] = rng.uniform(0, 100, len(frame))
+                frame.mode[:] = rng.integers(1, 4, len(frame))
+                start = time.perf_counter()
+                frame.wait(frame.publish())
+                times.append(time.perf_counter() - start)
+        finally:
+            frame.stop()
+            engine.join()
+
+        times = np.array(times) * 1e3
+        print("%d agents x %d frames: p50 %.2f ms, p99 %.2f ms per frame => %.0f decisions/s"
+              % (args.agents, args.frames, np.percentile(times, 50), np.percentile(times, 99),
+                 args.agents * args.frames / (times.sum() / 1e3)))
+        print("Actions of the last frame:", np.bincount(frame.term, minlength=5).tolist())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+# This module load-tests the fuzzy logic game engine with a simulation of many NPCs
+# Every NPC has its own ammo, health and mode (1. Attack Mode, 2. Defence Mode, 3. Normal Mode),
+# kept in one numpy array per field (struct of arrays). On every tick the actions of all
+# the NPCs are computed with one batched engine call, then every NPC is moved by simple
+# damage / resupply dynamics that depend on the action it chose.
+# NPCs whose health drops to 0 respawn with full health, random ammo and a random mode.
+#
+# The random numbers come from one generator seeded with the seed, so a run with the same
+# settings gives the same states and the same action counts. The simulation is headless.
+# With incremental=True the NPCs are evaluated by an IncrementalEvaluator, which only aggregates
+# again the NPCs whose rule strengths changed since the last tick (FuzzyLogicGameIncremental.py).
+#
+# Usage: python FuzzyLogicGameSimulation.py [--npcs 100000] [--ticks 20] [--seed 0] ...
+
+import argparse
+import time
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController, METHODS
+from FuzzyLogicGameIncremental import IncrementalEvaluator
+from FuzzyLogicGameInference import ACTION_TERMS, ACTION_NAMES, HIDE, RUN, STOP, WALK, ATTACK, MODE_NAMES
+
+# What every action does to an NPC in one tick
+#   (ammo used, largest amount of ammo found, health regained, chance of being hit, largest damage of a hit)
+ACTION_EFFECTS = {
+    HIDE: (0.0, 1.0, 3.0, 0.05, 10.0),
+    RUN: (0.0, 2.0, 1.0, 0.15, 10.0),
+    STOP: (0.0, 4.0, 1.0, 0.20, 15.0),
+    WALK: (1.0, 3.0, 0.5, 0.25, 15.0),
+    ATTACK: (5.0, 0.0, 0.0, 0.40, 20.0),
+}
+
+
+class NpcSimulation:
+    # A population of NPCs driven by the fuzzy logic game engine
+    #   size => number of NPCs
+    #   seed => seed of the random generator
+    #   controller => the FuzzyController deciding the actions, by default the rule base from the article
+    #   lookup => optional LookupTable used instead of the controller
+    #   aggregation, defuzzification, method, inference => see FuzzyController.evaluate
+    #   chunkSize => largest number of NPCs per engine call (None => the whole population in one call)
+    #                the sampled method holds a (chunk, len(x_action)) array, so very large
+    #                populations need a chunk size to fit in memory
+    #   incremental => evaluate with an IncrementalEvaluator (not with a lookup table),
+    #                  which bounds its memory by itself
+    #   integerStates => ammo and health are whole numbers (rounded after every tick), like ammo
+    #                    counts and hit points
+
+    def __init__(self, size, seed=0, controller=None, lookup=None, aggregation='max', defuzzification='centroid',
+                 method='sampled', inference='sparse', chunkSize=None, incremental=False, integerStates=False):
+        self.controller = controller if controller is not None else defaultController()
+        self.lookup = lookup
+        self.aggregation = aggregation
+        self.defuzzification = defuzzification
+        self.method = method
+        self.inference = inference
+        self.chunkSize = chunkSize
+        self.incremental = None
+        if incremental:
+            if lookup is not None:
+                raise ValueError("incremental evaluation needs the controller, not a lookup table")
+            self.incremental = IncrementalEvaluator(self.controller, aggregation, defuzzification, method)
+        self.modes = np.array(sorted(lookup.modes if lookup is not None else self.controller.modeWeights),
+                              dtype=np.int8)
+
+        # Action term of a crisp value => the term with the closest peak
+        peaks = np.array([b for _, b, _ in ACTION_TERMS], dtype=float)
+        self._boundaries = (peaks[1:] + peaks[:-1]) / 2
+        self._effects = np.array([ACTION_EFFECTS[k] for k in range(len(ACTION_TERMS))]).T
+
+        self.rng = np.random.default_rng(seed)
+        self.ammo = self.rng.uniform(0, 100, size)
+        self.health = self.rng.uniform(0, 100, size)
+        self.mode = self.rng.choice(self.modes, size)
+        self.integerStates = integerStates
+        if integerStates:
+            np.rint(self.ammo, out=self.ammo)
+            np.rint(self.health, out=self.health)
+        self.action = np.zeros(size)
+        self.actionTerm = np.zeros(size, dtype=np.int8)
+
+        self.ticks = 0
+        self.deaths = 0
+        self.actionCounts = np.zeros(len(ACTION_TERMS), dtype=np.int64)
+        self.engineSeconds = 0.0
+        self.seconds = 0.0
+
+    def __len__(self):
+        return len(self.ammo)
+
+    # Crisp action of every NPC, with one engine call per chunk of NPCs
+    def _decide(self):
+        if self.incremental is not None:
+            self.action[:] = self.incremental.evaluate(self.ammo, self.health, self.mode)
+            return
+        size = len(self)
+        chunkSize = self.chunkSize or size
+        for start in range(0, size, chunkSize):
+            stop = start + chunkSize
+            if self.lookup is not None:
+                self.action[start:stop] = self.lookup.evaluate(self.ammo[start:stop], self.health[start:stop],
+                                                               self.mode[start:stop], self.aggregation,
+                                                               self.defuzzification)
+            else:
+                self.action[start:stop] = self.controller.evaluate(self.ammo[start:stop], self.health[start:stop],
+                                                                   self.mode[start:stop], self.aggregation,
+                                                                   self.defuzzification, self.method,
+                                                                   self.inference)
+
+    # Moves the simulation one tick forward
+    def step(self):
+        start = time.perf_counter()
+        self._decide()
+        self.engineSeconds += time.perf_counter() - start
+
+        size = len(self)
+        self.actionTerm[:] = np.digitize(self.action, self._boundaries)
+        ammoUsed, ammoFound, healing, hitChance, damage = self._effects[:, self.actionTerm]
+        hit = self.rng.random(size) < hitChance
+
+        self.ammo += self.rng.random(size) * ammoFound - ammoUsed
+        np.clip(self.ammo, 0, 100, out=self.ammo)
+        self.health += healing - hit * self.rng.random(size) * damage
+        np.clip(self.health, 0, 100, out=self.health)
+
+        dead = np.flatnonzero(self.health <= 0)
+        if len(dead):
+            self.health[dead] = 100
+            self.ammo[dead] = self.rng.uniform(0, 100, len(dead))
+            self.mode[dead] = self.rng.choice(self.modes, len(dead))
+            self.deaths += len(dead)
+        if self.integerStates:
+            np.rint(self.ammo, out=self.ammo)
+            np.rint(self.health, out=self.health)
+
+        self.actionCounts += np.bincount(self.actionTerm, minlength=len(ACTION_TERMS))
+        self.ticks += 1
+        self.seconds += time.perf_counter() - start
+
+    # Runs ticks ticks, calling report(simulation) after every tick when given
+    def run(self, ticks, report=None):
+        for _ in range(ticks):
+            self.step()
+            if report is not None:
+                report(self)
+        return self.stats()
+
+    def stats(self):
+        agentTicks = self.ticks * len(self)
+        total = max(int(self.actionCounts.sum()), 1)
+        return {'npcs': len(self), 'ticks': self.ticks, 'agentTicks': agentTicks, 'seconds': self.seconds,
+                'agentTicksPerSecond': agentTicks / self.seconds if self.seconds > 0 else 0.0,
+                'engineShare': self.engineSeconds / self.seconds if self.seconds > 0 else 0.0,
+                'deaths': self.deaths,
+                'actions': {name: int(count) for name, count in zip(ACTION_NAMES, self.actionCounts)},
+                'actionShare': {name: count / total for name, count in zip(ACTION_NAMES, self.actionCounts.tolist())},
+                'modes': {MODE_NAMES.get(int(mode), str(mode)): int(np.count_nonzero(self.mode == mode))
+                          for mode in self.modes},
+                'meanAmmo': float(self.ammo.mean()), 'meanHealth': float(self.health.mean()),
+                'incremental': self.incremental.stats() if self.incremental is not None else None}
+
+
+# Prints the stats of a run
+def printStats(stats):
+    print("%d NPCs x %d ticks = %d agent-ticks in %.2f s => %.0f agent-ticks/s (%.0f%% in the engine)"
+          % (stats['npcs'], stats['ticks'], stats['agentTicks'], stats['seconds'], stats['agentTicksPerSecond'],
+             stats['engineShare'] * 100))
+    print("Actions:")
+    for name, count in stats['actions'].items():
+        print("  %-12s %12d  %5.1f%%" % (name, count, stats['actionShare'][name] * 100))
+    print("Modes at the end:", ", ".join("%s %d" % item for item in stats['modes'].items()))
+    print("Deaths: %d, mean ammo: %.1f, mean health: %.1f" % (stats['deaths'], stats['meanAmmo'],
+                                                             stats['meanHealth']))
+    if stats.get('incremental'):
+        incremental = stats['incremental']
+        print("Incremental: %.1f%% of the aggregations skipped (%.1f%% same inputs, %d same rules, %d same cuts), "
+              "%.1f%% of the rule slots changed"
+              % (incremental['skippedFraction'] * 100, incremental['unchangedFraction'] * 100,
+                 incremental['sameRules'], incremental['sameCuts'], incremental['changedRuleFraction'] * 100))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate NPCs driven by the fuzzy logic game engine")
+    parser.add_argument('--npcs', type=int, default=100000)
+    parser.add_argument('--ticks', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    parser.add_argument('--defuzzification', choices=['centroid', 'mom'], default='centroid')
+    parser.add_argument('--method', choices=METHODS, default='sampled')
+    parser.add_argument('--inference', choices=['dense', 'sparse'], default='sparse')
+    parser.add_argument('--chunk-size', type=int, default=65536,
+                        help="largest number of NPCs per engine call, 0 => all of them in one call")
+    parser.add_argument('--lookup', help="decide with this lookup table file (built if missing)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only aggregate again the NPCs whose rule strengths changed since the last tick")
+    parser.add_argument('--integer-states', action='store_true', help="whole numbers of ammo and health")
+    parser.add_argument('--verbose', action='store_true', help="print the time of every tick")
+    args = parser.parse_args(argv)
+
+    lookup = None
+    if args.lookup:
+        from FuzzyLogicGameLookup import loadOrBuildLookupTable
+        lookup = loadOrBuildLookupTable(args.lookup)
+
+    simulation = NpcSimulation(args.npcs, args.seed, lookup=lookup, aggregation=args.aggregation,
+                               defuzzification=args.defuzzification, method=args.method,
+                               inference=args.inference, chunkSize=args.chunk_size, incremental=args.incremental,
+                               integerStates=args.integer_states)
+
+    def report(simulation):
+        print("tick %d: %.3f s" % (simulation.ticks, simulation.seconds))
+
+    printStats(simulation.run(args.ticks, report if args.verbose else None))
+
+
+if __name__ == '__main__':
+    main()
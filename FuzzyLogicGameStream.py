@@ -0,0 +1,282 @@
+# This module streams game state logs through the fuzzy logic game engine
+# Records are read from a CSV or JSON lines file (or stdin) in chunks, every chunk is
+# evaluated with one batched engine call and the results are written out right away,
+# so memory use does not depend on the length of the log.
+#
+# Every record needs an ammo and a health value and can have a mode (1. Attack Mode,
+# 2. Defence Mode, 3. Normal Mode), records without a mode use the default mode.
+# Records that cannot be evaluated (missing, invalid or non-finite values, unknown mode, JSON lines
+# that are not an object) are reported one by one
+# and left out of the output, the rest of the stream goes on.
+# The output has the input fields followed by the crisp action (or, with --all, the actions of
+# the four combinations: max_centroid, sum_centroid, max_mom, sum_mom) and, when asked for,
+# the strength of every rule (rule1 ... rule25).
+#
+# Usage: python FuzzyLogicGameStream.py [input] [output] [--format csv|jsonl] [--rules] ...
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController, METHODS
+from FuzzyLogicGameInference import NORMAL_MODE, COMBINATIONS
+
+# Output fields of the four combinations, in the order of COMBINATIONS
+COMBINATION_FIELDS = ['%s_%s' % combination for combination in COMBINATIONS]
+
+
+# A generator that reads the records of a CSV file with a header line
+def readCsvRecords(stream):
+    for record in csv.DictReader(stream):
+        yield record
+
+
+# A line of a JSON lines file that is not valid JSON, parseRecord raises its error so it is
+# reported and left out like the other bad records
+class UnreadableRecord:
+    def __init__(self, line, error):
+        self.line = line
+        self.error = error
+
+
+# A generator that reads the records of a JSON lines file, one object per line
+#   Lines that are not valid JSON are yielded as UnreadableRecord
+def readJsonRecords(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                yield UnreadableRecord(line, error)
+
+
+# A generator that groups the records in lists of at most chunkSize records
+def chunked(records, chunkSize):
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, chunkSize))
+        if not chunk:
+            return
+        yield chunk
+
+
+# A function that reads the (ammo, health, mode) of a record, records without a mode
+# (no field, null or an empty CSV cell) get the default mode
+def parseRecord(record, controller, mode=NORMAL_MODE):
+    # This function raises a ValueError saying what is wrong with the record
+
+    if isinstance(record, UnreadableRecord):
+        raise ValueError("invalid JSON: %s" % record.error)
+    if not isinstance(record, dict):
+        raise ValueError("a record must be an object, not %s" % json.dumps(record))
+    try:
+        ammo, health = float(record['ammo']), float(record['health'])
+        recordMode = record.get('mode')
+        recordMode = int(recordMode) if recordMode not in (None, '') else mode
+    except KeyError as error:
+        raise ValueError("missing field %s" % error)
+    except (TypeError, ValueError) as error:
+        raise ValueError("invalid value: %s" % error)
+    if not (math.isfinite(ammo) and math.isfinite(health)):
+        raise ValueError("ammo and health must be finite numbers")
+    if recordMode not in controller.modeWeights:
+        raise ValueError("unknown mode %r" % (recordMode,))
+    return ammo, health, recordMode
+
+
+# A generator that evaluates chunks of records with one engine call per chunk
+def evaluateChunks(chunks, controller=None, mode=NORMAL_MODE, aggregation='max', defuzzification='centroid',
+                   method='sampled', ruleStrengths=False, allCombinations=False, onError=None):
+    # This function takes in an iterable of lists of records (dicts with ammo, health and optionally mode)
+    # and yields for every chunk: the records, their crisp actions and (when ruleStrengths is True)
+    # the strength of every rule, shape (records, rules), otherwise None
+    # With allCombinations the actions have shape (records, 4), one column per combination
+    # (see FuzzyController.evaluateAll) and aggregation and defuzzification are not used
+    # onError => function called as onError(number, record, message) for every record that cannot be
+    #            evaluated (number counts the records from 1), which is then left out of its chunk,
+    #            None => such a record raises a ValueError
+
+    if controller is None:
+        controller = defaultController()
+
+    number = 0
+    for records in chunks:
+        chunk, inputs = [], []
+        for record in records:
+            number += 1
+            try:
+                inputs.append(parseRecord(record, controller, mode))
+            except ValueError as error:
+                if onError is None:
+                    raise ValueError("record %d: %s" % (number, error))
+                onError(number, record, str(error))
+                continue
+            chunk.append(record)
+        if not chunk:
+            continue
+        ammo, health, modes = (np.array(values) for values in zip(*inputs))
+
+        ammo_levels, health_levels = controller.fuzzify(ammo, health)
+        rules = controller.ruleStrengths(ammo_levels, health_levels, modes)
+        if allCombinations:
+            if method == 'analytic':
+                actions = controller.defuzzifyAllAnalytic(rules)
+                actions = np.stack([actions[combination] for combination in COMBINATIONS], axis=-1)
+            else:
+                aggregated_output = controller.aggregateAll(rules).reshape(-1, len(controller.x_action))
+                actions = np.stack([controller.defuzzify(aggregated_output, defuzzification).reshape(2, -1)
+                                    for defuzzification in ('centroid', 'mom')]).reshape(4, -1).T
+        elif method == 'analytic':
+            actions = controller.defuzzifyAnalytic(rules, aggregation, defuzzification)
+        elif method == 'sugeno':
+            actions = controller.defuzzifySugeno(rules)
+        else:
+            actions = controller.defuzzify(controller.aggregate(rules, aggregation), defuzzification)
+
+        yield chunk, actions, rules if ruleStrengths else None
+
+
+# A class that writes the evaluated records to an output stream
+class RecordWriter:
+    # format => 'csv' or 'jsonl'
+    # nRules => number of rule strength columns written after the action (0 => none)
+    # allCombinations => the actions have one column per combination, written as COMBINATION_FIELDS
+    # The columns of a CSV output are the fields of the records of the first chunk, fields that only
+    # appear in later records cannot be added to the header and are collected in droppedFields
+
+    def __init__(self, stream, format='csv', nRules=0, allCombinations=False):
+        self.stream = stream
+        self.format = format
+        self.nRules = nRules
+        self.allCombinations = allCombinations
+        self.droppedFields = set()
+        self._csv = None
+
+    def write(self, records, actions, rules=None):
+        ruleNames = ['rule%d' % (r + 1) for r in range(self.nRules)]
+        outputs = []
+        for row, (record, action) in enumerate(zip(records, actions.tolist())):
+            output = dict(record)
+            if self.allCombinations:
+                output.update(zip(COMBINATION_FIELDS, action))
+            else:
+                output['action'] = action
+            if rules is not None:
+                output.update(zip(ruleNames, rules[row].tolist()))
+            outputs.append(output)
+
+        if self.format == 'jsonl':
+            for output in outputs:
+                self.stream.write(json.dumps(output) + '\n')
+            return
+
+        if self._csv is None:
+            # dict keeps the order the fields are first seen in
+            fieldnames = list(dict.fromkeys(field for output in outputs for field in output))
+            self._csv = csv.DictWriter(self.stream, fieldnames=fieldnames, extrasaction='ignore')
+            self._csv.writeheader()
+        fields = set(self._csv.fieldnames)
+        for output in outputs:
+            self.droppedFields.update(field for field in output if field not in fields)
+            self._csv.writerow(output)
+
+
+# A function that streams a log through the engine
+def streamDecisions(input, output, format='csv', outputFormat=None, chunkSize=8192, controller=None,
+                    mode=NORMAL_MODE, aggregation='max', defuzzification='centroid', method='sampled',
+                    ruleStrengths=False, report=None, reportEvery=1.0, allCombinations=False, onError=None):
+    # This function takes in:
+    # input, output => text streams
+    # format => format of the input ('csv' or 'jsonl'), outputFormat => format of the output (default: same)
+    # chunkSize => number of records evaluated per engine call
+    # mode => the mode of records without one
+    # aggregation, defuzzification, method => see FuzzyController.evaluate
+    # ruleStrengths => also write the strength of every rule
+    # allCombinations => write the actions of the four combinations instead of one action
+    # report => optional function called as report(records, seconds) at most every reportEvery seconds
+    # onError => function called for every record that cannot be evaluated, see evaluateChunks
+    # Returns (number of records, records per second), the number counts the records left out too
+
+    if controller is None:
+        controller = defaultController()
+    records = readJsonRecords(input) if format == 'jsonl' else readCsvRecords(input)
+    writer = RecordWriter(output, outputFormat or format, controller.nRules if ruleStrengths else 0,
+                          allCombinations)
+
+    # Every chunk read, with the records that cannot be evaluated
+    def counted(chunks):
+        nonlocal count
+        for chunk in chunks:
+            count += len(chunk)
+            yield chunk
+
+    start = lastReport = time.perf_counter()
+    count = reported = 0
+    for chunk, actions, rules in evaluateChunks(counted(chunked(records, chunkSize)), controller, mode,
+                                                aggregation, defuzzification, method, ruleStrengths,
+                                                allCombinations, onError):
+        writer.write(chunk, actions, rules)
+        now = time.perf_counter()
+        if report is not None and now - lastReport >= reportEvery:
+            report(count, now - start)
+            lastReport, reported = now, count
+
+    seconds = time.perf_counter() - start
+    if report is not None and reported != count:
+        report(count, seconds)
+    if writer.droppedFields and onError is not None:
+        onError(None, None, "fields missing from the CSV header were not written: %s"
+                % ", ".join(sorted(map(str, writer.droppedFields))))
+
+    return count, count / seconds if seconds > 0 else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a game state log with the fuzzy logic game engine")
+    parser.add_argument('input', nargs='?', default='-', help="CSV or JSON lines file, - for stdin")
+    parser.add_argument('output', nargs='?', default='-', help="output file, - for stdout")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="input format (default: from the file name)")
+    parser.add_argument('--output-format', choices=['csv', 'jsonl'], help="output format (default: same as input)")
+    parser.add_argument('--chunk-size', type=int, default=8192)
+    parser.add_argument('--mode', type=int, default=NORMAL_MODE, help="mode of records without one")
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    parser.add_argument('--defuzzification', choices=['centroid', 'mom'], default='centroid')
+    parser.add_argument('--method', choices=METHODS, default='sampled')
+    parser.add_argument('--rules', action='store_true', help="also write the strength of every rule")
+    parser.add_argument('--all', action='store_true', help="write the actions of all four combinations")
+    args = parser.parse_args(argv)
+    if args.all and args.method == 'sugeno':
+        parser.error("--all needs the sampled or analytic method")
+
+    format = args.format or ('jsonl' if args.input.endswith(('.jsonl', '.json')) else 'csv')
+    input = sys.stdin if args.input == '-' else open(args.input, newline='')
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+
+    # Throughput and bad records go to stderr so they do not mix with the records on stdout
+    def report(records, seconds):
+        print("%d records in %.1f s => %.0f records/s" % (records, seconds, records / max(seconds, 1e-9)),
+              file=sys.stderr)
+
+    def onError(number, record, message):
+        print("record %d: %s" % (number, message) if number is not None else message, file=sys.stderr)
+
+    try:
+        streamDecisions(input, output, format, args.output_format, args.chunk_size, mode=args.mode,
+                        aggregation=args.aggregation, defuzzification=args.defuzzification,
+                        method=args.method, ruleStrengths=args.rules, report=report, allCombinations=args.all,
+                        onError=onError)
+    finally:
+        for stream in (input, output):
+            if stream not in (sys.stdin, sys.stdout):
+                stream.close()
+
+
+if __name__ == '__main__':
+    main()
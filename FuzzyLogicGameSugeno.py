@@ -0,0 +1,96 @@
+# This module measures how far the zero-order Sugeno method of the fuzzy logic game engine
+# (FuzzyController.evaluate(..., method='sugeno')) is from the Mamdani inference
+# The sugeno method replaces every action set by a singleton at its peak and returns the average
+# of the peaks weighted by the rule strengths, so it needs no sampled action universe at all.
+# The deviation is the absolute difference of the crisp actions on a regular ammo x health grid,
+# for every mode, from the Mamdani max/centroid by default.
+#
+# Deviation from Mamdani (sampled method, default controller, 201 x 201 grid, all three modes):
+#   max/centroid => max 15.9, mean 3.6 to 3.7, 76% of the inputs within 5
+#   sum/centroid => max 12.7, mean 2.7 to 2.9, 80% of the inputs within 5
+#   max/mom => max 25.0, mean 6.1 to 6.5, 53% of the inputs within 5
+# The sugeno method matches the centroid where the rules of one symmetric action term fire
+# (stop, run away, walk around). The largest deviations are where hide or attack win (low ammo
+# and health in Attack Mode, high ammo and health in Defence Mode): they are half triangles, the
+# Mamdani centroid of a cut half triangle lies inside the universe while the singleton is at 0 or 100.
+#
+# Usage: python FuzzyLogicGameSugeno.py [--points 201] [--aggregation max] [--tolerance 1 2 5]
+
+import argparse
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController
+from FuzzyLogicGameInference import MODE_NAMES
+
+
+# Deviation of the sugeno method from Mamdani on a points x points grid, for every mode
+#   Returns (ammo axis, health axis, dict of mode => deviation array of shape (points, points)),
+#   deviation[i][j] is the deviation for ammo[i] and health[j]
+def deviationSurfaces(controller=None, points=201, aggregation='max', defuzzification='centroid',
+                      method='sampled'):
+    if controller is None:
+        controller = defaultController()
+
+    ammo = np.linspace(controller.x_ammo[0], controller.x_ammo[-1], points)
+    health = np.linspace(controller.x_health[0], controller.x_health[-1], points)
+    ammoGrid, healthGrid = np.meshgrid(ammo, health, indexing='ij')
+
+    deviations = {}
+    for mode in sorted(controller.modeWeights):
+        mamdani = controller.evaluate(ammoGrid, healthGrid, mode, aggregation, defuzzification, method, 'sparse')
+        sugeno = controller.evaluate(ammoGrid, healthGrid, mode, method='sugeno', inference='sparse')
+        deviations[mode] = np.abs(sugeno - mamdani)
+    return ammo, health, deviations
+
+
+# A function that summarizes the deviation of the sugeno method from Mamdani
+#   tolerances => the share of the inputs with a deviation of at most each tolerance is reported
+#   Returns a dict of mode => dict of max, mean, p99, worst (the (ammo, health) of the max deviation)
+#   and within (tolerance => share of the inputs)
+def sugenoDeviation(controller=None, points=201, aggregation='max', defuzzification='centroid', method='sampled',
+                    tolerances=(1.0, 2.0, 5.0)):
+    ammo, health, deviations = deviationSurfaces(controller, points, aggregation, defuzzification, method)
+
+    report = {}
+    for mode, deviation in deviations.items():
+        i, j = np.unravel_index(np.argmax(deviation), deviation.shape)
+        report[mode] = {'max': float(deviation.max()), 'mean': float(deviation.mean()),
+                        'p99': float(np.percentile(deviation, 99)), 'worst': (float(ammo[i]), float(health[j])),
+                        'within': {tolerance: float(np.mean(deviation <= tolerance)) for tolerance in tolerances}}
+    return report
+
+
+# Prints the report of sugenoDeviation
+def printDeviation(report):
+    for mode, stats in report.items():
+        print("%s: max %.3f at ammo %.1f, health %.1f, mean %.3f, p99 %.3f"
+              % (MODE_NAMES.get(mode, str(mode)), stats['max'], stats['worst'][0], stats['worst'][1],
+                 stats['mean'], stats['p99']))
+        print("  within " + ", ".join("%g: %.1f%%" % (tolerance, share * 100)
+                                      for tolerance, share in stats['within'].items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deviation of the Sugeno method from the Mamdani inference")
+    parser.add_argument('--points', type=int, default=201, help="grid points along each input")
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    parser.add_argument('--defuzzification', choices=['centroid', 'mom'], default='centroid')
+    parser.add_argument('--method', choices=['sampled', 'analytic'], default='sampled',
+                        help="method of the Mamdani reference")
+    parser.add_argument('--tolerance', type=float, nargs='+', default=[1.0, 2.0, 5.0])
+    parser.add_argument('--output', help="save the deviation surfaces to this .npz file")
+    args = parser.parse_args(argv)
+
+    printDeviation(sugenoDeviation(points=args.points, aggregation=args.aggregation,
+                                   defuzzification=args.defuzzification, method=args.method,
+                                   tolerances=args.tolerance))
+    if args.output:
+        ammo, health, deviations = deviationSurfaces(points=args.points, aggregation=args.aggregation,
+                                                     defuzzification=args.defuzzification, method=args.method)
+        np.savez(args.output, ammo=ammo, health=health,
+                 **{'mode%d' % mode: deviation for mode, deviation in deviations.items()})
+
+
+if __name__ == '__main__':
+    main()
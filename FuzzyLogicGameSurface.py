@@ -0,0 +1,96 @@
+# This module builds the decision surface of the fuzzy logic game engine
+# The ammo x health grid is split into square tiles and every tile is evaluated
+# with one batched engine call, on a pool of processes or threads.
+# The tiles only depend on tileSize, not on the number of workers, so the surface
+# is the same whatever the number of workers is.
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController
+from FuzzyLogicGameInference import NORMAL_MODE
+
+# The controller used by the tiles of a worker process, set once by _initWorker
+_workerController = None
+
+
+def _initWorker(controller):
+    global _workerController
+    _workerController = controller
+
+
+# A function that evaluates one tile of the surface
+def _evaluateTile(tile, x, y, mode, aggregation, defuzzification, method, controller=None):
+    # This function takes in the tile (row slice, column slice) and the axes
+    # and returns the tile with the crisp action of every point in it
+
+    if controller is None:
+        controller = _workerController
+    rows, columns = tile
+    ammoGrid, healthGrid = np.meshgrid(x[rows], y[columns], indexing='ij')
+    return tile, controller.evaluate(ammoGrid, healthGrid, mode, aggregation, defuzzification, method)
+
+
+# A function that splits a grid into square tiles
+def surfaceTiles(shape, tileSize):
+    # This function takes in the shape of the grid and the size of the tiles
+    # and returns the list of (row slice, column slice) of every tile, row by row
+
+    return [(slice(i, min(i + tileSize, shape[0])), slice(j, min(j + tileSize, shape[1])))
+            for i in range(0, shape[0], tileSize)
+            for j in range(0, shape[1], tileSize)]
+
+
+# A function that computes the crisp action on every point of an ammo x health grid
+def buildSurface(x, y, mode=NORMAL_MODE, aggregation='max', defuzzification='centroid', method='sampled',
+                 controller=None, workers=None, executor='process', tileSize=64, progress=None):
+    # This function takes in:
+    # x => the ammo axis, y => the health axis
+    # mode, aggregation, defuzzification, method => see FuzzyController.evaluate
+    # controller => the FuzzyController to use, by default the rule base from the article
+    # workers => number of workers (None => one per CPU, 0 or 1 => everything in this process)
+    # executor => 'process' for a process pool or 'thread' for a thread pool
+    #             (numpy releases the GIL in the large array operations of the batched engine)
+    # tileSize => number of grid points along each side of a tile
+    # progress => optional function called as progress(tilesDone, totalTiles) after every tile
+    # Returns Z with Z[i][j] the action for ammo x[i] and health y[j]
+
+    if controller is None:
+        controller = defaultController()
+    if executor not in ('process', 'thread'):
+        raise ValueError("executor must be 'process' or 'thread', not %r" % (executor,))
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    Z = np.zeros((len(x), len(y)))
+    tiles = surfaceTiles(Z.shape, tileSize)
+    settings = (x, y, mode, aggregation, defuzzification, method)
+
+    if workers <= 1 or len(tiles) == 1:
+        for done, tile in enumerate(tiles, 1):
+            _, Z[tile] = _evaluateTile(tile, *settings, controller=controller)
+            if progress is not None:
+                progress(done, len(tiles))
+        return Z
+
+    if executor == 'process':
+        # Every worker gets the controller once, not once per tile
+        pool = ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(controller,))
+        extra = {}
+    else:
+        pool = ThreadPoolExecutor(workers)
+        extra = {'controller': controller}
+
+    with pool:
+        futures = [pool.submit(_evaluateTile, tile, *settings, **extra) for tile in tiles]
+        for done, future in enumerate(as_completed(futures), 1):
+            tile, values = future.result()
+            Z[tile] = values
+            if progress is not None:
+                progress(done, len(tiles))
+
+    return Z
@@ -0,0 +1,237 @@
+# This module sweeps the mode weights of the fuzzy logic game engine
+# A mode multiplies the strength of the defensive rules by its defenseWeight and of the offensive
+# rules by its attackWeight, so tuning the modes means comparing the decision surfaces of many
+# (defenseWeight, attackWeight) pairs. Only the weighting and the stages after it depend on the pair:
+#   once per input grid => the inputs are fuzzified and the rules of their active terms fired
+#                          without weights (FuzzyController.sparseFireUnweighted), and the weight
+#                          class of every rule slot is looked up
+#   once per pair and input => the slot strengths are multiplied by the weights of their class,
+#                              aggregated and defuzzified (FuzzyController.defuzzifySparse)
+# The pairs are one more batch dimension of (pair, input) rows. Many rows end up with the same
+# term cuts (max aggregation) or weighted rule slots, e.g. inputs whose rules all have the same
+# weight class, and only the distinct ones are aggregated. The rows are weighted and deduplicated
+# in blocks of half the memory budget and their distinct rows aggregated in chunks of the other
+# half, so the working memory does not grow with the number of pairs or inputs (49 pairs x
+# 301 x 301 inputs peak at 91 MB with the default budget, 34 MB of which are the surfaces).
+# The surfaces are the same as evaluate(..., inference='sparse') of a controller whose mode has
+# the weights of the pair (for the analytic method up to rounding).
+#
+# 49 pairs (weights 0.5 ... 2 by 0.25) x 101 x 101 inputs against a controller per pair evaluated
+# with evaluateBounded (python FuzzyLogicGameWeightSweep.py --compare), the same surfaces:
+#   max/centroid, max/mom => 11% of the rows aggregated, 1.3 s instead of 5.3 s and 6.4 s (4.1x, 4.8x)
+#   sum/centroid, sum/mom => 36% of the rows aggregated, 3.5 s instead of 9.2 s (2.6x)
+#   analytic max/centroid => 1.1 s instead of 4.2 s (3.8x)
+#   sugeno, analytic sum/centroid => every row, 0.12 s instead of 0.32 s, 0.45 s instead of 0.72 s
+# Fuzzifying and firing the rules of the 10201 inputs takes 4 ms, the sweep is faster mostly
+# because of the rows that are not aggregated again.
+#
+# Usage: python FuzzyLogicGameWeightSweep.py [--defense-weights 1 1.5 2] [--attack-weights 1 1.5 2] [--compare]
+
+import argparse
+import time
+
+import numpy as np
+
+from FuzzyLogicGameController import FuzzyController, defaultController, METHODS, MEMORY_BUDGET
+from FuzzyLogicGameInference import universe, DEFENSIVE, OFFENSIVE, NORMAL_MODE
+
+
+# A function that makes the (defenseWeight, attackWeight) pairs of every combination of the weights,
+# shape (len(defenseWeights) * len(attackWeights), 2) with the attack weights changing fastest
+def weightGrid(defenseWeights, attackWeights):
+    defense, attack = np.meshgrid(np.asarray(defenseWeights, dtype=float), np.asarray(attackWeights, dtype=float),
+                                  indexing='ij')
+    return np.stack([defense.ravel(), attack.ravel()], axis=-1)
+
+
+class WeightSweep:
+    # The decision surfaces of a sweep of mode weights
+    #   weights => (pairs, 2) array of the (defenseWeight, attackWeight) of every surface
+    #   x, y => the ammo and health axes
+    #   surfaces => (pairs, len(x), len(y)) crisp actions, surfaces[p][i][j] is for ammo x[i] and health y[j]
+    #   actionPeaks, actionNames => of the controller, an input is mapped to the action term with
+    #                               the closest peak (inputs without a crisp action, nan, to none)
+    #   aggregations => number of rows that were aggregated, None => every row
+
+    def __init__(self, weights, x, y, surfaces, actionPeaks, actionNames, aggregations=None):
+        self.weights = weights
+        self.x = x
+        self.y = y
+        self.surfaces = surfaces
+        self.actionNames = list(actionNames)
+        self.aggregations = aggregations if aggregations is not None else surfaces.size
+
+        order = np.argsort(actionPeaks)
+        peaks = np.asarray(actionPeaks, dtype=float)[order]
+        edges = (peaks[1:] + peaks[:-1]) / 2
+        # actionCounts[p][k] => inputs mapped to action term k by the weights of pair p,
+        # one surface at a time so no array of the size of all the surfaces is made
+        self.actionCounts = np.stack([np.bincount(order[np.digitize(surface[~np.isnan(surface)], edges)],
+                                                  minlength=len(peaks))
+                                      for surface in surfaces])
+        self.actionShares = self.actionCounts / surfaces[0].size
+
+    def __len__(self):
+        return len(self.weights)
+
+    # The surface of one pair of weights of the sweep
+    def surface(self, defenseWeight, attackWeight):
+        found = np.flatnonzero((self.weights[:, 0] == defenseWeight) & (self.weights[:, 1] == attackWeight))
+        if not len(found):
+            raise ValueError("no surface for the weights (%r, %r)" % (defenseWeight, attackWeight))
+        return self.surfaces[found[0]]
+
+    # Summary of every surface, in the order of the weights
+    #   meanAction, minAction, maxAction => of the crisp actions of the inputs
+    #   actionShare => share of the inputs mapped to every action term
+    def stats(self):
+        return [{'defenseWeight': float(defenseWeight), 'attackWeight': float(attackWeight),
+                 'meanAction': float(np.nanmean(surface)), 'minAction': float(np.nanmin(surface)),
+                 'maxAction': float(np.nanmax(surface)),
+                 'actionShare': {name: float(share) for name, share in zip(self.actionNames, shares)}}
+                for (defenseWeight, attackWeight), surface, shares in zip(self.weights, self.surfaces,
+                                                                          self.actionShares)]
+
+
+# A function that computes the decision surface of every pair of mode weights
+#   weights => (defenseWeight, attackWeight) pairs, e.g. from weightGrid
+#   x, y => the ammo and health axes, by default `points` evenly spaced points over the input universes
+#   aggregation, defuzzification, method => see FuzzyController.evaluate
+#   controller => the FuzzyController, by default the rule base from the article (its modes are not used)
+#   memoryBudget => bytes of working memory, half for a block of weighted (pair, input) rows and half
+#                   for the aggregation of a chunk of their distinct rows (see FuzzyController.evaluateBounded),
+#                   the inputs, their fired rule slots and the surfaces are not counted
+def sweepModeWeights(weights, x=None, y=None, aggregation='max', defuzzification='centroid', method='sampled',
+                     controller=None, points=101, memoryBudget=MEMORY_BUDGET):
+    if aggregation not in ('max', 'sum'):
+        raise ValueError("aggregation must be 'max' or 'sum', not %r" % (aggregation,))
+    if defuzzification not in ('centroid', 'mom'):
+        raise ValueError("defuzzification must be 'centroid' or 'mom', not %r" % (defuzzification,))
+    if method not in METHODS:
+        raise ValueError("method must be 'sampled', 'analytic' or 'sugeno', not %r" % (method,))
+    controller = controller if controller is not None else defaultController()
+    weights = np.asarray(weights, dtype=float)
+    if weights.ndim != 2 or weights.shape[1] != 2:
+        raise ValueError("weights must be (defenseWeight, attackWeight) pairs, not an array of shape %r"
+                         % (weights.shape,))
+    if (weights < 0).any():
+        raise ValueError("weights must not be negative")
+    # The fixed point scale of uint16 only leaves room for the largest weight of the controller
+    if controller.precision == 'uint16' and weights.size and weights.max() > controller.ruleWeights.max():
+        raise ValueError("uint16 precision holds weights up to %g, not %g"
+                         % (controller.ruleWeights.max(), weights.max()))
+    chunkSize = memoryBudget // 2 // controller.rowBytes(method)
+    if chunkSize < 1:
+        raise ValueError("memoryBudget must be at least %d bytes" % (2 * controller.rowBytes(method)))
+
+    if x is None:
+        x = universe(points, controller.x_ammo[0], controller.x_ammo[-1])
+    if y is None:
+        y = universe(points, controller.x_health[0], controller.x_health[-1])
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    ammo, health = np.meshgrid(x, y, indexing='ij')
+
+    # The stages that do not depend on the weights, once for the grid
+    ruleIndex, rules = controller.sparseFireUnweighted(controller.sparseFuzzify(ammo.ravel(), health.ravel()))
+    slotClass = controller.weightClasses.ravel()[ruleIndex]
+
+    # classWeights[p] => weight of the neutral, defensive and offensive rules for the pair p
+    classWeights = np.ones((len(weights), 3))
+    classWeights[:, DEFENSIVE] = weights[:, 0]
+    classWeights[:, OFFENSIVE] = weights[:, 1]
+
+    # Rows with the same term cuts (max aggregation) or the same weighted rule slots have the same
+    # crisp action, only the first row of each is aggregated. The sugeno method and the analytic
+    # sum/centroid are closed forms that cost less than finding the distinct rows.
+    deduplicate = not (method == 'sugeno' or (method == 'analytic' and aggregation == 'sum'
+                                              and defuzzification == 'centroid'))
+    # Bytes of a weighted row: its pair and input, weighted slots, the distinct keys and their sort
+    slots = rules.shape[1]
+    keyWidth = (len(controller.actionTerms) if aggregation == 'max' else 2 * slots) if deduplicate else 0
+    blockSize = max(memoryBudget // 2 // (8 * (4 + 2 * slots + 3 * keyWidth)), 1)
+
+    # The rows are weighted and deduplicated one block at a time, in the order that keeps most of
+    # the rows with the same keys in the same block: the inputs of a pair for max aggregation (many
+    # inputs have the same term cuts), the pairs of an input for sum aggregation (the weighted slots
+    # of an input are the same for the pairs that only differ in weights its rules do not have)
+    crisp = np.empty((len(weights), len(rules)))
+    aggregations = 0
+    for block in range(0, crisp.size, blockSize):
+        row = np.arange(block, min(block + blockSize, crisp.size))
+        if aggregation == 'max':
+            pair, point = np.divmod(row, len(rules))
+        else:
+            point, pair = np.divmod(row, len(weights))
+        weighted = rules[point] * classWeights[pair[:, None], slotClass[point]]
+        if deduplicate:
+            if aggregation == 'max':
+                keys = controller.sparseTermCuts(ruleIndex[point], weighted)
+            else:
+                keys = np.concatenate([ruleIndex[point], weighted], axis=1)
+            _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+            del keys
+        else:
+            first = inverse = np.arange(len(weighted))
+
+        distinct = np.empty(len(first))
+        for start in range(0, len(first), chunkSize):
+            rows = first[start:start + chunkSize]
+            distinct[start:start + len(rows)] = controller.defuzzifySparse(ruleIndex[point[rows]], weighted[rows],
+                                                                           aggregation, defuzzification, method)
+        crisp[pair, point] = distinct[inverse.reshape(-1)]
+        aggregations += len(first)
+
+    return WeightSweep(weights, x, y, crisp.reshape(len(weights), len(x), len(y)), controller.actionPeaks,
+                       controller.actionNames, aggregations)
+
+
+# Prints the summary of every surface of a sweep
+def printStats(sweep):
+    stats = sweep.stats()
+    print("defense attack   mean  " + " ".join("%11s" % name for name in sweep.actionNames))
+    for row in stats:
+        print("%7.2f %6.2f %6.1f  " % (row['defenseWeight'], row['attackWeight'], row['meanAction'])
+              + " ".join("%10.1f%%" % (row['actionShare'][name] * 100) for name in sweep.actionNames))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decision surfaces of many mode weights of the fuzzy logic "
+                                                 "game engine")
+    parser.add_argument('--defense-weights', type=float, nargs='+', default=[0.5, 0.75, 1, 1.25, 1.5, 1.75, 2])
+    parser.add_argument('--attack-weights', type=float, nargs='+', default=[0.5, 0.75, 1, 1.25, 1.5, 1.75, 2])
+    parser.add_argument('--points', type=int, default=101, help="inputs along each axis")
+    parser.add_argument('--aggregation', choices=['max', 'sum'], default='max')
+    parser.add_argument('--defuzzification', choices=['centroid', 'mom'], default='centroid')
+    parser.add_argument('--method', choices=METHODS, default='sampled')
+    parser.add_argument('--compare', action='store_true',
+                        help="also evaluate every pair with its own controller and compare the time and surfaces")
+    args = parser.parse_args(argv)
+
+    weights = weightGrid(args.defense_weights, args.attack_weights)
+    controller = defaultController()
+    start = time.perf_counter()
+    sweep = sweepModeWeights(weights, aggregation=args.aggregation, defuzzification=args.defuzzification,
+                             method=args.method, controller=controller, points=args.points)
+    seconds = time.perf_counter() - start
+    printStats(sweep)
+    print("%d pairs x %d x %d inputs in %.2f s, %d of the %d rows aggregated (%.1f%%)"
+          % (len(weights), args.points, args.points, seconds, sweep.aggregations, sweep.surfaces.size,
+             100 * sweep.aggregations / sweep.surfaces.size))
+
+    if args.compare:
+        pairController = FuzzyController(**controller.settings())
+        ammo, health = np.meshgrid(sweep.x, sweep.y, indexing='ij')
+        error = 0.0
+        start = time.perf_counter()
+        for (defenseWeight, attackWeight), surface in zip(weights, sweep.surfaces):
+            pairController.setModeWeights(NORMAL_MODE, defenseWeight, attackWeight)
+            expected = pairController.evaluateBounded(ammo, health, NORMAL_MODE, args.aggregation,
+                                                      args.defuzzification, args.method, 'sparse')
+            error = max(error, float(np.nanmax(np.abs(surface - expected))))
+        pairSeconds = time.perf_counter() - start
+        print("one controller per pair: %.2f s (%.1fx), max difference %.3g"
+              % (pairSeconds, pairSeconds / seconds, error))
+
+
+if __name__ == '__main__':
+    main()
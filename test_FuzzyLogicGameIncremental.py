@@ -0,0 +1,40 @@
+# Tests of the incremental per-agent evaluator of the fuzzy logic game engine
+# Usage: python -m pytest test_FuzzyLogicGameIncremental.py
+
+import numpy as np
+
+from FuzzyLogicGameController import defaultController
+from FuzzyLogicGameIncremental import IncrementalEvaluator
+
+
+# Inputs that did not change since the last call are not evaluated again, nothing is left to fire
+def testSameInputsTwice():
+    controller = defaultController()
+    ammo, health = np.array([10.0, 50.0, 90.0]), np.array([20.0, 60.0, 5.0])
+    for method in ('sampled', 'analytic', 'sugeno'):
+        for aggregation in ('max', 'sum'):
+            evaluator = IncrementalEvaluator(controller, aggregation, method=method)
+            first = evaluator.evaluate(ammo, health, 1)
+            second = evaluator.evaluate(ammo, health, 1)
+            assert np.array_equal(first, second)
+            assert evaluator.lastTick['unchanged'] == len(ammo)
+            assert evaluator.lastTick['skippedFraction'] == 1.0
+            expected = controller.evaluate(ammo, health, 1, aggregation, method=method, inference='sparse')
+            assert np.array_equal(second, expected)
+
+
+def testSameScalarTwice():
+    evaluator = IncrementalEvaluator()
+    assert evaluator.evaluate(30, 40, 2) == evaluator.evaluate(30, 40, 2)
+
+
+# Only the agents whose inputs changed are evaluated again, the results stay those of evaluate
+def testSomeInputsChanged():
+    controller = defaultController()
+    evaluator = IncrementalEvaluator(controller)
+    ammo, health = np.array([10.0, 50.0, 90.0]), np.array([20.0, 60.0, 5.0])
+    evaluator.evaluate(ammo, health, 1)
+    ammo[1] = 55.0
+    crisp = evaluator.evaluate(ammo, health, 1)
+    assert evaluator.lastTick['unchanged'] == 2
+    assert np.array_equal(crisp, controller.evaluate(ammo, health, 1, inference='sparse'))